@@ -0,0 +1,26 @@
+from django.urls import path
+
+from .async_views import (
+    CartItemView, CategoryDetailView, CategoryListView, ProductDetailView,
+    ProductListView, ShoppingCartView
+)
+
+urlpatterns = [
+    path('categories/', CategoryListView.as_view(), name='category-list'),
+    path(
+        'categories/<int:pk>/', CategoryDetailView.as_view(),
+        name='category-detail'
+    ),
+    path('products/', ProductListView.as_view(), name='product-list'),
+    path(
+        'products/<int:pk>/', ProductDetailView.as_view(),
+        name='product-detail'
+    ),
+    path(
+        'products/<int:pk>/shopping_cart/', CartItemView.as_view(),
+        name='product-shopping-cart'
+    ),
+    path(
+        'shopping_cart/', ShoppingCartView.as_view(), name='shopping-cart'
+    ),
+]
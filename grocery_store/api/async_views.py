@@ -0,0 +1,382 @@
+"""Асинхронные вьюхи каталога и корзины для запуска под ASGI.
+
+Подключаются в grocery_store.asgi_urls поверх вьюх DRF и отвечают на
+самые частые запросы: списки и карточки продуктов и категорий, состав
+корзины, добавление и удаление продукта и очистку корзины. Остальные
+запросы (выборочные поля, пагинация по курсору, браузерный API,
+пакетное изменение корзины, корзина гостя, буфер записи корзины,
+аутентификация без aauthenticate())
+передаются вьюхам DRF через sync_to_async, поэтому ответ не зависит
+от того, какая вьюха его собрала.
+
+В Django 4.2 нет асинхронных транзакций: изменения корзины, которым
+нужна atomic(), выполняются одним вызовом sync_to_async.
+"""
+from math import ceil
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.http import Http404, HttpResponse
+from django.urls import resolve
+from django.utils.decorators import classonlymethod
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions, status
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from products.models import CartItem, Product
+from products.versions import CATALOG, aget_version
+from . import values_serializers
+from .category_tree import category_tree
+from .conditional import (
+    catalog_validators, not_modified, set_validators,
+    shopping_cart_validators
+)
+from .filters import ProductFilterBackend
+from .guest_cart import COOKIE_NAME as GUEST_CART_COOKIE
+from .renderers import JSONRenderer
+from .response_cache import (
+    cache_entry, cached_response, response_cache_key
+)
+from .values_serializers import (
+    ProductValuesSerializer, ShoppingCartValuesSerializer
+)
+
+JSON_MEDIA_TYPES = ('', '*/*', 'application/json')
+
+
+class Unsupported(Exception):
+    """Запрос должна обработать вьюха DRF."""
+
+
+def render(data, status_code=status.HTTP_200_OK):
+    """Ответ с тем же JSON, что у JSONRenderer в DRF."""
+    response = HttpResponse(
+        JSONRenderer().render(data),
+        status=status_code,
+        content_type='application/json'
+    )
+    response['Vary'] = 'Accept'
+    return response
+
+
+async def aget_object_or_404(queryset, **filters):
+    try:
+        return await queryset.aget(**filters)
+    except queryset.model.DoesNotExist:
+        raise Http404(
+            f'No {queryset.model._meta.object_name} matches the given query.'
+        )
+
+
+class AsyncPageNumberPagination:
+    """Страницы как у PageNumberPagination из настроек DRF.
+
+    Необычные номера страниц (`last`, за пределами списка) отдаются
+    вьюхе DRF вместе с её сообщениями об ошибках.
+    """
+
+    page_size = api_settings.PAGE_SIZE
+    page_query_param = 'page'
+
+    def get_page_number(self, request, count):
+        num_pages = max(ceil(count / self.page_size), 1)
+        page_number = request.GET.get(self.page_query_param) or '1'
+        if not page_number.isdigit():
+            raise Unsupported
+        page_number = int(page_number)
+        if not 1 <= page_number <= num_pages:
+            raise Unsupported
+        return page_number, num_pages
+
+    def get_bounds(self, page_number):
+        start = (page_number - 1) * self.page_size
+        return start, start + self.page_size
+
+    def get_paginated_data(self, request, page_number, num_pages, count,
+                           results):
+        url = request.build_absolute_uri()
+        next_link = previous_link = None
+        if page_number < num_pages:
+            next_link = replace_query_param(
+                url, self.page_query_param, page_number + 1
+            )
+        if page_number == 2:
+            previous_link = remove_query_param(url, self.page_query_param)
+        elif page_number > 2:
+            previous_link = replace_query_param(
+                url, self.page_query_param, page_number - 1
+            )
+        return {
+            'count': count,
+            'next': next_link,
+            'previous': previous_link,
+            'results': results,
+        }
+
+
+class AsyncAPIView(View):
+    """Асинхронная вьюха с аутентификацией и ошибками как у DRF.
+
+    native_methods обрабатываются здесь, если параметры запроса входят
+    в query_params, клиент ждёт JSON и все классы аутентификации умеют
+    aauthenticate(); иначе запрос уходит вьюхе DRF по тому же адресу.
+    """
+
+    native_methods = ('get',)
+    query_params = ()
+    authentication_required = False
+    values_serializer_required = True
+
+    @classonlymethod
+    def as_view(cls, **initkwargs):
+        # Как и вьюхи DRF, вьюхи с аутентификацией по токену не
+        # проверяют CSRF.
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    def get_authenticators(self):
+        return [
+            authentication_class()
+            for authentication_class
+            in api_settings.DEFAULT_AUTHENTICATION_CLASSES
+        ]
+
+    def is_native(self, request):
+        return (
+            request.method.lower() in self.native_methods
+            and set(request.GET) <= set(self.query_params)
+            and request.headers.get('Accept', '') in JSON_MEDIA_TYPES
+            and (
+                values_serializers.is_enabled()
+                or not self.values_serializer_required
+            )
+            and all(
+                hasattr(authenticator, 'aauthenticate')
+                for authenticator in self.get_authenticators()
+            )
+        )
+
+    async def delegate(self, request):
+        match = resolve(request.path_info, urlconf=settings.ROOT_URLCONF)
+        return await sync_to_async(match.func)(
+            request, *match.args, **match.kwargs
+        )
+
+    async def authenticate(self, request):
+        for authenticator in self.get_authenticators():
+            credentials = await authenticator.aauthenticate(request)
+            if credentials is not None:
+                return credentials[0]
+        return None
+
+    def handle_exception(self, request, exc):
+        """Ответ об ошибке как у APIView.handle_exception()."""
+        if isinstance(exc, Http404):
+            exc = exceptions.NotFound(*exc.args)
+        if isinstance(exc.detail, (list, dict)):
+            data = exc.detail
+        else:
+            data = {'detail': exc.detail}
+        response = render(data, exc.status_code)
+        if isinstance(exc, (
+            exceptions.NotAuthenticated, exceptions.AuthenticationFailed
+        )):
+            response['WWW-Authenticate'] = (
+                self.get_authenticators()[0].authenticate_header(request)
+            )
+        return response
+
+    async def dispatch(self, request, *args, **kwargs):
+        if not self.is_native(request):
+            return await self.delegate(request)
+        handler = getattr(self, request.method.lower())
+        try:
+            self.user = await self.authenticate(request)
+            if self.authentication_required and self.user is None:
+                raise exceptions.NotAuthenticated
+            return await handler(request, *args, **kwargs)
+        except Unsupported:
+            return await self.delegate(request)
+        except (exceptions.APIException, Http404) as exc:
+            return self.handle_exception(request, exc)
+
+
+class AsyncCachedResponseMixin:
+    """Общий с CachedResponseMixin кэш готовых ответов."""
+
+    cache_alias = 'catalog'
+
+    async def get_cached_response(self, handler, request, *args, **kwargs):
+        cache = caches[self.cache_alias]
+        version = await aget_version(CATALOG)
+        key = response_cache_key(
+            request.build_absolute_uri(request.path),
+            request.GET,
+            'application/json',
+            version
+        )
+        etag, last_modified = catalog_validators(key, version)
+        response = not_modified(request, etag, last_modified)
+        if response is not None:
+            return response
+        cached = await cache.aget(key)
+        if cached is not None:
+            return set_validators(
+                cached_response(cached), etag, last_modified
+            )
+        response = await handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            await cache.aset(key, cache_entry(response))
+        response['X-Cache'] = 'MISS'
+        return set_validators(response, etag, last_modified)
+
+
+class ProductListView(AsyncCachedResponseMixin, AsyncAPIView):
+    query_params = (
+        AsyncPageNumberPagination.page_query_param,
+        *ProductFilterBackend.lookups,
+        'ordering',
+    )
+
+    async def get(self, request):
+        return await self.get_cached_response(self.list, request)
+
+    async def list(self, request):
+        queryset = ProductFilterBackend().filter_by_params(
+            Product.objects.order_by('id'), request.GET
+        )
+        count = await queryset.acount()
+        paginator = AsyncPageNumberPagination()
+        page_number, num_pages = paginator.get_page_number(request, count)
+        start, end = paginator.get_bounds(page_number)
+        results = await ProductValuesSerializer(
+            ProductValuesSerializer.get_values(queryset[start:end])
+        ).adata()
+        return render(paginator.get_paginated_data(
+            request, page_number, num_pages, count, results
+        ))
+
+
+class ProductDetailView(AsyncCachedResponseMixin, AsyncAPIView):
+
+    async def get(self, request, pk):
+        return await self.get_cached_response(self.retrieve, request, pk)
+
+    async def retrieve(self, request, pk):
+        row = await aget_object_or_404(
+            ProductValuesSerializer.get_values(Product.objects.all()), pk=pk
+        )
+        data = await ProductValuesSerializer([row]).adata()
+        return render(data[0])
+
+
+class CategoryListView(AsyncCachedResponseMixin, AsyncAPIView):
+    query_params = (AsyncPageNumberPagination.page_query_param,)
+    values_serializer_required = False
+
+    async def get(self, request):
+        return await self.get_cached_response(self.list, request)
+
+    async def list(self, request):
+        categories = await category_tree.aget(request)
+        paginator = AsyncPageNumberPagination()
+        page_number, num_pages = paginator.get_page_number(
+            request, len(categories)
+        )
+        start, end = paginator.get_bounds(page_number)
+        return render(paginator.get_paginated_data(
+            request, page_number, num_pages, len(categories),
+            list(categories.values())[start:end]
+        ))
+
+
+class CategoryDetailView(AsyncCachedResponseMixin, AsyncAPIView):
+    values_serializer_required = False
+
+    async def get(self, request, pk):
+        return await self.get_cached_response(self.retrieve, request, pk)
+
+    async def retrieve(self, request, pk):
+        category = (await category_tree.aget(request)).get(pk)
+        if category is None:
+            raise Http404
+        return render(category)
+
+
+class CartDelegateMixin:
+    """Корзина гостя, её перенос и буфер записи корзины остаются
+    вьюхам DRF.
+    """
+
+    async def authenticate(self, request):
+        user = await super().authenticate(request)
+        if (
+            user is None
+            or GUEST_CART_COOKIE in request.COOKIES
+            or settings.CART_WRITE_BEHIND
+        ):
+            raise Unsupported
+        return user
+
+
+class ShoppingCartView(CartDelegateMixin, AsyncAPIView):
+    native_methods = ('get', 'delete')
+
+    async def get(self, request):
+        shopping_cart = await ShoppingCartValuesSerializer(
+            self.user.pk
+        ).aget_shopping_cart()
+        etag, last_modified = shopping_cart_validators(
+            request.build_absolute_uri(request.path),
+            request.GET,
+            'application/json',
+            await aget_version(CATALOG),
+            self.user.pk,
+            shopping_cart['updated_at']
+        )
+        response = not_modified(request, etag, last_modified)
+        if response is None:
+            response = render(await ShoppingCartValuesSerializer(
+                self.user.pk, shopping_cart
+            ).adata())
+        return set_validators(response, etag, last_modified)
+
+    async def delete(self, request):
+        await sync_to_async(
+            CartItem.objects.filter(shopping_cart__user_id=self.user.pk).delete
+        )()
+        return HttpResponse(status=status.HTTP_204_NO_CONTENT)
+
+
+class CartItemView(CartDelegateMixin, AsyncAPIView):
+    native_methods = ('post', 'delete')
+
+    async def post(self, request, pk):
+        product = await aget_object_or_404(Product.objects.all(), pk=pk)
+        cart_item = await sync_to_async(CartItem.objects.add_product)(
+            user=self.user, product=product
+        )
+        products = await ProductValuesSerializer(
+            ProductValuesSerializer.get_values(
+                Product.objects.filter(pk=pk)
+            )
+        ).adata()
+        cart_items = ShoppingCartValuesSerializer.serialize_cart_items(
+            [{
+                'product_quantity': cart_item.product_quantity,
+                'product_price': cart_item.product_price,
+            }],
+            products
+        )
+        return render(cart_items[0], status.HTTP_201_CREATED)
+
+    async def delete(self, request, pk):
+        await aget_object_or_404(Product.objects.all(), pk=pk)
+        deleted, _ = await sync_to_async(CartItem.objects.filter(
+            shopping_cart__user_id=self.user.pk, product_id=pk
+        ).delete)()
+        if not deleted:
+            raise Http404('No CartItem matches the given query.')
+        return HttpResponse(status=status.HTTP_204_NO_CONTENT)
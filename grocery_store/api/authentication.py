@@ -0,0 +1,86 @@
+from django.core.cache import caches
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import (
+    TokenAuthentication, get_authorization_header
+)
+
+TOKEN_CACHE_ALIAS = 'auth'
+
+
+def token_cache_key(key):
+    return f'auth:token:{key}'
+
+
+def forget_tokens(*keys):
+    caches[TOKEN_CACHE_ALIAS].delete_many(
+        [token_cache_key(key) for key in keys]
+    )
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Аутентификация по токену с кэшем токенов.
+
+    Пара (пользователь, токен) хранится в ограниченном кэше 'auth'
+    с TTL, поэтому повторные запросы обходятся без JOIN токена
+    с пользователем. Записи удаляются при удалении токена (выход через
+    djoser) и при изменении пользователя, см. api.signals. Удаление
+    видно другим процессам, только если кэш у них общий, см.
+    AUTH_CACHES в настройках.
+
+    aauthenticate() — то же для асинхронных вьюх, см. api.async_views.
+    """
+
+    def authenticate_credentials(self, key):
+        cache = caches[TOKEN_CACHE_ALIAS]
+        cache_key = token_cache_key(key)
+        credentials = cache.get(cache_key)
+        if credentials is None:
+            credentials = super().authenticate_credentials(key)
+            cache.set(cache_key, credentials)
+        return credentials
+
+    def get_key(self, request):
+        """Ключ из заголовка Authorization, как в authenticate()."""
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) == 1:
+            msg = _('Invalid token header. No credentials provided.')
+            raise exceptions.AuthenticationFailed(msg)
+        elif len(auth) > 2:
+            msg = _('Invalid token header. '
+                    'Token string should not contain spaces.')
+            raise exceptions.AuthenticationFailed(msg)
+        try:
+            return auth[1].decode()
+        except UnicodeError:
+            msg = _('Invalid token header. '
+                    'Token string should not contain invalid characters.')
+            raise exceptions.AuthenticationFailed(msg)
+
+    async def aauthenticate(self, request):
+        key = self.get_key(request)
+        if key is None:
+            return None
+        return await self.aauthenticate_credentials(key)
+
+    async def aauthenticate_credentials(self, key):
+        cache = caches[TOKEN_CACHE_ALIAS]
+        cache_key = token_cache_key(key)
+        credentials = await cache.aget(cache_key)
+        if credentials is None:
+            model = self.get_model()
+            try:
+                token = await model.objects.select_related('user').aget(
+                    key=key
+                )
+            except model.DoesNotExist:
+                raise exceptions.AuthenticationFailed(_('Invalid token.'))
+            if not token.user.is_active:
+                raise exceptions.AuthenticationFailed(
+                    _('User inactive or deleted.')
+                )
+            credentials = (token.user, token)
+            await cache.aset(cache_key, credentials)
+        return credentials
@@ -0,0 +1,289 @@
+"""Буфер записи корзины (write-behind).
+
+При CART_WRITE_BEHIND изменения продуктов в корзине через
+/api/products/<id>/shopping_cart/ не пишутся в БД сразу: новое
+количество продукта запоминается в кэше 'cart_buffer', и ответ
+отдаётся без записи. Повторные изменения одного продукта схлопываются
+в одно количество, а все изменения пользователя сбрасываются в БД
+одной пакетной операцией ShoppingCartMergeSerializer:
+
+- раз в CART_WRITE_BEHIND_INTERVAL секунд фоновым потоком процесса;
+- сразу, когда изменено CART_WRITE_BEHIND_MAX_PRODUCTS продуктов;
+- перед любым чтением и изменением корзины целиком, поэтому ответы
+  корзины всегда включают принятые изменения.
+
+В буфере лежат итоговые количества, а не приращения, поэтому
+повторный сброс после сбоя между коммитом и очисткой буфера ничего
+не меняет. По умолчанию буфер хранится в файловом кэше и переживает
+перезапуск процесса; оставшиеся изменения сбрасывает первый же поток
+сброса или команда flush_cart_buffer.
+"""
+import logging
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from threading import Lock, Thread
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.filebased import FileBasedCache
+from django.db import close_old_connections
+from rest_framework import exceptions, serializers
+
+from products.models import CartItem, Product, ShoppingCart
+from .serializers import (
+    MAX_PRODUCT_QUANTITY, CartOperationSerializer,
+    ShoppingCartMergeSerializer
+)
+
+CACHE_ALIAS = 'cart_buffer'
+USERS_KEY = 'users'
+# Срок жизни блокировки и сколько секунд её ждать.
+LOCK_TIMEOUT = 30
+LOCK_WAIT = 10
+# Опрос занятой блокировки: пауза растёт вдвое до наибольшей.
+LOCK_POLL_INTERVAL = 0.001
+LOCK_POLL_MAX_INTERVAL = 0.05
+
+logger = logging.getLogger(__name__)
+
+_buffer = None
+_buffer_lock = Lock()
+
+
+class CartBufferLocked(exceptions.APIException):
+    status_code = 503
+    default_detail = 'Корзина занята, повторите запрос позже.'
+    default_code = 'cart_buffer_locked'
+
+
+class CartBufferFileCache(FileBasedCache):
+    """Файловый кэш буфера: атомарный add() и без вытеснения.
+
+    os.link() не заменяет существующий файл, поэтому блокировку из
+    двух процессов получает только один. Записи буфера удаляются
+    только при сбросе, поэтому _cull() ничего не вытесняет.
+    """
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        # Занятый ключ отклоняется без записи временного файла.
+        if self.has_key(key, version):
+            return False
+        fname = self._key_to_file(key, version)
+        self._createdir()
+        fd, tmp_path = tempfile.mkstemp(dir=self._dir)
+        try:
+            with open(fd, 'wb') as file:
+                self._write_content(file, timeout, value)
+            for _ in range(2):
+                try:
+                    os.link(tmp_path, fname)
+                    return True
+                except FileExistsError:
+                    # has_key() удаляет файл с истёкшим сроком.
+                    if self.has_key(key, version):
+                        return False
+            return False
+        finally:
+            os.remove(tmp_path)
+
+    def _cull(self):
+        pass
+
+
+class CartBuffer:
+    """Отложенные количества продуктов в корзинах пользователей.
+
+    Состояние пользователя — {'since': время первого изменения,
+    'quantities': {id продукта: количество}}, 0 означает удаление.
+    Изменения одного пользователя выполняются под блокировкой в кэше.
+    """
+
+    @property
+    def cache(self):
+        return caches[CACHE_ALIAS]
+
+    @contextmanager
+    def lock(self, name):
+        """Блокировка name в кэше.
+
+        Ждёт не дольше LOCK_WAIT секунд, затем CartBufferLocked (503).
+        Через LOCK_TIMEOUT секунд блокировку может занять другой
+        процесс, поэтому снимается она, только если ещё принадлежит
+        этому владельцу.
+        """
+        key = f'lock:{name}'
+        token = uuid4().hex
+        deadline = time.monotonic() + LOCK_WAIT
+        interval = LOCK_POLL_INTERVAL
+        while not self.cache.add(key, token, timeout=LOCK_TIMEOUT):
+            if time.monotonic() >= deadline:
+                raise CartBufferLocked
+            time.sleep(interval)
+            interval = min(interval * 2, LOCK_POLL_MAX_INTERVAL)
+        try:
+            yield
+        finally:
+            if self.cache.get(key) == token:
+                self.cache.delete(key)
+
+    def get_pending(self, user_id):
+        """Отложенные количества {id продукта: количество}."""
+        state = self.cache.get(user_id)
+        return {} if state is None else state['quantities']
+
+    def get_quantity(self, user_id, product_id):
+        """Количество продукта в корзине с учётом буфера, 0 — нет."""
+        quantities = self.get_pending(user_id)
+        if product_id in quantities:
+            return quantities[product_id]
+        return self.get_saved_quantity(user_id, product_id)
+
+    @staticmethod
+    def get_saved_quantity(user_id, product_id):
+        return CartItem.objects.filter(
+            shopping_cart__user_id=user_id, product_id=product_id
+        ).values_list('product_quantity', flat=True).first() or 0
+
+    def add(self, user_id, product_id, quantity=1):
+        """Увеличивает количество продукта и возвращает новое."""
+        with self.lock(user_id):
+            quantities = self.get_pending(user_id)
+            if product_id not in quantities:
+                quantities[product_id] = self.get_saved_quantity(
+                    user_id, product_id
+                )
+            total = quantities[product_id] + quantity
+            if total > MAX_PRODUCT_QUANTITY:
+                raise serializers.ValidationError({
+                    'product_quantity': 'Количество продукта не может '
+                                        f'превышать {MAX_PRODUCT_QUANTITY}.'
+                })
+            quantities[product_id] = total
+            self.save(user_id, quantities)
+            return total
+
+    def set(self, user_id, product_id, quantity):
+        """Задаёт количество продукта, 0 удаляет продукт."""
+        with self.lock(user_id):
+            quantities = self.get_pending(user_id)
+            quantities[product_id] = quantity
+            self.save(user_id, quantities)
+
+    def save(self, user_id, quantities):
+        if len(quantities) >= settings.CART_WRITE_BEHIND_MAX_PRODUCTS:
+            self.write(user_id, quantities)
+            return
+        state = self.cache.get(user_id)
+        if state is None:
+            state = {'since': time.time()}
+            with self.lock(USERS_KEY):
+                users = self.cache.get(USERS_KEY, {})
+                users[user_id] = state['since']
+                self.cache.set(USERS_KEY, users, timeout=None)
+        state['quantities'] = quantities
+        self.cache.set(user_id, state, timeout=None)
+
+    def write(self, user_id, quantities):
+        """Записывает количества в БД и очищает буфер пользователя.
+
+        Вызывается под блокировкой пользователя.
+        """
+        products = Product.objects.only('id', 'price').in_bulk(
+            list(quantities)
+        )
+        operations = [
+            {
+                'product': products[product_id],
+                'quantity': quantity,
+                'operation': CartOperationSerializer.SET,
+            }
+            if quantity else {
+                'product': products[product_id],
+                'operation': CartOperationSerializer.REMOVE,
+            }
+            for product_id, quantity in quantities.items()
+            if product_id in products
+        ]
+        if operations:
+            shopping_cart, _ = ShoppingCart.objects.get_or_create(
+                user_id=user_id
+            )
+            ShoppingCartMergeSerializer().create({
+                'shopping_cart': shopping_cart, 'operations': operations
+            })
+        self.cache.delete(user_id)
+        with self.lock(USERS_KEY):
+            users = self.cache.get(USERS_KEY, {})
+            if users.pop(user_id, None) is not None:
+                self.cache.set(USERS_KEY, users, timeout=None)
+        return len(quantities)
+
+    def flush(self, user_id):
+        """Сбрасывает буфер пользователя, возвращает число продуктов."""
+        if self.cache.get(user_id) is None:
+            return 0
+        with self.lock(user_id):
+            return self.write(user_id, self.get_pending(user_id))
+
+    def flush_due(self, max_age=0):
+        """Сбрасывает буферы старше max_age секунд.
+
+        Возвращает число пользователей и продуктов.
+        """
+        deadline = time.time() - max_age
+        users = products = 0
+        for user_id, since in self.cache.get(USERS_KEY, {}).items():
+            if since <= deadline:
+                # Без быстрой проверки flush(): под блокировкой из списка
+                # убираются и пользователи без буфера.
+                with self.lock(user_id):
+                    flushed = self.write(user_id, self.get_pending(user_id))
+                users += bool(flushed)
+                products += flushed
+        return users, products
+
+
+class Flusher(Thread):
+    """Фоновый поток процесса, сбрасывающий буферы по таймеру."""
+
+    def __init__(self, cart_buffer, interval):
+        super().__init__(name='cart-buffer-flusher', daemon=True)
+        self.cart_buffer = cart_buffer
+        self.interval = interval
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.cart_buffer.flush_due(self.interval)
+            except Exception:
+                logger.exception('Не удалось сбросить буфер корзин')
+            finally:
+                close_old_connections()
+
+
+def get_cart_buffer():
+    """Буфер записи корзины или None, если он выключен.
+
+    При первом вызове в процессе запускается поток сброса.
+    """
+    global _buffer
+    if not settings.CART_WRITE_BEHIND:
+        return None
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = CartBuffer()
+            if settings.CART_WRITE_BEHIND_INTERVAL:
+                Flusher(_buffer, settings.CART_WRITE_BEHIND_INTERVAL).start()
+        return _buffer
+
+
+def flush_cart_buffer(user_id):
+    """Сбрасывает буфер пользователя перед работой с корзиной целиком."""
+    cart_buffer = get_cart_buffer()
+    if cart_buffer is not None:
+        cart_buffer.flush(user_id)
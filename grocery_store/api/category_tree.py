@@ -0,0 +1,72 @@
+from threading import Lock
+
+from asgiref.sync import sync_to_async
+from django.db.models import Prefetch
+
+from products.models import Category, Subcategory
+from products.versions import CATEGORY_TREE, aget_version, get_version
+from . import values_serializers
+from .serializers import CategorySerializer
+
+
+class CategoryTree:
+    """Снимок дерева категорий в памяти процесса.
+
+    Дерево сериализуется один раз на версию и переиспользуется между
+    запросами. Ссылки на изображения абсолютные, поэтому снимки хранятся
+    отдельно для каждого адреса сайта.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._state = (None, {})
+
+    def get_queryset(self):
+        return Category.objects.prefetch_related(
+            Prefetch(
+                'subcategories',
+                queryset=Subcategory.objects.order_by('id')
+            )
+        ).order_by('id')
+
+    def build(self, request):
+        if values_serializers.is_enabled():
+            return values_serializers.CategoryValuesSerializer(
+                request
+            ).by_id()
+        categories = list(self.get_queryset())
+        serializer = CategorySerializer(
+            categories, many=True, context={'request': request}
+        )
+        return {
+            category.id: data
+            for category, data in zip(categories, serializer.data)
+        }
+
+    def get(self, request):
+        """Словарь {id категории: сериализованная категория}."""
+        version = get_version(CATEGORY_TREE)
+        base_url = request.build_absolute_uri('/')
+        state_version, snapshots = self._state
+        if state_version == version and base_url in snapshots:
+            return snapshots[base_url]
+        with self._lock:
+            state_version, snapshots = self._state
+            if state_version != version:
+                snapshots = {}
+            if base_url not in snapshots:
+                snapshots = {**snapshots, base_url: self.build(request)}
+                self._state = (version, snapshots)
+            return snapshots[base_url]
+
+    async def aget(self, request):
+        """Как get(), но актуальный снимок отдаётся без потока."""
+        version = await aget_version(CATEGORY_TREE)
+        base_url = request.build_absolute_uri('/')
+        state_version, snapshots = self._state
+        if state_version == version and base_url in snapshots:
+            return snapshots[base_url]
+        return await sync_to_async(self.get)(request)
+
+
+category_tree = CategoryTree()
@@ -0,0 +1,99 @@
+"""Условные GET-запросы: валидаторы ETag и Last-Modified, ответы 304.
+
+Валидаторы строятся без сборки тела ответа: для каталога — из версии
+каталога и адреса запроса, для корзины — ещё из времени её изменения.
+Время выдачи версии каталога служит датой Last-Modified, поэтому
+удаление продукта тоже сдвигает её.
+"""
+from hashlib import sha1
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework import status
+
+from products.versions import version_timestamp
+from .dispatch import HandlerMixin
+from .response_cache import response_cache_key
+
+
+def make_etag(key):
+    return quote_etag(sha1(key.encode()).hexdigest())
+
+
+def catalog_validators(cache_key, version):
+    """ETag по ключу кэша ответа и время выдачи версии каталога."""
+    return make_etag(cache_key), version_timestamp(version)
+
+
+def shopping_cart_validators(url, query_params, media_type, version,
+                             user_id, updated_at):
+    """Состав корзины зависит и от самой корзины, и от каталога."""
+    key = response_cache_key(
+        url, query_params, media_type,
+        f'{version}:{user_id}:{updated_at and updated_at.isoformat()}'
+    )
+    last_modified = version_timestamp(version)
+    if updated_at is not None and last_modified is not None:
+        last_modified = max(last_modified, int(updated_at.timestamp()))
+    return make_etag(key), last_modified
+
+
+def set_validators(response, etag, last_modified):
+    if response.status_code in (
+        status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED
+    ):
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+def not_modified(request, etag, last_modified):
+    """Ответ 304 (или 412), если тело ответа собирать не нужно."""
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
+
+
+class ConditionalGetMixin(HandlerMixin):
+    """Отвечает на If-None-Match и If-Modified-Since без сборки тела.
+
+    Вьюха задаёт get_validators(request) → (etag, last_modified).
+    Примесь ставится перед CachedResponseMixin, чтобы проверка шла
+    раньше обращения к кэшу ответов.
+    """
+
+    conditional_actions = ('list', 'retrieve')
+
+    def get_validators(self, request):
+        raise NotImplementedError
+
+    def is_conditional(self, request):
+        return (
+            request.method == 'GET'
+            and getattr(self, 'action', None) in self.conditional_actions
+        )
+
+    def handle(self, handler, request, *args, **kwargs):
+        if not self.is_conditional(request):
+            return super().handle(handler, request, *args, **kwargs)
+        etag, last_modified = self.get_validators(request)
+        response = not_modified(request, etag, last_modified)
+        if response is not None:
+            return response
+        return set_validators(
+            super().handle(handler, request, *args, **kwargs),
+            etag, last_modified
+        )
+
+
+class CatalogConditionalGetMixin(ConditionalGetMixin):
+    """Валидаторы ответов каталога для вьюх с CachedResponseMixin."""
+
+    def get_validators(self, request):
+        return catalog_validators(
+            self.get_response_cache_key(request), self.get_catalog_version()
+        )
@@ -0,0 +1,37 @@
+"""Шаг между initial() и обработчиком запроса во вьюхах DRF.
+
+APIView.dispatch() вызывает обработчик сразу после initial(), и
+ответить без сборки тела (304, ответ из кэша) можно было бы только
+подменой self.get. HandlerMixin повторяет APIView.dispatch(), но
+вызывает обработчик через handle(): примеси переопределяют handle()
+и передают запрос дальше через super().handle().
+"""
+
+
+class HandlerMixin:
+
+    def handle(self, handler, request, *args, **kwargs):
+        return handler(request, *args, **kwargs)
+
+    def dispatch(self, request, *args, **kwargs):
+        # То же, что APIView.dispatch(), кроме вызова обработчика.
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+        try:
+            self.initial(request, *args, **kwargs)
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(
+                    self, request.method.lower(), self.http_method_not_allowed
+                )
+            else:
+                handler = self.http_method_not_allowed
+            response = self.handle(handler, request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+        self.response = self.finalize_response(
+            request, response, *args, **kwargs
+        )
+        return self.response
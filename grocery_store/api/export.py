@@ -0,0 +1,60 @@
+"""Отдача выгрузки каталога потоком под WSGI и ASGI."""
+import logging
+
+from asgiref.sync import sync_to_async
+
+EXPORT_FORMAT_QUERY_PARAM = 'export_format'
+
+logger = logging.getLogger(__name__)
+
+
+def accepts_gzip(accept_encoding):
+    """Принимает ли клиент gzip по заголовку Accept-Encoding.
+
+    Учитываются веса q: «gzip;q=0» означает отказ от gzip, а «*»
+    относится к кодировкам, не названным явно.
+    """
+    qualities = {}
+    for item in accept_encoding.split(','):
+        coding, *params = (part.strip() for part in item.split(';'))
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding:
+            qualities[coding.lower()] = quality
+    return qualities.get('gzip', qualities.get('*', 0.0)) > 0
+
+
+def log_export(export):
+    logger.info(
+        'Выгрузка каталога: %d продуктов за %.2f с (%.0f строк/с).',
+        export.rows, export.elapsed, export.rows_per_second
+    )
+
+
+def iter_export(export):
+    yield from export
+    log_export(export)
+
+
+async def aiter_export(export):
+    """Порции выгрузки из потока для ORM, по одному переходу на порцию.
+
+    Синхронный итератор под ASGI Django сначала прочитал бы целиком.
+    """
+    chunks = iter(export)
+    next_chunk = sync_to_async(next)
+    while (chunk := await next_chunk(chunks, None)) is not None:
+        yield chunk
+    log_export(export)
+
+
+def stream_export(export, is_async):
+    if is_async:
+        return aiter_export(export)
+    return iter_export(export)
@@ -0,0 +1,72 @@
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+from .pagination import KeysetPagination
+from .serializers import ProductFilterSerializer
+
+
+class ProductFilterBackend(BaseFilterBackend):
+    """Фильтрует список продуктов по категории, подкатегории и цене.
+
+    Категория и подкатегория задаются slug, сортировка — параметром
+    `ordering`; при равных значениях продукты упорядочены по id,
+    чтобы страницы не пересекались.
+    """
+
+    filter_actions = ('list', 'export')
+    lookups = {
+        'category': 'category__slug',
+        'subcategory': 'subcategory__slug',
+        'min_price': 'price__gte',
+        'max_price': 'price__lte',
+    }
+    descriptions = {
+        'category': 'Slug категории.',
+        'subcategory': 'Slug подкатегории.',
+        'min_price': 'Минимальная цена.',
+        'max_price': 'Максимальная цена.',
+        'ordering': (
+            'Сортировка: `price`, `-price`, `name` или `-name`. '
+            'Недоступна при `pagination=keyset` и в выгрузке.'
+        ),
+    }
+
+    def filter_queryset(self, request, queryset, view):
+        if getattr(view, 'action', None) not in self.filter_actions:
+            return queryset
+        return self.filter_by_params(
+            queryset,
+            request.query_params,
+            keyset=KeysetPagination.is_requested(request)
+        )
+
+    def filter_by_params(self, queryset, query_params, keyset=False):
+        serializer = ProductFilterSerializer(data=query_params)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+        queryset = queryset.filter(**{
+            lookup: params[name]
+            for name, lookup in self.lookups.items()
+            if name in params
+        })
+        if 'ordering' in params:
+            if keyset:
+                raise ValidationError({'ordering': [
+                    'Сортировка недоступна при пагинации по курсору.'
+                ]})
+            queryset = queryset.order_by(params['ordering'], 'id')
+        return queryset
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': name,
+                'required': False,
+                'in': 'query',
+                'description': description,
+                'schema': {
+                    'type': 'number' if name.endswith('price') else 'string'
+                },
+            }
+            for name, description in self.descriptions.items()
+        ]
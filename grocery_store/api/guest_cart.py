@@ -0,0 +1,260 @@
+"""Корзина гостя в подписанной cookie.
+
+Неавторизованный пользователь собирает корзину без записей в БД:
+в cookie лежат только id продуктов и количества, а стоимость позиций
+и итоги считаются по текущему каталогу при каждом выводе. Ответы
+строятся теми же сериализаторами, что и для корзины пользователя.
+
+При входе через djoser (сигнал user_logged_in) корзина гостя
+переносится в корзину пользователя одним пакетным изменением,
+а GuestCartMiddleware удаляет cookie. Если пользователь вошёл иначе
+(например, по JWT), перенос выполняется при первом запросе к корзине.
+В cookie лежит nonce корзины, и перенесённый nonce записывается
+в GuestCartMerge: запросы, пришедшие с той же cookie до её удаления,
+корзину повторно не прибавляют.
+"""
+import secrets
+from datetime import timedelta
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core import signing
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import serializers
+
+from products.models import GuestCartMerge, Product, ShoppingCart
+from .cart_buffer import flush_cart_buffer
+from .serializers import (
+    MAX_PRODUCT_QUANTITY, CartOperationSerializer,
+    ShoppingCartMergeSerializer
+)
+
+COOKIE_NAME = 'guest_cart'
+SALT = 'api.guest_cart'
+
+
+class GuestCart:
+    """Количества продуктов {id: количество} в порядке добавления.
+
+    nonce выдаётся новой корзине и не меняется вместе с ней.
+    """
+
+    def __init__(self, quantities=None, nonce=None):
+        self.quantities = dict(quantities or {})
+        self.nonce = nonce or secrets.token_hex(16)
+        self.modified = False
+
+    @staticmethod
+    def decode(value):
+        nonce, _, items = value.partition(';')
+        if not nonce or not items:
+            raise ValueError('Повреждённая корзина гостя.')
+        quantities = {}
+        for item in items.split(','):
+            product_id, _, quantity = item.partition(':')
+            quantities[int(product_id)] = int(quantity)
+        return quantities, nonce
+
+    def encode(self):
+        return f'{self.nonce};' + ','.join(
+            f'{product_id}:{quantity}'
+            for product_id, quantity in self.quantities.items()
+        )
+
+    @classmethod
+    def from_request(cls, request):
+        """Корзина из cookie; повреждённая или просроченная — пустая."""
+        try:
+            value = request.get_signed_cookie(
+                COOKIE_NAME, salt=SALT, max_age=settings.GUEST_CART_MAX_AGE
+            )
+            return cls(*cls.decode(value))
+        except (KeyError, signing.BadSignature, ValueError):
+            return cls()
+
+    def save(self, request, response):
+        """Записывает изменённую корзину в cookie ответа."""
+        if not self.modified:
+            return response
+        if self.quantities:
+            response.set_signed_cookie(
+                COOKIE_NAME, self.encode(), salt=SALT,
+                max_age=settings.GUEST_CART_MAX_AGE,
+                secure=request.is_secure(), httponly=True, samesite='Lax'
+            )
+        elif COOKIE_NAME in request.COOKIES:
+            response.delete_cookie(COOKIE_NAME, samesite='Lax')
+        return response
+
+    def update(self, quantities):
+        """Задаёт количества; продукты с нулевым количеством удаляются."""
+        quantities = {
+            product_id: quantity
+            for product_id, quantity in {
+                **self.quantities, **quantities
+            }.items()
+            if quantity
+        }
+        if len(quantities) > settings.GUEST_CART_MAX_ITEMS:
+            raise serializers.ValidationError({'operations': (
+                'В корзине гостя может быть не больше '
+                f'{settings.GUEST_CART_MAX_ITEMS} продуктов.'
+            )})
+        self.quantities = quantities
+        self.modified = True
+
+    def add(self, product_id, quantity=1):
+        total = self.quantities.get(product_id, 0) + quantity
+        if total > MAX_PRODUCT_QUANTITY:
+            raise serializers.ValidationError({
+                'product_quantity': 'Количество продукта не может '
+                                    f'превышать {MAX_PRODUCT_QUANTITY}.'
+            })
+        self.update({product_id: total})
+        return total
+
+    def remove(self, product_id):
+        self.update({product_id: 0})
+
+    def clear(self):
+        self.quantities = {}
+        self.modified = True
+
+
+class GuestCartItems(list):
+    """Позиции корзины гостя с интерфейсом менеджера для .all()."""
+
+    def all(self):
+        return self
+
+
+class GuestShoppingCart:
+    """Корзина гостя для ShoppingCartSerializer из несохранённых
+    позиций CartItem.
+    """
+
+    def __init__(self, cart_items):
+        self.cart_items = GuestCartItems(cart_items)
+        self.total_quantity = sum(
+            cart_item.product_quantity for cart_item in cart_items
+        )
+        self.total_price = sum(
+            cart_item.product_price for cart_item in cart_items
+        )
+
+
+def claim_guest_cart(guest_cart):
+    """Записывает nonce корзины; False, если она уже перенесена.
+
+    Записи старше срока жизни cookie удаляются: cookie с этими nonce
+    уже не принимаются.
+    """
+    GuestCartMerge.objects.filter(merged_at__lt=timezone.now() - timedelta(
+        seconds=settings.GUEST_CART_MAX_AGE
+    )).delete()
+    try:
+        with transaction.atomic():
+            GuestCartMerge.objects.create(nonce=guest_cart.nonce)
+    except IntegrityError:
+        return False
+    return True
+
+
+def merge_guest_cart(user, guest_cart):
+    """Прибавляет корзину гостя к корзине пользователя и очищает её.
+
+    Продукты, удалённые из каталога, пропускаются. Корзина с уже
+    перенесённым nonce не прибавляется повторно.
+    """
+    if guest_cart.quantities:
+        with transaction.atomic():
+            if claim_guest_cart(guest_cart):
+                add_guest_cart(user, guest_cart)
+    guest_cart.clear()
+
+
+def add_guest_cart(user, guest_cart):
+    products = Product.objects.only('id', 'price').in_bulk(
+        list(guest_cart.quantities)
+    )
+    operations = [
+        {
+            'product': products[product_id],
+            'quantity': quantity,
+            'operation': CartOperationSerializer.INCREMENT,
+        }
+        for product_id, quantity in guest_cart.quantities.items()
+        if product_id in products
+    ]
+    if operations:
+        flush_cart_buffer(user.pk)
+        shopping_cart, _ = ShoppingCart.objects.get_or_create(
+            user_id=user.pk
+        )
+        ShoppingCartMergeSerializer().create({
+            'shopping_cart': shopping_cart, 'operations': operations
+        })
+
+
+class GuestCartMixin:
+    """Корзина гостя во вьюхах корзины.
+
+    Для гостя в self.guest_cart лежит его корзина, изменения которой
+    записываются в cookie ответа. У авторизованного пользователя
+    корзина гостя из cookie сразу переносится в его корзину.
+    """
+
+    guest_cart_actions = None
+    guest_cart = None
+
+    @property
+    def is_guest(self):
+        return self.guest_cart is not None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if (
+            self.guest_cart_actions is not None
+            and getattr(self, 'action', None) not in self.guest_cart_actions
+        ):
+            return
+        if not request.user.is_authenticated:
+            self.guest_cart = GuestCart.from_request(request)
+        elif COOKIE_NAME in request.COOKIES:
+            self.merged_guest_cart = GuestCart.from_request(request)
+            merge_guest_cart(request.user, self.merged_guest_cart)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs
+        )
+        guest_cart = getattr(self, 'merged_guest_cart', self.guest_cart)
+        if guest_cart is not None:
+            guest_cart.save(request, response)
+        return response
+
+
+class GuestCartMiddleware:
+    """Удаляет cookie корзины гостя, перенесённой при входе."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.finish(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.finish(request, await self.get_response(request))
+
+    def finish(self, request, response):
+        if getattr(request, 'guest_cart_merged', False):
+            response.delete_cookie(COOKIE_NAME, samesite='Lax')
+        return response
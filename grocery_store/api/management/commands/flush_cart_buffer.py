@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from api.cart_buffer import CartBuffer
+
+
+class Command(BaseCommand):
+    help = (
+        'Сбрасывает в БД отложенные изменения корзин из буфера записи, '
+        'например перед остановкой сервиса или после отключения '
+        'CART_WRITE_BEHIND.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than', type=float, default=0,
+            help='Сбрасывать только буферы старше указанного числа секунд.'
+        )
+
+    def handle(self, *args, **options):
+        users, products = CartBuffer().flush_due(options['older_than'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Сброшено корзин: {users}, продуктов: {products}.'
+        ))
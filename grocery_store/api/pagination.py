@@ -0,0 +1,138 @@
+from base64 import b64decode, b64encode
+from bisect import bisect_right
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Пагинация по ключу: WHERE pk > курсор ORDER BY pk LIMIT n.
+
+    Стоимость страницы не зависит от её глубины: нет ни COUNT(*),
+    ни OFFSET. Курсор непрозрачен для клиента и кодирует pk последнего
+    элемента страницы. Список вместо queryset должен быть отсортированным
+    списком ключей.
+    """
+
+    mode_query_param = 'pagination'
+    mode = 'keyset'
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = api_settings.PAGE_SIZE
+    max_page_size = 100
+    invalid_cursor_message = 'Неверный курсор.'
+
+    @classmethod
+    def is_requested(cls, request):
+        return request is not None and (
+            cls.cursor_query_param in request.query_params
+            or request.query_params.get(cls.mode_query_param) == cls.mode
+        )
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(
+                request.query_params[self.page_size_query_param],
+                strict=True,
+                cutoff=self.max_page_size
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            return int(b64decode(encoded.encode('ascii')).decode('ascii'))
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, position):
+        return b64encode(str(position).encode('ascii')).decode('ascii')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        position = self.decode_cursor(request)
+        if isinstance(queryset, list):
+            start = 0
+            if position is not None:
+                start = bisect_right(queryset, position)
+            page = queryset[start:start + page_size + 1]
+            get_position = int
+        else:
+            queryset = queryset.order_by('pk')
+            if position is not None:
+                queryset = queryset.filter(pk__gt=position)
+            page = list(queryset[:page_size + 1])
+            get_position = self.get_position
+        self.next_position = None
+        if len(page) > page_size:
+            page = page[:page_size]
+            self.next_position = get_position(page[-1])
+        return page
+
+    def get_position(self, instance):
+        if isinstance(instance, dict):
+            return instance['id']
+        return instance.pk
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.mode_query_param, self.mode)
+        return replace_query_param(
+            url,
+            self.cursor_query_param,
+            self.encode_cursor(self.next_position)
+        )
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {
+                    'type': 'string',
+                    'nullable': True,
+                    'format': 'uri',
+                },
+                'results': schema,
+            },
+        }
+
+
+class KeysetPaginationMixin:
+    """Включает пагинацию по ключу по запросу клиента.
+
+    По умолчанию используется постраничная пагинация из настроек,
+    `?pagination=keyset` или `?cursor=` переключают на KeysetPagination
+    действия из keyset_actions.
+    """
+
+    keyset_pagination_class = KeysetPagination
+    keyset_actions = ('list',)
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            request = getattr(self, 'request', None)
+            if (
+                getattr(self, 'action', None) in self.keyset_actions
+                and self.keyset_pagination_class.is_requested(request)
+            ):
+                self._paginator = self.keyset_pagination_class()
+            else:
+                return super().paginator
+        return self._paginator
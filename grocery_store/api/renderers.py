@@ -0,0 +1,11 @@
+from rest_framework import renderers
+
+from grocery_store.metrics import render_timer
+
+
+class JSONRenderer(renderers.JSONRenderer):
+    """JSONRenderer, время работы которого попадает в метрики запроса."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with render_timer():
+            return super().render(data, accepted_media_type, renderer_context)
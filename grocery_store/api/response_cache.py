@@ -0,0 +1,158 @@
+from collections import Counter
+from hashlib import sha1
+from threading import Lock
+from urllib.parse import urlencode
+
+from django.core.cache import caches
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.http import HttpResponse
+
+from products.versions import CATALOG, get_version
+from .dispatch import HandlerMixin
+
+# Заголовки, которые сохраняются в кэше вместе с телом ответа.
+CACHED_HEADERS = ('Content-Type', 'Vary', 'Allow')
+
+_stats = {}
+_stats_lock = Lock()
+_missing = object()
+
+
+def record(location, event, count=1):
+    with _stats_lock:
+        _stats.setdefault(location, Counter())[event] += count
+
+
+def cache_stats():
+    """Счётчики попаданий, промахов и вытеснений по каждому кэшу."""
+    with _stats_lock:
+        return {
+            location: {
+                event: counter[event]
+                for event in ('hits', 'misses', 'evictions')
+            }
+            for location, counter in _stats.items()
+        }
+
+
+class CountingCacheMixin:
+    """Считает попадания и промахи кэша.
+
+    Django создаёт отдельный экземпляр бэкенда на каждый поток,
+    поэтому счётчики хранятся на уровне модуля по имени кэша.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(location, params)
+        self.stats_location = str(location)
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _missing, version)
+        if value is _missing:
+            record(self.stats_location, 'misses')
+            return default
+        record(self.stats_location, 'hits')
+        return value
+
+
+class LRUCache(CountingCacheMixin, LocMemCache):
+    """Кэш в памяти процесса с вытеснением одной давней записи.
+
+    LocMemCache при переполнении выбрасывает треть записей разом;
+    здесь вытесняется ровно одна наименее востребованная запись.
+    """
+
+    def _cull(self):
+        key, _ = self._cache.popitem()
+        del self._expire_info[key]
+        record(self.stats_location, 'evictions')
+
+
+class FileCache(CountingCacheMixin, FileBasedCache):
+    """Файловый кэш: общий для процессов одной машины, без сервисов.
+
+    Вытеснения не считаются: FileBasedCache удаляет файлы внутри
+    set() и не сообщает, сколько удалил.
+    """
+
+
+def response_cache_key(url, query_params, media_type, version):
+    query = urlencode(sorted(query_params.lists()), doseq=True)
+    key = '|'.join((url, query, media_type))
+    return f'response:{version}:{sha1(key.encode()).hexdigest()}'
+
+
+def cache_entry(response):
+    """Статус, заголовки CACHED_HEADERS и тело готового ответа."""
+    return (
+        response.status_code,
+        [
+            (header, response[header])
+            for header in CACHED_HEADERS
+            if response.has_header(header)
+        ],
+        response.content
+    )
+
+
+def cached_response(entry):
+    status, headers, content = entry
+    response = HttpResponse(content, status=status)
+    for header, value in headers:
+        response[header] = value
+    response['X-Cache'] = 'HIT'
+    return response
+
+
+class CachedResponseMixin(HandlerMixin):
+    """Кэширует готовые ответы list и retrieve.
+
+    Ключ состоит из адреса запроса с упорядоченными параметрами,
+    формата ответа и версии каталога, поэтому изменение каталога
+    делает все прежние записи недостижимыми без явного удаления.
+    Ответ сохраняется после finalize_response() вместе с заголовками
+    Vary и Allow, которые добавляет DRF.
+    """
+
+    cache_alias = 'catalog'
+    cached_actions = ('list', 'retrieve')
+    catalog_version = None
+    pending_cache_key = None
+
+    def get_catalog_version(self):
+        # Одна версия на запрос: по ней строятся и ключ кэша, и ETag.
+        if self.catalog_version is None:
+            self.catalog_version = get_version(CATALOG)
+        return self.catalog_version
+
+    def get_response_cache_key(self, request):
+        return response_cache_key(
+            request.build_absolute_uri(request.path),
+            request.query_params,
+            request.accepted_media_type,
+            self.get_catalog_version()
+        )
+
+    def handle(self, handler, request, *args, **kwargs):
+        if request.method != 'GET' or self.action not in self.cached_actions:
+            return super().handle(handler, request, *args, **kwargs)
+        key = self.get_response_cache_key(request)
+        cached = caches[self.cache_alias].get(key)
+        if cached is not None:
+            return cached_response(cached)
+        self.pending_cache_key = key
+        return super().handle(handler, request, *args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs
+        )
+        if self.pending_cache_key is not None:
+            response.render()
+            if response.status_code == 200:
+                caches[self.cache_alias].set(
+                    self.pending_cache_key, cache_entry(response)
+                )
+            response['X-Cache'] = 'MISS'
+        return response
@@ -1,57 +1,138 @@
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
 from rest_framework import serializers
 
+from products.images import get_srcset
 from products.models import (
     CartItem, Category, Product, ProductImage, ShoppingCart, Subcategory
 )
+from .sparse import SparseFieldsetMixin
 
+MAX_PRODUCT_QUANTITY = 32767
 
-class SubcategorySerializer(serializers.ModelSerializer):
+
+class SrcsetField(serializers.ReadOnlyField):
+    """Ссылки на производные изображения для атрибута srcset."""
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('source', 'image')
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        request = self.context.get('request')
+
+        def build_url(name):
+            url = value.storage.url(name)
+            if request is not None:
+                return request.build_absolute_uri(url)
+            return url
+
+        return get_srcset(value.name, build_url)
+
+
+class SubcategorySerializer(
+    SparseFieldsetMixin, serializers.ModelSerializer
+):
+
+    srcset = SrcsetField()
 
     class Meta:
         model = Subcategory
-        fields = ('name', 'slug', 'image')
+        fields = ('name', 'slug', 'image', 'srcset')
 
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Сериализатор модели Category."""
 
+    srcset = SrcsetField()
     subcategories = serializers.SerializerMethodField()
 
+    nested_serializers = {'subcategories': SubcategorySerializer}
+
     class Meta:
         model = Category
-        fields = ('name', 'slug', 'image', 'subcategories')
+        fields = ('name', 'slug', 'image', 'srcset', 'subcategories')
 
     def get_subcategories(self, obj):
         subcategories = obj.subcategories.all()
-        serializer = SubcategorySerializer(subcategories, many=True)
+        serializer = self.get_nested_serializer(
+            'subcategories', subcategories, many=True
+        )
         return serializer.data
 
 
-class ProductImageSerializer(serializers.ModelSerializer):
+class ProductImageSerializer(
+    SparseFieldsetMixin, serializers.ModelSerializer
+):
+
+    srcset = SrcsetField()
 
     class Meta:
         model = ProductImage
-        fields = ('image',)
+        fields = ('image', 'srcset')
+
+
+def expanded_category(fieldset):
+    return CategorySerializer(
+        read_only=True,
+        fieldset=fieldset or dict.fromkeys(('name', 'slug', 'image', 'srcset'))
+    )
 
 
-class ProductSerializer(serializers.ModelSerializer):
-    """Сериализатор модели Product."""
+def expanded_subcategory(fieldset):
+    return SubcategorySerializer(read_only=True, fieldset=fieldset)
+
+
+class ProductSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    """Сериализатор модели Product.
+
+    Категория и подкатегория выводятся названиями, с `?expand=` —
+    объектами.
+    """
 
     category = serializers.StringRelatedField(read_only=True)
     subcategory = serializers.StringRelatedField(read_only=True)
     images = serializers.SerializerMethodField()
 
+    expandable_fields = {
+        'category': expanded_category,
+        'subcategory': expanded_subcategory,
+    }
+    nested_serializers = {'images': ProductImageSerializer}
+
     class Meta:
         model = Product
         fields = ('name', 'slug', 'category', 'subcategory', 'price', 'images')
 
     def get_images(self, obj):
         images = obj.product_images
-        serializer = ProductImageSerializer(images, many=True)
+        serializer = self.get_nested_serializer('images', images, many=True)
         return serializer.data
 
 
-class CartItemSerializer(serializers.ModelSerializer):
+class ProductFilterSerializer(serializers.Serializer):
+    """Параметры фильтрации и сортировки списка продуктов."""
+
+    ORDERING = ('price', '-price', 'name', '-name')
+
+    category = serializers.SlugField(required=False)
+    subcategory = serializers.SlugField(required=False)
+    min_price = serializers.FloatField(min_value=0, required=False)
+    max_price = serializers.FloatField(min_value=0, required=False)
+    ordering = serializers.ChoiceField(choices=ORDERING, required=False)
+
+    def validate(self, data):
+        if data.get('min_price', 0) > data.get('max_price', float('inf')):
+            raise serializers.ValidationError(
+                'Минимальная цена больше максимальной!'
+            )
+        return data
+
+
+class CartItemSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Сериализатор модели CartItem."""
 
     product = ProductSerializer(read_only=True)
@@ -80,18 +161,176 @@ class CartItemQuantitySerializer(serializers.ModelSerializer):
         return serializer.data
 
 
-class ShoppingCartSerializer(serializers.ModelSerializer):
+class ShoppingCartSerializer(
+    SparseFieldsetMixin, serializers.ModelSerializer
+):
     """Сериализатор модели ShoppingCart."""
 
     products = serializers.SerializerMethodField()
     total_quantity = serializers.IntegerField(read_only=True)
     total_price = serializers.FloatField(read_only=True)
 
+    nested_serializers = {'products': CartItemSerializer}
+
     class Meta:
         model = ShoppingCart
         fields = ('products', 'total_quantity', 'total_price')
 
     def get_products(self, obj):
         cart_items = obj.cart_items.all()
-        serializer = CartItemSerializer(cart_items, many=True)
+        serializer = self.get_nested_serializer(
+            'products', cart_items, many=True
+        )
         return serializer.data
+
+
+class CartOperationSerializer(serializers.Serializer):
+    """Одна операция пакетного изменения корзины."""
+
+    SET = 'set'
+    INCREMENT = 'increment'
+    REMOVE = 'remove'
+
+    product = serializers.IntegerField()
+    quantity = serializers.IntegerField(
+        min_value=1, max_value=MAX_PRODUCT_QUANTITY, required=False
+    )
+    operation = serializers.ChoiceField(
+        choices=(SET, INCREMENT, REMOVE), default=SET
+    )
+
+    def validate(self, data):
+        if data['operation'] != self.REMOVE and 'quantity' not in data:
+            raise serializers.ValidationError('Укажите количество продукта!')
+        return data
+
+
+class ShoppingCartBatchSerializer(serializers.Serializer):
+    """Сериализатор пакетного изменения корзины.
+
+    Все продукты проверяются одним запросом, изменения применяются
+    через bulk_create, bulk_update и одно удаление в одной транзакции.
+    Итоги корзины сдвигаются на разницу одним UPDATE.
+    """
+
+    operations = CartOperationSerializer(many=True, allow_empty=False)
+
+    def validate_operations(self, operations):
+        product_ids = {operation['product'] for operation in operations}
+        products = Product.objects.only('id', 'price').in_bulk(product_ids)
+        missing = sorted(product_ids - products.keys())
+        if missing:
+            raise serializers.ValidationError(
+                f'Продукты не найдены: {", ".join(map(str, missing))}.'
+            )
+        for operation in operations:
+            operation['product'] = products[operation['product']]
+        return operations
+
+    def check_quantity(self, quantity):
+        if quantity > MAX_PRODUCT_QUANTITY:
+            raise serializers.ValidationError({
+                'operations': 'Количество продукта не может превышать '
+                              f'{MAX_PRODUCT_QUANTITY}.'
+            })
+        return quantity
+
+    def get_quantities(self, operations, quantities):
+        """Количества продуктов после операций.
+
+        quantities — текущие количества {id продукта: количество}.
+        """
+        quantities = dict(quantities)
+        for operation in operations:
+            product_id = operation['product'].id
+            if operation['operation'] == CartOperationSerializer.SET:
+                quantities[product_id] = operation['quantity']
+            elif operation['operation'] == CartOperationSerializer.INCREMENT:
+                quantities[product_id] = (
+                    quantities.get(product_id, 0) + operation['quantity']
+                )
+            else:
+                quantities[product_id] = 0
+            quantities[product_id] = self.check_quantity(
+                quantities[product_id]
+            )
+        return quantities
+
+    def create(self, validated_data):
+        shopping_cart = validated_data['shopping_cart']
+        operations = validated_data['operations']
+        products = {
+            operation['product'].id: operation['product']
+            for operation in operations
+        }
+        with transaction.atomic():
+            # Корзина блокируется раньше позиций, как в
+            # CartItemQuerySet.add_product() и reprice(); блокировка
+            # выстраивает изменения одной корзины в очередь, и две
+            # порции не вставят одну позицию одновременно.
+            ShoppingCart.objects.select_for_update().filter(
+                pk=shopping_cart.pk
+            ).values_list('pk').get()
+            cart_items = {
+                cart_item.product_id: cart_item
+                for cart_item in CartItem.objects.select_for_update().filter(
+                    shopping_cart=shopping_cart, product__in=products
+                )
+            }
+            quantities = self.get_quantities(operations, {
+                product_id: cart_item.product_quantity
+                for product_id, cart_item in cart_items.items()
+            })
+            new_items, changed_items, removed_ids = [], [], []
+            quantity_delta, price_delta = 0, 0.0
+            for product_id, quantity in quantities.items():
+                cart_item = cart_items.get(product_id)
+                price = quantity * products[product_id].price
+                if not quantity:
+                    if cart_item is not None:
+                        removed_ids.append(cart_item.id)
+                elif cart_item is None:
+                    new_items.append(CartItem(
+                        shopping_cart=shopping_cart,
+                        product=products[product_id],
+                        product_quantity=quantity,
+                        product_price=price
+                    ))
+                    quantity_delta += quantity
+                    price_delta += price
+                elif (
+                    cart_item.product_quantity != quantity
+                    or cart_item.product_price != price
+                ):
+                    quantity_delta += quantity - cart_item.product_quantity
+                    price_delta += price - cart_item.product_price
+                    cart_item.product_quantity = quantity
+                    cart_item.product_price = price
+                    changed_items.append(cart_item)
+            if new_items:
+                CartItem.objects.bulk_create(new_items)
+            if changed_items:
+                CartItem.objects.bulk_update(
+                    changed_items, ('product_quantity', 'product_price')
+                )
+            if new_items or changed_items:
+                ShoppingCart.objects.filter(pk=shopping_cart.pk).update(
+                    total_quantity=F('total_quantity') + quantity_delta,
+                    total_price=F('total_price') + price_delta,
+                    updated_at=timezone.now()
+                )
+            if removed_ids:
+                CartItem.objects.filter(id__in=removed_ids).delete()
+        return shopping_cart
+
+
+class ShoppingCartMergeSerializer(ShoppingCartBatchSerializer):
+    """Применение уже принятых изменений: перенос корзины гостя
+    и сброс буфера записи корзины.
+
+    Количество продукта ограничивается максимумом, а не отклоняет
+    все изменения пользователя целиком.
+    """
+
+    def check_quantity(self, quantity):
+        return min(quantity, MAX_PRODUCT_QUANTITY)
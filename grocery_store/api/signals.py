@@ -0,0 +1,32 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.signals import user_logged_in
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import forget_tokens
+from .guest_cart import COOKIE_NAME, GuestCart, merge_guest_cart
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(instance, **kwargs):
+    forget_tokens(instance.key)
+
+
+@receiver(post_save, sender=get_user_model())
+def user_changed(instance, update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    forget_tokens(*Token.objects.filter(
+        user_id=instance.pk
+    ).values_list('key', flat=True))
+
+
+@receiver(user_logged_in)
+def merge_guest_cart_on_login(request, user, **kwargs):
+    # djoser передаёт запрос DRF, cookie удаляет GuestCartMiddleware.
+    request = getattr(request, '_request', request)
+    if request is None or COOKIE_NAME not in request.COOKIES:
+        return
+    merge_guest_cart(user, GuestCart.from_request(request))
+    request.guest_cart_merged = True
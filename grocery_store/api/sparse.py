@@ -0,0 +1,147 @@
+"""Выборочные поля ответа (`?fields=`) и раскрытие связей (`?expand=`).
+
+Оба параметра — списки через запятую, вложенные поля записываются
+через точку: `?fields=products.product.name,total_price`. Списки
+разбираются в дерево {поле: поддерево}, где None означает все поля.
+"""
+from rest_framework.exceptions import ValidationError
+
+FIELDS_QUERY_PARAM = 'fields'
+EXPAND_QUERY_PARAM = 'expand'
+
+
+def parse_fieldset(value):
+    """'a,b.c,b.d' → {'a': None, 'b': {'c': None, 'd': None}}."""
+    if value is None:
+        return None
+    tree = {}
+    for path in value.split(','):
+        names = [name.strip() for name in path.split('.')]
+        if not all(names):
+            continue
+        node = tree
+        for name in names[:-1]:
+            if node.get(name) is None:
+                node[name] = {}
+            node = node[name]
+        node.setdefault(names[-1], None)
+    return tree or None
+
+
+def includes(fieldset, *path):
+    """Попадает ли поле с путём path в ответ."""
+    for name in path:
+        if fieldset is None:
+            return True
+        if name not in fieldset:
+            return False
+        fieldset = fieldset[name]
+    return True
+
+
+def subtree(tree, name):
+    return None if tree is None else tree.get(name)
+
+
+def prune(data, fieldset):
+    """Оставляет в готовых данных только поля из fieldset."""
+    if fieldset is None:
+        return data
+    if isinstance(data, list):
+        return [prune(item, fieldset) for item in data]
+    return {
+        name: prune(value, fieldset[name])
+        for name, value in data.items()
+        if name in fieldset
+    }
+
+
+class SparseFieldsetMixin:
+    """Сериализатор с выборочными полями и раскрываемыми связями.
+
+    fieldset — дерево оставляемых полей, expand — дерево связей для
+    раскрытия. Имя с поддеревом в expand раскрывается во вложенном
+    сериализаторе, без поддерева — здесь, через expandable_fields.
+    Вложенные сериализаторы-поля и nested_serializers для методов
+    получают свои поддеревья.
+    """
+
+    expandable_fields = {}
+    nested_serializers = {}
+
+    def __init__(self, *args, fieldset=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fieldset = fieldset
+        self.expand = expand or {}
+        for name, nested_expand in self.expand.items():
+            if nested_expand is None:
+                if name not in self.expandable_fields:
+                    raise ValidationError({EXPAND_QUERY_PARAM: [
+                        f'Поле `{name}` нельзя раскрыть.'
+                    ]})
+                self.fields[name] = self.expandable_fields[name](
+                    subtree(fieldset, name)
+                )
+            elif name not in self.fields:
+                raise ValidationError({EXPAND_QUERY_PARAM: [
+                    f'Неизвестное поле `{name}`.'
+                ]})
+        if fieldset is not None:
+            unknown = set(fieldset) - set(self.fields)
+            if unknown:
+                raise ValidationError({FIELDS_QUERY_PARAM: [
+                    f'Неизвестное поле `{name}`.' for name in sorted(unknown)
+                ]})
+            for name in set(self.fields) - set(fieldset):
+                self.fields.pop(name)
+        for name, field in list(self.fields.items()):
+            if name in self.expand and self.expand[name] is None:
+                continue
+            kwargs = self.nested_kwargs(name)
+            if not any(kwargs.values()):
+                continue
+            if isinstance(field, SparseFieldsetMixin):
+                self.fields[name] = type(field)(
+                    *field._args, **{**field._kwargs, **kwargs}
+                )
+            elif name in self.nested_serializers:
+                # Проверка поддеревьев до сериализации данных.
+                self.nested_serializers[name](**kwargs)
+            else:
+                raise ValidationError({FIELDS_QUERY_PARAM: [
+                    f'У поля `{name}` нет вложенных полей.'
+                ]})
+
+    def nested_kwargs(self, name):
+        return {
+            'fieldset': subtree(self.fieldset, name),
+            'expand': self.expand.get(name),
+        }
+
+    def get_nested_serializer(self, name, instance, **kwargs):
+        return self.nested_serializers[name](
+            instance, **kwargs, **self.nested_kwargs(name)
+        )
+
+
+class SparseFieldsetViewMixin:
+    """Передаёт сериализаторам поля и связи из параметров запроса."""
+
+    def get_fieldset_kwargs(self):
+        if not hasattr(self, '_fieldset_kwargs'):
+            params = self.request.query_params
+            self._fieldset_kwargs = {
+                'fieldset': parse_fieldset(params.get(FIELDS_QUERY_PARAM)),
+                'expand': parse_fieldset(params.get(EXPAND_QUERY_PARAM)),
+            }
+        return self._fieldset_kwargs
+
+    def get_fieldset(self):
+        return self.get_fieldset_kwargs()['fieldset']
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.update(self.get_fieldset_kwargs())
+        if hasattr(super(), 'get_serializer'):
+            return super().get_serializer(*args, **kwargs)
+        # У APIView нет get_serializer(), сериализатор — serializer_class.
+        return self.serializer_class(*args, **kwargs)
@@ -15,5 +15,8 @@ urlpatterns = [
     path('', include(router.urls)),
     path('auth/', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
-    path('shopping_cart/', ShoppingCartAPIView.as_view()),
+    path('auth/', include('djoser.urls.jwt')),
+    path(
+        'shopping_cart/', ShoppingCartAPIView.as_view(), name='shopping-cart'
+    ),
 ]
@@ -0,0 +1,309 @@
+"""Сериализация только для чтения из .values() без экземпляров моделей.
+
+Выдаёт те же данные, что ProductSerializer, CategorySerializer
+и ShoppingCartSerializer без `?fields=` и `?expand=`, но строит их
+прямо из словарей строк и сгруппированных по родителю изображений.
+Совпадение JSON с DRF-сериализаторами проверяет контрактный тест.
+Включается настройкой READ_SERIALIZER = 'values'. Для асинхронных
+вьюх у сериализаторов есть варианты с async ORM: `adata()`.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+
+from products.images import get_srcset
+from products.models import (
+    CartItem, Category, Product, ProductImage, ShoppingCart, Subcategory
+)
+
+PRODUCT_FIELDS = (
+    'id', 'name', 'slug', 'category__name', 'subcategory__name', 'price'
+)
+
+
+def is_enabled():
+    return settings.READ_SERIALIZER == 'values'
+
+
+def get_storage(model):
+    return model._meta.get_field('image').storage
+
+
+def image_url(name, storage, request=None):
+    """Как ImageField.to_representation сериализатора DRF."""
+    if not name:
+        return None
+    url = storage.url(name)
+    if request is not None:
+        return request.build_absolute_uri(url)
+    return url
+
+
+def image_srcset(name, storage, request=None):
+    """Как SrcsetField.to_representation."""
+    if not name:
+        return None
+    return get_srcset(name, lambda derivative: image_url(
+        derivative, storage, request
+    ))
+
+
+def image_data(name, storage, request=None):
+    return {
+        'image': image_url(name, storage, request),
+        'srcset': image_srcset(name, storage, request),
+    }
+
+
+def optional(convert, value):
+    return None if value is None else convert(value)
+
+
+class ProductValuesSerializer:
+    """Данные ProductSerializer для строк .values()."""
+
+    def __init__(self, rows, prefix=''):
+        self.rows = rows
+        self.prefix = prefix
+
+    @staticmethod
+    def get_values(queryset, prefix=''):
+        return queryset.prefetch_related(None).values(
+            *(f'{prefix}{field}' for field in PRODUCT_FIELDS)
+        )
+
+    @staticmethod
+    def get_image_rows(product_ids):
+        return ProductImage.objects.filter(
+            product_id__in=product_ids
+        ).order_by('id').values_list('product_id', 'image')
+
+    @staticmethod
+    def group_images(image_rows):
+        """{id продукта: [данные изображений]}."""
+        storage = get_storage(ProductImage)
+        images = defaultdict(list)
+        for product_id, name in image_rows:
+            images[product_id].append(image_data(name, storage))
+        return images
+
+    @classmethod
+    def get_images(cls, product_ids):
+        """Изображения продуктов одним запросом."""
+        return cls.group_images(cls.get_image_rows(product_ids))
+
+    @classmethod
+    async def aget_images(cls, product_ids):
+        return cls.group_images(
+            [row async for row in cls.get_image_rows(product_ids)]
+        )
+
+    def get_product_ids(self, rows):
+        return {row[f'{self.prefix}id'] for row in rows}
+
+    def serialize(self, rows, images):
+        prefix = self.prefix
+        return [
+            {
+                'name': row[f'{prefix}name'],
+                'slug': row[f'{prefix}slug'],
+                'category': row[f'{prefix}category__name'],
+                'subcategory': row[f'{prefix}subcategory__name'],
+                'price': optional(float, row[f'{prefix}price']),
+                'images': images.get(row[f'{prefix}id'], []),
+            }
+            for row in rows
+        ]
+
+    @property
+    def data(self):
+        rows = list(self.rows)
+        images = self.get_images(self.get_product_ids(rows))
+        return self.serialize(rows, images)
+
+    async def adata(self):
+        rows = self.rows
+        if not isinstance(rows, list):
+            rows = [row async for row in rows]
+        images = await self.aget_images(self.get_product_ids(rows))
+        return self.serialize(rows, images)
+
+
+class CategoryValuesSerializer:
+    """Данные CategorySerializer для всех категорий по порядку id."""
+
+    def __init__(self, request=None):
+        self.request = request
+
+    def by_id(self):
+        """{id категории: данные категории}."""
+        category_storage = get_storage(Category)
+        subcategory_storage = get_storage(Subcategory)
+        subcategories = defaultdict(list)
+        for row in Subcategory.objects.order_by('id').values(
+            'category_id', 'name', 'slug', 'image'
+        ):
+            subcategories[row['category_id']].append({
+                'name': row['name'],
+                'slug': row['slug'],
+                **image_data(row['image'], subcategory_storage),
+            })
+        return {
+            row['id']: {
+                'name': row['name'],
+                'slug': row['slug'],
+                **image_data(row['image'], category_storage, self.request),
+                'subcategories': subcategories.get(row['id'], []),
+            }
+            for row in Category.objects.order_by('id').values(
+                'id', 'name', 'slug', 'image'
+            )
+        }
+
+    @property
+    def data(self):
+        return list(self.by_id().values())
+
+
+class ShoppingCartValuesSerializer:
+    """Данные ShoppingCartSerializer для корзины пользователя.
+
+    Уже прочитанную строку корзины (например, при проверке ETag) можно
+    передать в shopping_cart, чтобы не читать её повторно.
+    """
+
+    def __init__(self, user_id, shopping_cart=None):
+        self.user_id = user_id
+        self.shopping_cart = shopping_cart
+
+    def get_shopping_cart_values(self):
+        return ShoppingCart.objects.filter(user_id=self.user_id).values(
+            'id', 'total_quantity', 'total_price', 'updated_at'
+        )
+
+    @staticmethod
+    def created_values(shopping_cart):
+        return {
+            'id': shopping_cart.id,
+            'total_quantity': shopping_cart.total_quantity,
+            'total_price': shopping_cart.total_price,
+            'updated_at': shopping_cart.updated_at,
+        }
+
+    def get_shopping_cart(self):
+        if self.shopping_cart is not None:
+            return self.shopping_cart
+        shopping_cart = self.get_shopping_cart_values().first()
+        if shopping_cart is None:
+            created, _ = ShoppingCart.objects.get_or_create(
+                user_id=self.user_id
+            )
+            shopping_cart = self.created_values(created)
+        return shopping_cart
+
+    async def aget_shopping_cart(self):
+        if self.shopping_cart is not None:
+            return self.shopping_cart
+        shopping_cart = await self.get_shopping_cart_values().afirst()
+        if shopping_cart is None:
+            created, _ = await ShoppingCart.objects.aget_or_create(
+                user_id=self.user_id
+            )
+            shopping_cart = self.created_values(created)
+        return shopping_cart
+
+    @staticmethod
+    def get_cart_item_rows(**filters):
+        return CartItem.objects.filter(**filters).order_by('id').values(
+            'product_quantity', 'product_price',
+            *(f'product__{field}' for field in PRODUCT_FIELDS)
+        )
+
+    @staticmethod
+    def serialize_cart_items(rows, products):
+        """Данные CartItemSerializer."""
+        return [
+            {
+                'product': product,
+                'product_quantity': optional(int, row['product_quantity']),
+                'product_price': optional(float, row['product_price']),
+            }
+            for row, product in zip(rows, products)
+        ]
+
+    def serialize(self, shopping_cart, cart_items):
+        return {
+            'products': cart_items,
+            'total_quantity': optional(int, shopping_cart['total_quantity']),
+            'total_price': optional(float, shopping_cart['total_price']),
+        }
+
+    @property
+    def data(self):
+        shopping_cart = self.get_shopping_cart()
+        rows = list(self.get_cart_item_rows(
+            shopping_cart_id=shopping_cart['id']
+        ))
+        products = ProductValuesSerializer(rows, prefix='product__').data
+        return self.serialize(
+            shopping_cart, self.serialize_cart_items(rows, products)
+        )
+
+    async def adata(self):
+        shopping_cart = await self.aget_shopping_cart()
+        rows = [
+            row async for row in self.get_cart_item_rows(
+                shopping_cart_id=shopping_cart['id']
+            )
+        ]
+        products = await ProductValuesSerializer(
+            rows, prefix='product__'
+        ).adata()
+        return self.serialize(
+            shopping_cart, self.serialize_cart_items(rows, products)
+        )
+
+
+class GuestShoppingCartValuesSerializer(ShoppingCartValuesSerializer):
+    """Данные ShoppingCartSerializer для корзины гостя.
+
+    quantities — {id продукта: количество} в порядке добавления;
+    стоимость позиций и итоги считаются по текущим ценам, удалённые
+    из каталога продукты пропускаются.
+    """
+
+    def __init__(self, quantities):
+        self.quantities = quantities
+
+    @property
+    def data(self):
+        product_rows = {
+            row['id']: row
+            for row in ProductValuesSerializer.get_values(
+                Product.objects.filter(pk__in=self.quantities)
+            )
+        }
+        rows = [
+            product_rows[product_id] for product_id in self.quantities
+            if product_id in product_rows
+        ]
+        cart_item_rows = [
+            {
+                'product_quantity': self.quantities[row['id']],
+                'product_price': self.quantities[row['id']] * row['price'],
+            }
+            for row in rows
+        ]
+        return self.serialize(
+            {
+                'total_quantity': sum(
+                    row['product_quantity'] for row in cart_item_rows
+                ),
+                'total_price': sum(
+                    row['product_price'] for row in cart_item_rows
+                ),
+            },
+            self.serialize_cart_items(
+                cart_item_rows, ProductValuesSerializer(rows).data
+            )
+        )
@@ -1,65 +1,412 @@
-from django.db.models import Sum
+import io
+
+from django.conf import settings
+from django.db.models import Prefetch, prefetch_related_objects
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from drf_spectacular.utils import extend_schema, extend_schema_view
-from rest_framework import permissions, status, viewsets
+from django.utils.cache import patch_vary_headers
+from drf_spectacular.utils import (
+    OpenApiParameter, extend_schema, extend_schema_view, inline_serializer
+)
+from rest_framework import permissions, serializers, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from products.export import FORMATS as EXPORT_FORMATS, CatalogExport
+from products.images import get_executor
+from products.importer import (
+    FORMATS as IMPORT_FORMATS, CatalogImport, iter_records
+)
 from products.models import CartItem, Category, Product, ShoppingCart
+from products.search import search_index
+from products.versions import CATALOG, get_version
+from .cart_buffer import flush_cart_buffer, get_cart_buffer
+from .category_tree import category_tree
+from .conditional import (
+    CatalogConditionalGetMixin, ConditionalGetMixin, shopping_cart_validators
+)
+from .export import (
+    EXPORT_FORMAT_QUERY_PARAM, accepts_gzip, stream_export
+)
+from .filters import ProductFilterBackend
+from .guest_cart import GuestCartMixin, GuestShoppingCart
+from .pagination import KeysetPaginationMixin
+from .response_cache import CachedResponseMixin
 from .serializers import (
     CartItemSerializer, CartItemQuantitySerializer, CategorySerializer,
-    ProductSerializer, ShoppingCartSerializer,
+    ProductSerializer, ShoppingCartBatchSerializer, ShoppingCartSerializer,
+)
+from .sparse import SparseFieldsetViewMixin, includes, prune, subtree
+from .values_serializers import (
+    GuestShoppingCartValuesSerializer, ProductValuesSerializer,
+    ShoppingCartValuesSerializer, is_enabled as values_serializers_enabled,
 )
 
+SPARSE_FIELDSET_DESCRIPTION = (
+    ' Параметр `fields` оставляет в ответе только перечисленные поля '
+    '(вложенные — через точку), `expand` выводит связи объектами.'
+)
+
+
+def make_cart_item(product, quantity):
+    """Несохранённая позиция корзины гостя или буфера записи."""
+    return CartItem(
+        product=product, product_quantity=quantity,
+        product_price=quantity * product.price
+    )
+
+
+def get_product_relations(fieldset):
+    """Связи продукта, которые понадобятся для полей из fieldset."""
+    return {
+        'category': includes(fieldset, 'category'),
+        'subcategory': includes(fieldset, 'subcategory'),
+        'images': includes(fieldset, 'images'),
+    }
+
 
 @extend_schema(tags=['Category'])
 @extend_schema_view(
     list=extend_schema(
         summary='Получение списка категорий.',
-        description='Вывод списка категорий с подкатегориями с пагинацией.'
+        description=(
+            'Вывод списка категорий с подкатегориями с пагинацией. '
+            'С параметром `pagination=keyset` используется пагинация '
+            'по курсору без подсчёта общего числа категорий.'
+            + SPARSE_FIELDSET_DESCRIPTION
+        )
     ),
     retrieve=extend_schema(
         summary='Получение информации о конкретной категории.',
         description='Вывод категории с подкатегориями.'
     )
 )
-class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
-    """Вьюсет для модели Category."""
+class CategoryViewSet(
+    CatalogConditionalGetMixin, CachedResponseMixin, SparseFieldsetViewMixin,
+    KeysetPaginationMixin, viewsets.ReadOnlyModelViewSet
+):
+    """Вьюсет для модели Category.
+
+    Ответы собираются из снимка дерева категорий, который обновляется
+    при изменении категорий и подкатегорий.
+    """
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = (permissions.AllowAny, )
 
+    def get_categories(self, request):
+        """Снимок дерева с полями из `?fields=`."""
+        # Сериализатор проверяет запрошенные поля.
+        self.get_serializer()
+        categories = category_tree.get(request)
+        fieldset = self.get_fieldset()
+        if fieldset is None:
+            return categories
+        return {
+            category_id: prune(category, fieldset)
+            for category_id, category in categories.items()
+        }
+
+    def list(self, request, *args, **kwargs):
+        categories = self.get_categories(request)
+        page = self.paginate_queryset(list(categories))
+        if page is not None:
+            return self.get_paginated_response(
+                [categories[category_id] for category_id in page]
+            )
+        return Response(list(categories.values()))
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            category_id = int(kwargs[self.lookup_field])
+        except ValueError:
+            raise Http404
+        category = self.get_categories(request).get(category_id)
+        if category is None:
+            raise Http404
+        return Response(category)
+
 
 @extend_schema(tags=['Product'])
 @extend_schema_view(
     list=extend_schema(
         summary='Получение списка продуктов.',
-        description='Вывод списка продуктов с пагинацией.',
+        description=(
+            'Вывод списка продуктов с пагинацией. С параметром '
+            '`pagination=keyset` используется пагинация по курсору: '
+            'ссылка `next` ведёт на следующую страницу, размер страницы '
+            'задаётся параметром `page_size` (не больше 100). '
+            'Продукты фильтруются по slug категории и подкатегории '
+            'и диапазону цен и сортируются по цене или названию.'
+            + SPARSE_FIELDSET_DESCRIPTION
+        ),
     ),
     retrieve=extend_schema(
         summary='Получение информации о конкретном продукте.',
-        description='Вывод информации о конкретном продукте.'
+        description=(
+            'Вывод информации о конкретном продукте.'
+            + SPARSE_FIELDSET_DESCRIPTION
+        )
     ),
 )
-class ProductViewSet(viewsets.ReadOnlyModelViewSet):
-    """Вьюсет для модели Product."""
-    queryset = Product.objects.all()
+class ProductViewSet(
+    GuestCartMixin, CatalogConditionalGetMixin, CachedResponseMixin,
+    SparseFieldsetViewMixin, KeysetPaginationMixin,
+    viewsets.ReadOnlyModelViewSet
+):
+    """Вьюсет для модели Product.
+
+    Связи продукта загружаются, только если их поля попадут в ответ.
+    """
+    queryset = Product.objects.order_by('id')
     serializer_class = ProductSerializer
     permission_classes = (permissions.AllowAny, )
+    filter_backends = (ProductFilterBackend, )
+    cached_actions = ('list', 'retrieve', 'search')
+    guest_cart_actions = ('shopping_cart', )
+
+    def use_values_serializer(self):
+        """Ответ в стандартном виде можно собрать из .values()."""
+        return values_serializers_enabled() and not any(
+            self.get_fieldset_kwargs().values()
+        )
+
+    def get_queryset(self):
+        fieldset = self.get_fieldset()
+        if self.action == 'shopping_cart':
+            fieldset = (
+                subtree(fieldset, 'product')
+                if includes(fieldset, 'product') else {}
+            )
+        return super().get_queryset().with_related(
+            **get_product_relations(fieldset)
+        )
+
+    def list(self, request, *args, **kwargs):
+        if not self.use_values_serializer():
+            return super().list(request, *args, **kwargs)
+        queryset = ProductValuesSerializer.get_values(
+            self.filter_queryset(self.get_queryset())
+        )
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(
+                ProductValuesSerializer(page).data
+            )
+        return Response(ProductValuesSerializer(queryset).data)
+
+    @extend_schema(
+        summary='Поиск продуктов.',
+        description=(
+            'Поиск по названиям продуктов, их категорий и подкатегорий '
+            'с учётом форм слов, начала слова и опечаток. Продукты '
+            'выводятся по убыванию релевантности с пагинацией.'
+        ),
+        parameters=[
+            OpenApiParameter('q', str, required=True,
+                             description='Поисковый запрос.'),
+        ],
+    )
+    @action(detail=False)
+    def search(self, request):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            raise ValidationError({'q': ['Введите поисковый запрос.']})
+        product_ids = search_index.search(query)
+        page = self.paginate_queryset(product_ids)
+        if page is not None:
+            product_ids = page
+        if self.use_values_serializer():
+            rows = {
+                row['id']: row
+                for row in ProductValuesSerializer.get_values(
+                    self.get_queryset().filter(pk__in=product_ids)
+                )
+            }
+            data = ProductValuesSerializer(
+                [rows[pk] for pk in product_ids if pk in rows]
+            ).data
+        else:
+            products = self.get_queryset().in_bulk(product_ids)
+            data = self.get_serializer(
+                [products[pk] for pk in product_ids if pk in products],
+                many=True
+            ).data
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
 
     def get_shopping_cart(self, request):
         shopping_cart, _ = ShoppingCart.objects.get_or_create(
-            user=request.user
+            user_id=request.user.pk
         )
         return shopping_cart
 
+    @property
+    def cart_buffer(self):
+        """Буфер записи корзины пользователя, если он включён."""
+        return None if self.is_guest else get_cart_buffer()
+
     def get_cart_item(self, request):
-        return get_object_or_404(
-            CartItem,
-            shopping_cart=self.get_shopping_cart(request=request),
-            product=self.get_object()
+        product = self.get_object()
+        if self.is_guest:
+            quantity = self.guest_cart.quantities.get(product.pk)
+        elif self.cart_buffer is not None:
+            quantity = self.cart_buffer.get_quantity(
+                request.user.pk, product.pk
+            )
+        else:
+            cart_item = get_object_or_404(
+                CartItem,
+                shopping_cart=self.get_shopping_cart(request=request),
+                product=product
+            )
+            cart_item.product = product
+            return cart_item
+        if not quantity:
+            raise Http404
+        return make_cart_item(product, quantity)
+
+    @extend_schema(
+        summary='Выгрузка всего каталога.',
+        description=(
+            'Потоковая выгрузка всех продуктов с категорией, подкатегорией '
+            'и адресами изображений в NDJSON (по объекту в строке) или CSV. '
+            'Принимает те же фильтры, что и список продуктов, кроме '
+            'сортировки: продукты всегда упорядочены по id. Если клиент '
+            'принимает gzip, выгрузка сжимается на лету.'
+        ),
+        parameters=[
+            OpenApiParameter(
+                EXPORT_FORMAT_QUERY_PARAM, str, enum=tuple(EXPORT_FORMATS),
+                description='Формат выгрузки, по умолчанию ndjson.'
+            ),
+        ],
+        responses={200: None, 400: None, 401: None},
+    )
+    @action(
+        detail=False,
+        permission_classes=(permissions.IsAuthenticated,),
+    )
+    def export(self, request):
+        export_format = request.query_params.get(
+            EXPORT_FORMAT_QUERY_PARAM, 'ndjson'
         )
+        if export_format not in EXPORT_FORMATS:
+            raise ValidationError({EXPORT_FORMAT_QUERY_PARAM: [
+                f'Допустимые форматы: {", ".join(EXPORT_FORMATS)}.'
+            ]})
+        # Выгрузка читается порциями по id и иначе не сортируется.
+        if 'ordering' in request.query_params:
+            raise ValidationError({'ordering': [
+                'Сортировка недоступна в выгрузке: продукты упорядочены по id.'
+            ]})
+        compress = accepts_gzip(request.headers.get('Accept-Encoding', ''))
+        export = CatalogExport(
+            export_format,
+            compress=compress,
+            queryset=self.filter_queryset(Product.objects.all()),
+            build_url=request.build_absolute_uri
+        )
+        response = StreamingHttpResponse(
+            stream_export(export, is_async=hasattr(request, 'scope')),
+            content_type=export.content_type
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="catalog.{export_format}"'
+        )
+        if compress:
+            response['Content-Encoding'] = 'gzip'
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
+
+    @extend_schema(
+        summary='Импорт каталога.',
+        description=(
+            'Создаёт и обновляет категории, подкатегории, продукты и их '
+            'изображения по slug из файла CSV или NDJSON в формате '
+            'выгрузки. Изображения указываются путями относительно '
+            'каталога импорта на сервере. Неизменные строки '
+            'не переписываются, записи с ошибками пропускаются и '
+            'перечисляются в ответе. Только для персонала.'
+        ),
+        request={'multipart/form-data': inline_serializer(
+            name='CatalogImportRequest',
+            fields={
+                'file': serializers.FileField(),
+                'import_format': serializers.ChoiceField(
+                    IMPORT_FORMATS, required=False,
+                    help_text='По умолчанию по расширению файла.'
+                ),
+            }
+        )},
+        responses={200: None, 400: None, 403: None},
+    )
+    @action(
+        detail=False,
+        methods=['post'],
+        url_path='import',
+        permission_classes=(permissions.IsAdminUser,),
+        parser_classes=(MultiPartParser,),
+    )
+    def import_catalog(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            raise ValidationError({'file': ['Загрузите файл импорта.']})
+        import_format = request.data.get('import_format') or (
+            'csv' if upload.name.endswith('.csv') else 'ndjson'
+        )
+        if import_format not in IMPORT_FORMATS:
+            raise ValidationError({'import_format': [
+                f'Допустимые форматы: {", ".join(IMPORT_FORMATS)}.'
+            ]})
+        workers = settings.IMAGE_DERIVATIVES_WORKERS
+        catalog_import = CatalogImport(
+            images_dir=settings.CATALOG_IMPORT_IMAGES_DIR,
+            workers=workers,
+            executor=get_executor(workers) if workers else None
+        )
+        file = io.TextIOWrapper(upload.file, encoding='utf-8', newline='')
+        try:
+            report = catalog_import.run(iter_records(file, import_format))
+        except ValueError as error:
+            raise ValidationError({'file': [str(error)]})
+        return Response(report.as_dict())
+
+    def add_product(self, request):
+        product = self.get_object()
+        if self.is_guest:
+            quantity = self.guest_cart.add(product.pk)
+        elif self.cart_buffer is not None:
+            quantity = self.cart_buffer.add(request.user.pk, product.pk)
+        else:
+            return CartItem.objects.add_product(
+                user=request.user, product=product
+            )
+        return make_cart_item(product, quantity)
+
+    def save_cart_item(self, serializer):
+        if not self.is_guest and self.cart_buffer is None:
+            return serializer.save()
+        product = serializer.instance.product
+        quantity = serializer.validated_data['product_quantity']
+        if self.is_guest:
+            self.guest_cart.update({product.pk: quantity})
+        else:
+            self.cart_buffer.set(self.request.user.pk, product.pk, quantity)
+        return make_cart_item(product, quantity)
+
+    def delete_cart_item(self, request):
+        cart_item = self.get_cart_item(request=request)
+        if self.is_guest:
+            self.guest_cart.remove(cart_item.product_id)
+        elif self.cart_buffer is not None:
+            self.cart_buffer.set(request.user.pk, cart_item.product_id, 0)
+        else:
+            cart_item.delete()
 
     @extend_schema(
         tags=['Shopping Cart'],
@@ -105,17 +452,14 @@ class ProductViewSet(viewsets.ReadOnlyModelViewSet):
     @action(
         detail=True,
         methods=['post', 'patch', 'delete'],
-        permission_classes=(permissions.IsAuthenticated,),
+        permission_classes=(permissions.AllowAny,),
     )
     def shopping_cart(self, request, **kwargs):
         if request.method == 'POST':
-            cart_item, _ = CartItem.objects.get_or_create(
-                shopping_cart=self.get_shopping_cart(request=request),
-                product=self.get_object()
+            cart_item = self.add_product(request=request)
+            serializer = CartItemSerializer(
+                cart_item, **self.get_fieldset_kwargs()
             )
-            cart_item.product_quantity += 1
-            cart_item.save()
-            serializer = CartItemSerializer(cart_item)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         if request.method == 'PATCH':
             serializer = CartItemQuantitySerializer(
@@ -124,28 +468,98 @@ class ProductViewSet(viewsets.ReadOnlyModelViewSet):
                 partial=True
             )
             if serializer.is_valid(raise_exception=True):
-                serializer.save()
+                cart_item = self.save_cart_item(serializer)
+                serializer = CartItemSerializer(
+                    cart_item, **self.get_fieldset_kwargs()
+                )
                 return Response(serializer.data, status=status.HTTP_200_OK)
-        self.get_cart_item(request=request).delete()
+        self.delete_cart_item(request=request)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
 @extend_schema(tags=['Shopping Cart'])
-class ShoppingCartAPIView(APIView):
-    permission_classes = [permissions.IsAuthenticated, ]
+class ShoppingCartAPIView(
+    GuestCartMixin, ConditionalGetMixin, SparseFieldsetViewMixin, APIView
+):
+    permission_classes = [permissions.AllowAny, ]
+    serializer_class = ShoppingCartSerializer
+    shopping_cart_values = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.user.is_authenticated:
+            # Ответ и изменения корзины учитывают отложенные изменения.
+            flush_cart_buffer(request.user.pk)
+
+    def is_conditional(self, request):
+        return request.method == 'GET' and request.user.is_authenticated
+
+    def get_validators(self, request):
+        # Строка корзины, прочитанная для ETag, пригодится для ответа.
+        self.shopping_cart_values = ShoppingCartValuesSerializer(
+            request.user.pk
+        ).get_shopping_cart()
+        return shopping_cart_validators(
+            request.build_absolute_uri(request.path),
+            request.query_params,
+            request.accepted_media_type,
+            get_version(CATALOG),
+            request.user.pk,
+            self.shopping_cart_values['updated_at']
+        )
 
     def get_shopping_cart(self, request):
-        shopping_cart, _ = ShoppingCart.objects.annotate(
-            total_quantity=Sum('cart_items__product_quantity'),
-            total_price=Sum('cart_items__product_price'),
-        ).get_or_create(user=request.user)
+        lookups = []
+        fieldset = self.get_fieldset()
+        if includes(fieldset, 'products'):
+            cart_items = subtree(fieldset, 'products')
+            lookups.append(Prefetch(
+                'cart_items',
+                queryset=CartItem.objects.with_product(
+                    product=includes(cart_items, 'product'),
+                    **get_product_relations(subtree(cart_items, 'product'))
+                ).order_by('id')
+            ))
+        if self.is_guest:
+            products = Product.objects.with_related(**get_product_relations(
+                subtree(subtree(fieldset, 'products'), 'product')
+            )).in_bulk(list(self.guest_cart.quantities))
+            return GuestShoppingCart([
+                make_cart_item(products[product_id], quantity)
+                for product_id, quantity in self.guest_cart.quantities.items()
+                if product_id in products
+            ])
+        if self.shopping_cart_values is None:
+            shopping_cart, _ = ShoppingCart.objects.prefetch_related(
+                *lookups
+            ).get_or_create(user_id=request.user.pk)
+            return shopping_cart
+        shopping_cart = ShoppingCart(
+            user_id=request.user.pk, **self.shopping_cart_values
+        )
+        prefetch_related_objects([shopping_cart], *lookups)
         return shopping_cart
 
+    def get_shopping_cart_data(self, request):
+        if values_serializers_enabled() and not any(
+            self.get_fieldset_kwargs().values()
+        ):
+            if self.is_guest:
+                return GuestShoppingCartValuesSerializer(
+                    self.guest_cart.quantities
+                ).data
+            return ShoppingCartValuesSerializer(
+                request.user.pk, self.shopping_cart_values
+            ).data
+        return self.get_serializer(
+            self.get_shopping_cart(request=request)
+        ).data
+
     @extend_schema(
         summary='Вывод состава корзины.',
         description=(
             'Вывод состава корзины с количеством товаров '
-            'и суммарной стоимостью.'
+            'и суммарной стоимостью.' + SPARSE_FIELDSET_DESCRIPTION
         ),
         request=None,
         responses={
@@ -154,10 +568,44 @@ class ShoppingCartAPIView(APIView):
         }
     )
     def get(self, request):
-        serializer = ShoppingCartSerializer(
-            self.get_shopping_cart(request=request)
+        return Response(self.get_shopping_cart_data(request=request))
+
+    @extend_schema(
+        summary='Пакетное изменение корзины.',
+        description=(
+            'Применяет список операций над позициями корзины за один '
+            'запрос: `set` задаёт количество продукта, `increment` '
+            'увеличивает его на `quantity`, `remove` удаляет продукт. '
+            'Операции применяются по порядку в одной транзакции. '
+            'В ответе выводится обновлённый состав корзины.'
+        ),
+        request=ShoppingCartBatchSerializer,
+        responses={
+            200: ShoppingCartSerializer,
+            400: None,
+            401: None,
+        }
+    )
+    def patch(self, request):
+        serializer = ShoppingCartBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        if self.is_guest:
+            self.guest_cart.update(serializer.get_quantities(
+                serializer.validated_data['operations'],
+                self.guest_cart.quantities
+            ))
+            return Response(
+                self.get_shopping_cart_data(request=request),
+                status=status.HTTP_200_OK
+            )
+        shopping_cart, _ = ShoppingCart.objects.get_or_create(
+            user_id=request.user.pk
+        )
+        serializer.save(shopping_cart=shopping_cart)
+        return Response(
+            self.get_shopping_cart_data(request=request),
+            status=status.HTTP_200_OK
         )
-        return Response(serializer.data)
 
     @extend_schema(
         summary='Полная очистка корзины.',
@@ -169,8 +617,10 @@ class ShoppingCartAPIView(APIView):
         }
     )
     def delete(self, request):
-        cart_items = CartItem.objects.filter(
-            shopping_cart=self.get_shopping_cart(request=request)
-        )
-        cart_items.delete()
+        if self.is_guest:
+            self.guest_cart.clear()
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        CartItem.objects.filter(
+            shopping_cart__user_id=request.user.pk
+        ).delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
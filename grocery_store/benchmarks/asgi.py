@@ -0,0 +1,178 @@
+"""Параллельные запросы к приложению под WSGI и под ASGI.
+
+Запросы отправляются прямо в приложение внутри процесса, без сервера:
+под WSGI — из пула потоков, под ASGI — конкурентными задачами в одном
+цикле событий. Варианты:
+
+    wsgi        grocery_store.wsgi, вьюхи DRF;
+    asgi_drf    grocery_store.asgi с ASYNC_VIEWS = False, вьюхи DRF
+                через sync_to_async;
+    asgi_async  grocery_store.asgi с асинхронными вьюхами.
+
+Каждый вариант запускается в отдельном процессе с собственной БД:
+
+    python -m benchmarks.asgi --concurrency 32 --requests 50
+"""
+import argparse
+import asyncio
+import json
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .utils import (
+    asgi_request, percentile, seed_catalog, setup_django, wsgi_request
+)
+
+CASES = ('wsgi', 'asgi_drf', 'asgi_async')
+
+
+def plan_requests(client, product_ids, requests, write_ratio):
+    """Запросы одного клиента: (метод, путь, строка запроса)."""
+    writes = int(requests * write_ratio)
+    plan = []
+    for number in range(requests):
+        product_id = product_ids[(client + number) % len(product_ids)]
+        if number < writes:
+            plan.append(
+                ('POST', f'/api/products/{product_id}/shopping_cart/', '')
+            )
+        elif number % 3 == 0:
+            plan.append(('GET', '/api/shopping_cart/', ''))
+        elif number % 3 == 1:
+            plan.append(('GET', f'/api/products/{product_id}/', ''))
+        else:
+            plan.append(('GET', '/api/products/', f'page={number % 20 + 1}'))
+    return plan
+
+
+def summarize(latencies, errors, elapsed):
+    latencies.sort()
+    return {
+        'requests_per_second': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.5) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'errors': errors,
+    }
+
+
+def run_wsgi(plans, tokens):
+    from grocery_store.wsgi import application
+
+    latencies, errors = [], 0
+
+    def client(plan, token):
+        nonlocal errors
+        for method, path, query in plan:
+            started = time.perf_counter()
+            status = wsgi_request(
+                application, method, path, query, token=token
+            )
+            latencies.append(time.perf_counter() - started)
+            errors += status >= 400
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(len(plans)) as executor:
+        for future in [
+            executor.submit(client, plan, token)
+            for plan, token in zip(plans, tokens)
+        ]:
+            future.result()
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+def run_asgi(plans, tokens):
+    from grocery_store.asgi import application
+
+    latencies, errors = [], 0
+
+    async def client(plan, token):
+        nonlocal errors
+        for method, path, query in plan:
+            started = time.perf_counter()
+            status = await asgi_request(
+                application, method, path, query, token=token
+            )
+            latencies.append(time.perf_counter() - started)
+            errors += status >= 400
+
+    async def run():
+        await asyncio.gather(*(
+            client(plan, token) for plan, token in zip(plans, tokens)
+        ))
+
+    started = time.perf_counter()
+    asyncio.run(run())
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+def run_case(case, args):
+    setup_django(ASYNC_VIEWS=case == 'asgi_async')
+    seed_catalog(args.products, images_per_product=args.images)
+
+    from rest_framework.authtoken.models import Token
+
+    from products.models import Product
+    from users.models import User
+
+    users = User.objects.bulk_create(
+        User(username=f'user_{number}')
+        for number in range(args.concurrency)
+    )
+    tokens = [
+        token.key for token in Token.objects.bulk_create(
+            Token(user=user, key=Token.generate_key()) for user in users
+        )
+    ]
+    product_ids = list(Product.objects.values_list('pk', flat=True))
+    plans = [
+        plan_requests(client, product_ids, args.requests, args.write_ratio)
+        for client in range(args.concurrency)
+    ]
+    if case == 'wsgi':
+        return run_wsgi(plans, tokens)
+    return run_asgi(plans, tokens)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--case', choices=CASES)
+    parser.add_argument(
+        '--concurrency', type=int, default=32,
+        help='Количество одновременных клиентов.'
+    )
+    parser.add_argument(
+        '--requests', type=int, default=50,
+        help='Количество запросов каждого клиента.'
+    )
+    parser.add_argument(
+        '--write-ratio', type=float, default=0.2,
+        help='Доля запросов, добавляющих продукт в корзину.'
+    )
+    parser.add_argument('--products', type=int, default=1000)
+    parser.add_argument('--images', type=int, default=1)
+    args = parser.parse_args()
+
+    if args.case:
+        print(json.dumps(run_case(args.case, args)))
+        return
+    results = {}
+    for case in CASES:
+        output = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.asgi', '--case', case,
+             '--concurrency', str(args.concurrency),
+             '--requests', str(args.requests),
+             '--write-ratio', str(args.write_ratio),
+             '--products', str(args.products),
+             '--images', str(args.images)],
+            check=True, capture_output=True, text=True
+        ).stdout
+        results[case] = json.loads(output.splitlines()[-1])
+    print(json.dumps(
+        {'concurrency': args.concurrency, 'results': results}, indent=2
+    ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""Накладные расходы аутентификации на один запрос.
+
+    python -m benchmarks.authentication --repeat 5000
+"""
+import argparse
+import json
+import time
+
+from .utils import setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=5000)
+    parser.add_argument(
+        '--users', type=int, default=1000,
+        help='Количество пользователей и токенов в БД.'
+    )
+    args = parser.parse_args()
+
+    setup_django()
+
+    from rest_framework.authentication import TokenAuthentication
+    from rest_framework.authtoken.models import Token
+    from rest_framework.request import Request
+    from rest_framework.test import APIRequestFactory
+    from rest_framework_simplejwt.authentication import (
+        JWTAuthentication, JWTStatelessUserAuthentication
+    )
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    from api.authentication import CachedTokenAuthentication
+    from users.models import User
+
+    users = User.objects.bulk_create(
+        User(username=f'user_{number}') for number in range(args.users)
+    )
+    Token.objects.bulk_create(
+        Token(user=user, key=Token.generate_key()) for user in users
+    )
+    user = users[-1]
+    token = Token.objects.get(user=user).key
+    access = str(AccessToken.for_user(user))
+
+    factory = APIRequestFactory()
+    cases = {
+        'token': (TokenAuthentication, f'Token {token}'),
+        'cached_token': (CachedTokenAuthentication, f'Token {token}'),
+        'jwt': (JWTAuthentication, f'Bearer {access}'),
+        'jwt_stateless': (JWTStatelessUserAuthentication, f'Bearer {access}'),
+    }
+    results = {}
+    for name, (authentication_class, header) in cases.items():
+        authenticator = authentication_class()
+        request = Request(
+            factory.get('/api/shopping_cart/', HTTP_AUTHORIZATION=header)
+        )
+        authenticator.authenticate(request)
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            authenticator.authenticate(request)
+        elapsed = time.perf_counter() - started
+        results[name] = {
+            'us_per_request': round(elapsed / args.repeat * 1e6, 2),
+        }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
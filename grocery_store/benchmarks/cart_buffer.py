@@ -0,0 +1,203 @@
+"""Буфер записи корзины под всплеском изменений количества.
+
+Одновременные пользователи часто жмут «+» и «−» на нескольких
+продуктах (POST, PATCH и DELETE на /api/products/<id>/shopping_cart/).
+Один и тот же план запросов прогоняется через приложение WSGI с прямой
+записью в БД и с буфером записи (CART_WRITE_BEHIND), затем сравниваются
+число записей в БД, задержки и итоговое содержимое корзин:
+
+    python -m benchmarks.cart_buffer --users 16 --taps 100
+"""
+import argparse
+import json
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+from .load import encode
+from .utils import percentile, seed_catalog, setup_django, wsgi_request
+
+MODES = ('direct', 'write_behind')
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE')
+
+
+class WriteCounter:
+    """Считает записи в БД во всех соединениях и потоках."""
+
+    def __init__(self):
+        self.writes = 0
+        self.lock = Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        if sql.lstrip()[:6].upper() in WRITE_STATEMENTS:
+            with self.lock:
+                self.writes += 1
+        return execute(sql, params, many, context)
+
+    def install(self):
+        from django.db import connections
+        from django.db.backends.signals import connection_created
+
+        def add_wrapper(connection, **kwargs):
+            if self not in connection.execute_wrappers:
+                connection.execute_wrappers.append(self)
+
+        connection_created.connect(add_wrapper, weak=False)
+        for connection in connections.all():
+            add_wrapper(connection)
+
+
+def plan_taps(user, taps, products, seed):
+    """Изменения количества нескольких продуктов одного пользователя."""
+    rng = random.Random(f'{seed}:{user}')
+    plan = []
+    for _ in range(taps):
+        product_id = rng.choice(products)
+        url = f'/api/products/{product_id}/shopping_cart/'
+        choice = rng.random()
+        if choice < 0.6:
+            plan.append(('POST', url, None))
+        elif choice < 0.95:
+            quantity = rng.randint(1, 5)
+            plan.append(('PATCH', url, {'product_quantity': quantity}))
+        else:
+            plan.append(('DELETE', url, None))
+    return plan
+
+
+def run_mode(mode, plans, tokens, counter):
+    from django.conf import settings
+
+    from api.cart_buffer import CartBuffer
+    from grocery_store.wsgi import application
+
+    settings.CART_WRITE_BEHIND = mode == 'write_behind'
+    latencies = []
+
+    def user(plan, token):
+        for method, path, body in plan:
+            started = time.perf_counter()
+            status = wsgi_request(
+                application, method, path, body=encode(body), token=token
+            )
+            latencies.append(time.perf_counter() - started)
+            # 404 — удаление или изменение продукта, которого нет.
+            assert status < 400 or status == 404, (method, path, status)
+
+    writes = counter.writes
+    started = time.perf_counter()
+    with ThreadPoolExecutor(len(plans)) as executor:
+        for future in [
+            executor.submit(user, plan, token)
+            for plan, token in zip(plans, tokens)
+        ]:
+            future.result()
+    elapsed = time.perf_counter() - started
+    tap_writes = counter.writes - writes
+    flush_started = time.perf_counter()
+    CartBuffer().flush_due()
+    flush_seconds = time.perf_counter() - flush_started
+    total_writes = counter.writes - writes
+    latencies.sort()
+    return {
+        'taps': len(latencies),
+        'seconds': round(elapsed, 3),
+        'taps_per_second': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.5) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+        'db_writes': total_writes,
+        'db_writes_during_taps': tap_writes,
+        'final_flush_seconds': round(flush_seconds, 3),
+    }
+
+
+def cart_contents(users):
+    from products.models import CartItem
+
+    contents = {user.pk: {} for user in users}
+    for user_id, product_id, quantity in CartItem.objects.filter(
+        shopping_cart__user__in=users
+    ).values_list('shopping_cart__user_id', 'product_id', 'product_quantity'):
+        contents[user_id][product_id] = quantity
+    return [contents[user.pk] for user in users]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--products', type=int, default=1000)
+    parser.add_argument(
+        '--users', type=int, default=16,
+        help='Количество одновременных пользователей.'
+    )
+    parser.add_argument(
+        '--taps', type=int, default=100,
+        help='Количество изменений корзины у каждого пользователя.'
+    )
+    parser.add_argument(
+        '--products-per-user', type=int, default=3,
+        help='Сколько разных продуктов меняет каждый пользователь.'
+    )
+    parser.add_argument(
+        '--interval', type=float, default=1,
+        help='CART_WRITE_BEHIND_INTERVAL в секундах.'
+    )
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    from grocery_store import settings
+
+    setup_django(
+        CART_WRITE_BEHIND_INTERVAL=args.interval,
+        CACHES={**settings.CACHES, 'cart_buffer': {
+            **settings.CART_BUFFER_CACHES['file'],
+            'LOCATION': tempfile.mkdtemp(),
+        }},
+    )
+    seed_catalog(args.products)
+
+    from rest_framework.authtoken.models import Token
+
+    from products.models import Product
+    from users.models import User
+
+    product_ids = list(
+        Product.objects.order_by('id').values_list('id', flat=True)
+    )
+    rng = random.Random(args.seed)
+    plans = [
+        plan_taps(
+            user, args.taps,
+            rng.sample(product_ids, args.products_per_user), args.seed
+        )
+        for user in range(args.users)
+    ]
+    counter = WriteCounter()
+    counter.install()
+    result = {}
+    contents = {}
+    for mode in MODES:
+        users = User.objects.bulk_create(
+            User(username=f'{mode}_{number}', password='!')
+            for number in range(args.users)
+        )
+        tokens = [
+            token.key for token in Token.objects.bulk_create(
+                Token(user=user, key=Token.generate_key()) for user in users
+            )
+        ]
+        result[mode] = run_mode(mode, plans, tokens, counter)
+        contents[mode] = cart_contents(users)
+    direct, buffered = result['direct'], result['write_behind']
+    result['db_writes_saved'] = direct['db_writes'] - buffered['db_writes']
+    result['db_writes_saved_per_second'] = round(
+        result['db_writes_saved'] / buffered['seconds'], 1
+    )
+    result['same_carts'] = contents['direct'] == contents['write_behind']
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
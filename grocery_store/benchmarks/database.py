@@ -0,0 +1,137 @@
+"""Пропускная способность БД при параллельных записях и чтениях корзины.
+
+Сравнивает SQLite с настройками Django по умолчанию и профиль 'sqlite'
+из настроек проекта (WAL, прагмы, IMMEDIATE, CONN_MAX_AGE). Каждый
+вариант запускается в отдельном процессе с собственной БД:
+
+    python -m benchmarks.database --threads 8 --requests 200
+"""
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from threading import Thread
+
+from .utils import seed_catalog, setup_django
+
+CASES = ('plain', 'tuned')
+
+
+def worker(token, product_ids, requests, write_ratio, counters):
+    from django.db import connection
+    from rest_framework.test import APIClient
+
+    client = APIClient(raise_request_exception=False)
+    client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+    writes = int(requests * write_ratio)
+    try:
+        for number in range(requests):
+            product_id = product_ids[number % len(product_ids)]
+            if number < writes and number % 2:
+                response = client.post(
+                    f'/api/products/{product_id}/shopping_cart/'
+                )
+            elif number < writes:
+                response = client.patch(
+                    '/api/shopping_cart/',
+                    {'operations': [{
+                        'product': product_id, 'quantity': 2,
+                        'operation': 'increment',
+                    }]},
+                    format='json'
+                )
+            else:
+                response = client.get('/api/shopping_cart/')
+            key = 'ok' if response.status_code < 400 else 'errors'
+            counters[key] += 1
+    finally:
+        connection.close()
+
+
+def run_case(case, args):
+    db_path = Path(tempfile.mkdtemp()) / 'benchmark.sqlite3'
+    overrides = {}
+    if case == 'plain':
+        overrides['DATABASES'] = {
+            'default': {
+                'ENGINE': 'django.db.backends.sqlite3',
+                'NAME': str(db_path),
+            }
+        }
+    setup_django(db_path, **overrides)
+    seed_catalog(args.products)
+
+    from rest_framework.authtoken.models import Token
+
+    from products.models import Product
+    from users.models import User
+
+    users = User.objects.bulk_create(
+        User(username=f'user_{number}') for number in range(args.threads)
+    )
+    tokens = Token.objects.bulk_create(
+        Token(user=user, key=Token.generate_key()) for user in users
+    )
+    product_ids = list(Product.objects.values_list('pk', flat=True))
+    counters = [{'ok': 0, 'errors': 0} for _ in tokens]
+    threads = [
+        Thread(
+            target=worker,
+            args=(token.key, product_ids, args.requests, args.write_ratio,
+                  thread_counters)
+        )
+        for token, thread_counters in zip(tokens, counters)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    ok = sum(counter['ok'] for counter in counters)
+    return {
+        'requests_per_second': round(ok / elapsed, 1),
+        'ok': ok,
+        'errors': sum(counter['errors'] for counter in counters),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--case', choices=CASES)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument(
+        '--requests', type=int, default=200,
+        help='Количество запросов в каждом потоке.'
+    )
+    parser.add_argument(
+        '--write-ratio', type=float, default=0.5,
+        help='Доля запросов, изменяющих корзину.'
+    )
+    parser.add_argument('--products', type=int, default=100)
+    args = parser.parse_args()
+
+    if args.case:
+        print(json.dumps(run_case(args.case, args)))
+        return
+    results = {}
+    for case in CASES:
+        output = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.database', '--case', case,
+             '--threads', str(args.threads),
+             '--requests', str(args.requests),
+             '--write-ratio', str(args.write_ratio),
+             '--products', str(args.products)],
+            check=True, capture_output=True, text=True
+        ).stdout
+        results[case] = json.loads(output.splitlines()[-1])
+    print(json.dumps(
+        {'threads': args.threads, 'results': results}, indent=2
+    ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,333 @@
+"""Нагрузочный бенчмарк API на смешанных сценариях покупателей.
+
+Заполняет каталог заданного размера, создаёт пользователей и прогоняет
+их сессии через приложение WSGI или ASGI внутри процесса: просмотр
+категорий, страниц и карточек продуктов, добавление, изменение
+и удаление продуктов в корзине, просмотр корзины. Сессии строятся
+генератором случайных чисел с фиксированным зерном, поэтому прогоны
+с одинаковыми параметрами выполняют одни и те же запросы.
+
+Для каждого эндпоинта выводятся p50/p95/p99, число ошибок и среднее
+число SQL-запросов на запрос. Результат сохраняется в JSON; прошлый
+результат передаётся в --baseline, и при регрессии p95 или числа
+SQL-запросов бенчмарк завершается с кодом 1:
+
+    python -m benchmarks.load --app wsgi --output load.json
+    python -m benchmarks.load --app wsgi --baseline load.json
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+
+from .utils import (
+    asgi_request, percentile, seed_catalog, setup_django, wsgi_request
+)
+
+APPS = ('wsgi', 'asgi')
+PERCENTILES = {'p50_ms': 0.5, 'p95_ms': 0.95, 'p99_ms': 0.99}
+
+_request_queries = ContextVar('request_queries', default=None)
+
+
+def count_queries(execute, sql, params, many, context):
+    queries = _request_queries.get()
+    if queries is not None:
+        queries[0] += 1
+    return execute(sql, params, many, context)
+
+
+def install_query_counter():
+    """Считает SQL-запросы во всех соединениях, и в уже открытых.
+
+    Счётчик текущего запроса лежит в ContextVar, поэтому под ASGI
+    учитываются и запросы из потоков sync_to_async.
+    """
+    from django.db import connections
+    from django.db.backends.signals import connection_created
+
+    def add_wrapper(connection, **kwargs):
+        if count_queries not in connection.execute_wrappers:
+            connection.execute_wrappers.append(count_queries)
+
+    connection_created.connect(add_wrapper, weak=False)
+    for connection in connections.all():
+        add_wrapper(connection)
+
+
+def browse(rng, catalog):
+    category_id, subcategory_slug = rng.choice(catalog['groups'])
+    product_id = rng.choice(catalog['products'])
+    return [
+        ('GET', '/api/categories/', '', None),
+        ('GET', f'/api/categories/{category_id}/', '', None),
+        ('GET', '/api/products/',
+         f'subcategory={subcategory_slug}&page={rng.randint(1, 3)}', None),
+        ('GET', f'/api/products/{product_id}/', '', None),
+    ]
+
+
+def shop(rng, catalog):
+    product_id = rng.choice(catalog['products'])
+    item_url = f'/api/products/{product_id}/shopping_cart/'
+    return [
+        ('GET', '/api/products/', f'page={rng.randint(1, 20)}', None),
+        ('POST', item_url, '', None),
+        ('PATCH', item_url, '',
+         {'product_quantity': rng.randint(2, 5)}),
+        ('GET', '/api/shopping_cart/', '', None),
+    ]
+
+
+def tidy(rng, catalog):
+    first, second = rng.sample(catalog['products'], 2)
+    return [
+        ('PATCH', '/api/shopping_cart/', '', {'operations': [
+            {'product': first, 'quantity': 1, 'operation': 'increment'},
+            {'product': second, 'quantity': 2},
+        ]}),
+        ('DELETE', f'/api/products/{first}/shopping_cart/', '', None),
+        ('GET', '/api/shopping_cart/', '', None),
+    ]
+
+
+SCENARIOS = {'browse': (browse, 6), 'shop': (shop, 3), 'tidy': (tidy, 1)}
+
+
+def endpoint(method, path):
+    """Шаблон адреса: id заменяются на {id}."""
+    parts = ['{id}' if part.isdigit() else part for part in path.split('/')]
+    return f'{method} {"/".join(parts)}'
+
+
+def plan_sessions(user, sessions, catalog, seed):
+    rng = random.Random(f'{seed}:{user}')
+    names = list(SCENARIOS)
+    weights = [weight for _, weight in SCENARIOS.values()]
+    plan = []
+    for _ in range(sessions):
+        scenario, _ = SCENARIOS[rng.choices(names, weights)[0]]
+        plan.extend(scenario(rng, catalog))
+    return plan
+
+
+class Recorder:
+    """Время, статус и число SQL-запросов каждого запроса."""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+
+    def start(self):
+        queries = [0]
+        _request_queries.set(queries)
+        return queries, time.perf_counter()
+
+    def finish(self, method, path, status, started):
+        queries, started_at = started
+        self.samples[endpoint(method, path)].append(
+            (time.perf_counter() - started_at, status, queries[0])
+        )
+
+    def summary(self, elapsed):
+        endpoints = {}
+        total = 0
+        for name, samples in sorted(self.samples.items()):
+            total += len(samples)
+            latencies = sorted(latency for latency, _, _ in samples)
+            endpoints[name] = {
+                'requests': len(samples),
+                'errors': sum(status >= 400 for _, status, _ in samples),
+                **{
+                    key: round(percentile(latencies, share) * 1000, 2)
+                    for key, share in PERCENTILES.items()
+                },
+                'queries_per_request': round(
+                    sum(queries for _, _, queries in samples) / len(samples),
+                    2
+                ),
+            }
+        return {
+            'requests': total,
+            'requests_per_second': round(total / elapsed, 1),
+            'endpoints': endpoints,
+        }
+
+
+def encode(body):
+    return b'' if body is None else json.dumps(body).encode()
+
+
+def run_wsgi(plans, tokens, recorder):
+    from grocery_store.wsgi import application
+
+    def user(plan, token):
+        for method, path, query, body in plan:
+            started = recorder.start()
+            status = wsgi_request(
+                application, method, path, query, encode(body), token
+            )
+            recorder.finish(method, path, status, started)
+
+    with ThreadPoolExecutor(len(plans)) as executor:
+        for future in [
+            executor.submit(user, plan, token)
+            for plan, token in zip(plans, tokens)
+        ]:
+            future.result()
+
+
+def run_asgi(plans, tokens, recorder):
+    from grocery_store.asgi import application
+
+    async def user(plan, token):
+        for method, path, query, body in plan:
+            started = recorder.start()
+            status = await asgi_request(
+                application, method, path, query, encode(body), token
+            )
+            recorder.finish(method, path, status, started)
+
+    async def run():
+        await asyncio.gather(*(
+            user(plan, token) for plan, token in zip(plans, tokens)
+        ))
+
+    asyncio.run(run())
+
+
+def run(args):
+    setup_django()
+    seed_catalog(
+        args.products,
+        images_per_product=args.images,
+        categories=args.categories,
+        subcategories=args.subcategories
+    )
+
+    from rest_framework.authtoken.models import Token
+
+    from products.models import Product, Subcategory
+    from users.models import User
+
+    users = User.objects.bulk_create(
+        User(username=f'user_{number}') for number in range(args.users)
+    )
+    tokens = [
+        token.key for token in Token.objects.bulk_create(
+            Token(user=user, key=Token.generate_key()) for user in users
+        )
+    ]
+    catalog = {
+        'groups': list(Subcategory.objects.order_by('id').values_list(
+            'category_id', 'slug'
+        )),
+        'products': list(
+            Product.objects.order_by('id').values_list('id', flat=True)
+        ),
+    }
+    plans = [
+        plan_sessions(user, args.sessions, catalog, args.seed)
+        for user in range(args.users)
+    ]
+    install_query_counter()
+    recorder = Recorder()
+    started = time.perf_counter()
+    if args.app == 'wsgi':
+        run_wsgi(plans, tokens, recorder)
+    else:
+        run_asgi(plans, tokens, recorder)
+    return recorder.summary(time.perf_counter() - started)
+
+
+def compare(result, baseline, tolerance, min_delta_ms):
+    """Регрессии относительно прошлого результата.
+
+    Рост p95 меньше min_delta_ms не считается: на быстрых эндпоинтах
+    это шум планировщика.
+    """
+    if result['config'] != baseline['config']:
+        print('Параметры прогонов различаются, сравнение приблизительное.',
+              file=sys.stderr)
+    regressions = []
+    for name, current in result['endpoints'].items():
+        previous = baseline['endpoints'].get(name)
+        if previous is None:
+            continue
+        if (
+            current['p95_ms'] > previous['p95_ms'] * (1 + tolerance)
+            and current['p95_ms'] - previous['p95_ms'] > min_delta_ms
+        ):
+            regressions.append(
+                f'{name}: p95 {previous["p95_ms"]} → {current["p95_ms"]} мс'
+            )
+        if current['queries_per_request'] > previous['queries_per_request']:
+            regressions.append(
+                f'{name}: SQL-запросов {previous["queries_per_request"]} → '
+                f'{current["queries_per_request"]}'
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument('--app', choices=APPS, default='wsgi')
+    parser.add_argument('--products', type=int, default=10000)
+    parser.add_argument('--categories', type=int, default=10)
+    parser.add_argument(
+        '--subcategories', type=int, default=5,
+        help='Количество подкатегорий в каждой категории.'
+    )
+    parser.add_argument('--images', type=int, default=2)
+    parser.add_argument(
+        '--users', type=int, default=16,
+        help='Количество одновременных пользователей.'
+    )
+    parser.add_argument(
+        '--sessions', type=int, default=20,
+        help='Количество сессий каждого пользователя.'
+    )
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Файл для результата в JSON.')
+    parser.add_argument('--baseline', help='Прошлый результат в JSON.')
+    parser.add_argument(
+        '--tolerance', type=float, default=0.2,
+        help='Допустимый рост p95 относительно --baseline.'
+    )
+    parser.add_argument(
+        '--min-delta-ms', type=float, default=5,
+        help='Минимальный рост p95 в мс, который считается регрессией.'
+    )
+    args = parser.parse_args()
+
+    config = {
+        name: getattr(args, name) for name in (
+            'app', 'products', 'categories', 'subcategories', 'images',
+            'users', 'sessions', 'seed',
+        )
+    }
+    result = {'config': config, **run(args)}
+    output = json.dumps(result, indent=2, ensure_ascii=False)
+    print(output)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            file.write(output + '\n')
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as file:
+            regressions = compare(
+                result, json.load(file), args.tolerance, args.min_delta_ms
+            )
+        for regression in regressions:
+            print(f'Регрессия: {regression}', file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""Сравнение глубоких страниц: PageNumberPagination и KeysetPagination.
+
+    python -m benchmarks.pagination --products 500000
+"""
+import argparse
+import json
+
+from .utils import measure, seed_catalog, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--products', type=int, default=500000)
+    parser.add_argument('--page-size', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument(
+        '--depths', type=float, nargs='+', default=(0, 0.1, 0.5, 0.99),
+        help='Глубина страницы как доля каталога.'
+    )
+    args = parser.parse_args()
+
+    setup_django()
+    seed_catalog(args.products)
+
+    from rest_framework.test import APIClient
+
+    from api.pagination import KeysetPagination
+    from products.models import Product
+
+    client = APIClient()
+    pages = args.products // args.page_size
+    results = []
+    for depth in args.depths:
+        page = max(1, int(pages * depth))
+        offset = (page - 1) * args.page_size
+        last_pk = Product.objects.order_by('pk').values_list(
+            'pk', flat=True
+        )[offset - 1] if offset else None
+        keyset_params = {'pagination': 'keyset', 'page_size': args.page_size}
+        if last_pk is not None:
+            keyset_params['cursor'] = KeysetPagination().encode_cursor(last_pk)
+        results.append({
+            'page': page,
+            'page_number': measure(
+                lambda: client.get('/api/products/', {'page': page}),
+                args.repeat
+            ),
+            'keyset': measure(
+                lambda: client.get('/api/products/', keyset_params),
+                args.repeat
+            ),
+        })
+    print(json.dumps(
+        {'products': args.products, 'results': results}, indent=2
+    ))
+
+
+if __name__ == '__main__':
+    main()
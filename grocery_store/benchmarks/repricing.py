@@ -0,0 +1,180 @@
+"""Пересчёт позиций корзин при изменении цен продуктов.
+
+Сравнивает пересборку позиций через CartItem.save() (по запросам на
+каждую позицию) с пересчётом набором UPDATE на порцию продуктов:
+
+    python -m benchmarks.repricing --cart-items 1000000
+"""
+import argparse
+import json
+import time
+
+from .utils import seed_catalog, setup_django
+
+
+def seed_carts(users, items_per_cart, products, batch_size=20000):
+    """Пользователи с корзинами и согласованными итогами."""
+    from products.models import CartItem, ShoppingCart
+    from users.models import User
+
+    for start in range(0, users, batch_size):
+        numbers = range(start, min(start + batch_size, users))
+        created = User.objects.bulk_create(
+            User(username=f'user_{number}', password='!') for number in numbers
+        )
+        carts = ShoppingCart.objects.bulk_create(
+            ShoppingCart(
+                user=user,
+                total_quantity=sum(range(1, items_per_cart + 1)),
+                total_price=0,
+            )
+            for user in created
+        )
+        items = []
+        for number, cart in zip(numbers, carts):
+            for index in range(items_per_cart):
+                product_id, price = products[
+                    (number * items_per_cart + index) % len(products)
+                ]
+                quantity = index + 1
+                items.append(CartItem(
+                    shopping_cart=cart,
+                    product_id=product_id,
+                    product_quantity=quantity,
+                    product_price=quantity * price,
+                ))
+                cart.total_price += quantity * price
+        CartItem.objects.bulk_create(items, batch_size=5000)
+        ShoppingCart.objects.bulk_update(
+            carts, ['total_price'], batch_size=5000
+        )
+
+
+def check_totals():
+    """Число корзин, итоги которых разошлись с позициями."""
+    from django.db.models import F, OuterRef, Subquery, Sum
+    from django.db.models.functions import Abs
+
+    from products.models import CartItem, ShoppingCart
+
+    actual = CartItem.objects.filter(
+        shopping_cart=OuterRef('pk')
+    ).order_by().values('shopping_cart').annotate(
+        total=Sum('product_price')
+    ).values('total')
+    return ShoppingCart.objects.annotate(
+        drift=Abs(Subquery(actual) - F('total_price'))
+    ).filter(drift__gt=1e-6).count()
+
+
+class QueryCounter:
+    """Считает запросы без журнала connection.queries."""
+
+    def __init__(self):
+        self.queries = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries += 1
+        return execute(sql, params, many, context)
+
+
+def timed(function):
+    """Время вызова в секундах и число запросов."""
+    from django.db import connection
+
+    counter = QueryCounter()
+    with connection.execute_wrapper(counter):
+        started = time.perf_counter()
+        result = function()
+        seconds = time.perf_counter() - started
+    return result, seconds, counter.queries
+
+
+def reprice_by_save(product_ids):
+    """Прежний способ: каждая позиция заново сохраняется."""
+    from products.models import CartItem
+
+    rows = 0
+    for cart_item in CartItem.objects.filter(
+        product_id__in=product_ids
+    ).select_related('product'):
+        cart_item.save()
+        rows += 1
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--products', type=int, default=10000)
+    parser.add_argument('--cart-items', type=int, default=1000000)
+    parser.add_argument('--items-per-cart', type=int, default=10)
+    parser.add_argument(
+        '--changed', type=int, default=1000,
+        help='Сколько продуктов меняют цену за один прогон.'
+    )
+    parser.add_argument(
+        '--save-sample', type=int, default=20,
+        help='Сколько продуктов пересчитывается через save() для оценки.'
+    )
+    args = parser.parse_args()
+
+    setup_django()
+    seed_catalog(args.products)
+
+    from django.db.models import F, QuerySet
+
+    from products.models import CartItem, Product
+
+    products = list(Product.objects.order_by('pk').values_list('pk', 'price'))
+    started = time.perf_counter()
+    seed_carts(
+        args.cart_items // args.items_per_cart, args.items_per_cart, products
+    )
+    seed_seconds = time.perf_counter() - started
+    product_ids = [pk for pk, _ in products]
+    changed = product_ids[:args.changed]
+    affected = CartItem.objects.filter(product_id__in=changed).count()
+
+    # Старый способ медленный, поэтому замеряется на выборке продуктов;
+    # цены для него меняются в обход пересчёта.
+    sample = product_ids[-args.save_sample:]
+    QuerySet.update(Product.objects.filter(pk__in=sample), price=2)
+    save_rows, save_seconds, save_queries = timed(
+        lambda: reprice_by_save(sample)
+    )
+    _, update_seconds, update_queries = timed(
+        lambda: Product.objects.filter(pk__in=changed).update(
+            price=F('price') * 1.1
+        )
+    )
+    product = Product.objects.get(pk=product_ids[args.changed])
+    product.price += 1
+    _, single_seconds, single_queries = timed(product.save)
+
+    print(json.dumps({
+        'cart_items': CartItem.objects.count(),
+        'seed_seconds': round(seed_seconds, 2),
+        'save': {
+            'products': len(sample),
+            'rows': save_rows,
+            'seconds': round(save_seconds, 3),
+            'queries': save_queries,
+            'rows_per_second': round(save_rows / save_seconds),
+        },
+        'set_based': {
+            'products': len(changed),
+            'rows': affected,
+            'seconds': round(update_seconds, 3),
+            'queries': update_queries,
+            'rows_per_second': round(affected / update_seconds),
+        },
+        'single_product_save': {
+            'seconds': round(single_seconds, 4),
+            'queries': single_queries,
+        },
+        'drifted_carts': check_totals(),
+    }, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""Поиск по инвертированному индексу против name__icontains.
+
+    python -m benchmarks.search --products 1000000
+"""
+import argparse
+import json
+import resource
+import time
+
+from .utils import measure, setup_django
+
+ADJECTIVES = (
+    'молочный', 'сырный', 'ржаной', 'сливочный', 'творожный', 'свежий',
+    'копчёный', 'домашний', 'фермерский', 'сладкий', 'острый', 'пряный',
+)
+NOUNS = (
+    'молоко', 'коктейль', 'сыр', 'хлеб', 'масло', 'кефир', 'йогурт',
+    'творог', 'колбаса', 'сосиски', 'кофе', 'чай', 'печенье', 'шоколад',
+)
+GROUPS = {
+    'Молочные продукты': ('Молоко', 'Сыры', 'Йогурты'),
+    'Хлеб и выпечка': ('Хлеб', 'Печенье'),
+    'Мясо': ('Колбасы', 'Сосиски'),
+    'Напитки': ('Кофе', 'Чай'),
+}
+QUERIES = ('молоко', 'молочный коктейль', 'сыр марка42', 'творож', 'колбоса')
+
+
+def seed(products, batch_size=10000):
+    from products.models import Category, Product, Subcategory
+
+    subcategories = []
+    for number, (category_name, names) in enumerate(GROUPS.items()):
+        category = Category.objects.create(
+            name=category_name, slug=f'category_{number}'
+        )
+        subcategories.extend(
+            Subcategory.objects.create(
+                name=name, slug=f'subcategory_{number}_{index}',
+                category=category
+            )
+            for index, name in enumerate(names)
+        )
+    for start in range(0, products, batch_size):
+        batch = []
+        for number in range(start, min(start + batch_size, products)):
+            subcategory = subcategories[number % len(subcategories)]
+            batch.append(Product(
+                name=(
+                    f'{ADJECTIVES[number % len(ADJECTIVES)]} '
+                    f'{NOUNS[number // len(ADJECTIVES) % len(NOUNS)]} '
+                    f'марка{number % 5000}'
+                ).capitalize(),
+                slug=f'product_{number}',
+                price=number % 1000 + 1,
+                category_id=subcategory.category_id,
+                subcategory=subcategory,
+            ))
+        Product.objects.bulk_create(batch)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--products', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+    seed(args.products)
+
+    from products.models import Product
+    from products.search import search_index
+
+    memory_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    search_index.build()
+    build_seconds = time.perf_counter() - started
+    memory_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    results = {}
+    for query in QUERIES:
+        results[query] = {
+            'found': len(search_index.search(query)),
+            'index': measure(
+                lambda: search_index.search(query), args.repeat
+            ),
+            'icontains': measure(
+                lambda: list(Product.objects.filter(
+                    name__icontains=query
+                ).values_list('pk', flat=True)),
+                args.repeat
+            ),
+        }
+    print(json.dumps({
+        'products': args.products,
+        'terms': len(search_index.terms),
+        'build_seconds': round(build_seconds, 2),
+        'index_memory_mb': round((memory_after - memory_before) / 1024),
+        'results': results,
+    }, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
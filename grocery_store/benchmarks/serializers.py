@@ -0,0 +1,87 @@
+"""Стоимость сериализации одной строки: DRF против .values().
+
+    python -m benchmarks.serializers --rows 1000
+"""
+import argparse
+import json
+
+from .utils import measure, seed_catalog, setup_django
+
+
+def per_row(timing, rows):
+    return {
+        'us_per_row': round(timing['median_ms'] * 1000 / rows, 2),
+        **timing,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--images', type=int, default=3)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+    seed_catalog(args.rows, images_per_product=args.images)
+
+    from api.serializers import ProductSerializer, ShoppingCartSerializer
+    from api.values_serializers import (
+        ProductValuesSerializer, ShoppingCartValuesSerializer
+    )
+    from products.models import CartItem, Product, ShoppingCart
+    from users.models import User
+
+    user = User.objects.create(username='benchmark')
+    shopping_cart = ShoppingCart.objects.create(user=user)
+    CartItem.objects.bulk_create(
+        CartItem(
+            shopping_cart=shopping_cart,
+            product=product,
+            product_quantity=1,
+            product_price=product.price
+        )
+        for product in Product.objects.all()
+    )
+    queryset = Product.objects.with_related().order_by('id')
+
+    def drf_products():
+        return ProductSerializer(queryset.all(), many=True).data
+
+    def values_products():
+        return ProductValuesSerializer(
+            ProductValuesSerializer.get_values(queryset.all())
+        ).data
+
+    def drf_cart():
+        return ShoppingCartSerializer(
+            ShoppingCart.objects.prefetch_related(
+                'cart_items__product__category',
+                'cart_items__product__subcategory',
+                'cart_items__product__product_images',
+            ).get(pk=shopping_cart.pk)
+        ).data
+
+    def values_cart():
+        return ShoppingCartValuesSerializer(user.pk).data
+
+    cases = {
+        'products': (drf_products, values_products),
+        'shopping_cart': (drf_cart, values_cart),
+    }
+    results = {
+        name: {
+            'drf': per_row(measure(drf, args.repeat), args.rows),
+            'values': per_row(measure(values, args.repeat), args.rows),
+        }
+        for name, (drf, values) in cases.items()
+    }
+    print(json.dumps(
+        {'rows': args.rows, 'images_per_row': args.images,
+         'results': results},
+        indent=2
+    ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+"""Общие функции для бенчмарков.
+
+Бенчмарки работают с отдельной временной БД SQLite и не трогают
+db.sqlite3 проекта. Запуск из каталога grocery_store:
+
+    python -m benchmarks.<имя модуля> --help
+"""
+import asyncio
+import math
+import os
+import statistics
+import sys
+import tempfile
+import time
+from io import BytesIO
+from pathlib import Path
+
+import django
+
+HOST = 'testserver'
+
+
+def setup_django(db_path=None, **overrides):
+    """Настраивает Django на отдельную БД и применяет миграции."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'grocery_store.settings')
+    from django.conf import settings
+
+    if db_path is None:
+        db_path = Path(tempfile.mkdtemp()) / 'benchmark.sqlite3'
+    settings.DATABASES['default']['NAME'] = str(db_path)
+    settings.DEBUG = False
+    settings.ALLOWED_HOSTS = ['testserver']
+    for name, value in overrides.items():
+        setattr(settings, name, value)
+    django.setup()
+
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+    return db_path
+
+
+def seed_catalog(products, images_per_product=0, batch_size=10000,
+                 categories=1, subcategories=1):
+    """Заполняет каталог: N продуктов поровну по всем подкатегориям.
+
+    subcategories — число подкатегорий в каждой категории.
+    """
+    from products.models import Category, Product, ProductImage, Subcategory
+
+    groups = []
+    for category_number in range(categories):
+        category = Category.objects.create(
+            name=f'Категория {category_number}',
+            slug=f'category_{category_number}'
+        )
+        groups.extend(
+            Subcategory.objects.create(
+                name=f'Подкатегория {category_number}.{number}',
+                slug=f'subcategory_{category_number}_{number}',
+                category=category
+            )
+            for number in range(subcategories)
+        )
+    for start in range(0, products, batch_size):
+        batch = Product.objects.bulk_create(
+            Product(
+                name=f'Продукт {number}',
+                slug=f'product_{number}',
+                price=number % 1000 + 1,
+                category_id=groups[number % len(groups)].category_id,
+                subcategory=groups[number % len(groups)]
+            )
+            for number in range(start, min(start + batch_size, products))
+        )
+        ProductImage.objects.bulk_create(
+            ProductImage(product=product, image=f'products/{product.slug}.jpg')
+            for product in batch
+            for _ in range(images_per_product)
+        )
+
+
+def percentile(values, share):
+    """Процентиль по ближайшему рангу из отсортированных значений."""
+    return values[max(math.ceil(share * len(values)) - 1, 0)]
+
+
+def measure(function, repeat):
+    """Медиана и p95 времени вызова в миллисекундах."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {
+        'median_ms': round(statistics.median(timings), 3),
+        'p95_ms': round(percentile(timings, 0.95), 3),
+    }
+
+
+def wsgi_request(application, method, path, query='', body=b'',
+                 token=None):
+    """Запрос к приложению WSGI внутри процесса, возвращает статус."""
+    environ = {
+        'REQUEST_METHOD': method,
+        'PATH_INFO': path,
+        'QUERY_STRING': query,
+        'SERVER_NAME': HOST,
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': HOST,
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.input': BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.url_scheme': 'http',
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    if token is not None:
+        environ['HTTP_AUTHORIZATION'] = f'Token {token}'
+    statuses = []
+    response = application(
+        environ, lambda status, headers: statuses.append(status)
+    )
+    try:
+        b''.join(response)
+    finally:
+        response.close()
+    return int(statuses[0].split()[0])
+
+
+async def asgi_request(application, method, path, query='', body=b'',
+                       token=None):
+    """Запрос к приложению ASGI внутри процесса, возвращает статус."""
+    headers = [
+        (b'host', HOST.encode()),
+        (b'content-type', b'application/json'),
+        (b'content-length', str(len(body)).encode()),
+    ]
+    if token is not None:
+        headers.append((b'authorization', f'Token {token}'.encode()))
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': method,
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': query.encode(),
+        'root_path': '',
+        'headers': headers,
+        'client': ('127.0.0.1', 0),
+        'server': (HOST, 80),
+    }
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    statuses = []
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        # Клиент не отключается, пока приложение не ответит.
+        await asyncio.Future()
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            statuses.append(message['status'])
+
+    await application(scope, receive, send)
+    return statuses[0]
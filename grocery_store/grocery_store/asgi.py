@@ -9,8 +9,30 @@ https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'grocery_store.settings')
 
-application = get_asgi_application()
+ASGI_URLCONF = 'grocery_store.asgi_urls'
+
+
+class AsyncViewsHandlerMixin:
+    """Отдаёт запросы асинхронным вьюхам из ASGI_URLCONF.
+
+    При ASYNC_VIEWS = False используются только вьюхи DRF, как под WSGI.
+    """
+
+    async def get_response_async(self, request):
+        if settings.ASYNC_VIEWS:
+            request.urlconf = ASGI_URLCONF
+        return await super().get_response_async(request)
+
+
+class AsyncViewsASGIHandler(AsyncViewsHandlerMixin, ASGIHandler):
+    pass
+
+
+django.setup(set_prefix=False)
+application = AsyncViewsASGIHandler()
@@ -0,0 +1,13 @@
+"""Адреса для запуска под ASGI.
+
+Асинхронные вьюхи из api.asgi_urls перекрывают вьюхи DRF по тем же
+адресам, остальные адреса берутся из grocery_store.urls.
+"""
+from django.urls import include, path
+
+from .urls import urlpatterns as sync_urlpatterns
+
+urlpatterns = [
+    path('api/', include('api.asgi_urls')),
+    *sync_urlpatterns,
+]
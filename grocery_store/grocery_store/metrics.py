@@ -0,0 +1,285 @@
+"""Метрики запросов: заголовок Server-Timing и эндпоинт /metrics.
+
+MetricsMiddleware замеряет для каждого запроса общее время, число
+и время SQL-запросов, время рендеринга ответа и его размер. Значения
+текущего запроса отдаются в заголовке Server-Timing и складываются
+в гистограммы по имени вьюхи и методу, которые /metrics отдаёт
+в текстовом формате Prometheus.
+
+Гистограммы хранятся в памяти процесса: при нескольких процессах
+каждый из них опрашивается отдельно. /metrics отвечает только
+адресам из METRICS_ALLOWED_IPS и запросам с токеном METRICS_TOKEN,
+остальным — 404.
+"""
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from hmac import compare_digest
+from threading import Lock
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseNotFound
+
+from api.response_cache import cache_stats
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+UNMATCHED = '<unmatched>'
+
+_timings = ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    __slots__ = ('queries', 'db', 'render')
+
+    def __init__(self):
+        self.queries = 0
+        self.db = 0.0
+        self.render = 0.0
+
+
+def time_query(execute, sql, params, many, context):
+    timings = _timings.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.db += time.perf_counter() - started
+        timings.queries += 1
+
+
+def add_query_timer(connection, **kwargs):
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+
+def install_query_timer():
+    """Подключает замер SQL к новым и уже открытым соединениям."""
+    connection_created.connect(add_query_timer)
+    for connection in connections.all(initialized_only=True):
+        add_query_timer(connection)
+
+
+@contextmanager
+def render_timer():
+    """Добавляет время блока ко времени рендеринга текущего запроса."""
+    timings = _timings.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.render += time.perf_counter() - started
+
+
+class Histogram:
+
+    def __init__(self, name, documentation, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, labels, value):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def expose(self, label_names):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} histogram'
+        for labels, (counts, total) in sorted(self.series.items()):
+            base = format_labels(zip(label_names, labels))
+            cumulative = 0
+            for bound, count in zip((*self.buckets, '+Inf'), counts):
+                cumulative += count
+                yield (
+                    f'{self.name}_bucket{{{base},le="{bound}"}} {cumulative}'
+                )
+            yield f'{self.name}_sum{{{base}}} {total}'
+            yield f'{self.name}_count{{{base}}} {cumulative}'
+
+
+def format_labels(labels):
+    return ','.join(
+        '{}="{}"'.format(
+            name,
+            str(value).replace('\\', '\\\\').replace('"', '\\"')
+        )
+        for name, value in labels
+    )
+
+
+class Registry:
+    """Гистограммы запросов по вьюхе и методу и счётчик статусов."""
+
+    label_names = ('view', 'method')
+
+    def __init__(self):
+        self.lock = Lock()
+        self.duration = Histogram(
+            'http_request_duration_seconds', 'Время обработки запроса.',
+            (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+        )
+        self.db_duration = Histogram(
+            'http_request_db_duration_seconds',
+            'Суммарное время SQL-запросов за запрос.',
+            (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+        )
+        self.render_duration = Histogram(
+            'http_request_render_duration_seconds',
+            'Время рендеринга ответа.',
+            (0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5)
+        )
+        self.queries = Histogram(
+            'http_request_db_queries', 'Число SQL-запросов за запрос.',
+            (0, 1, 2, 3, 5, 10, 20, 50, 100)
+        )
+        self.response_size = Histogram(
+            'http_response_size_bytes', 'Размер тела ответа.',
+            (100, 1000, 10000, 100000, 1000000, 10000000)
+        )
+        self.histograms = (
+            self.duration, self.db_duration, self.render_duration,
+            self.queries, self.response_size,
+        )
+        self.responses = {}
+
+    def observe(self, view, method, status, duration, timings, size):
+        labels = (view, method)
+        with self.lock:
+            self.duration.observe(labels, duration)
+            self.db_duration.observe(labels, timings.db)
+            self.render_duration.observe(labels, timings.render)
+            self.queries.observe(labels, timings.queries)
+            if size is not None:
+                self.response_size.observe(labels, size)
+            key = (*labels, status)
+            self.responses[key] = self.responses.get(key, 0) + 1
+
+    def expose(self):
+        lines = []
+        with self.lock:
+            for histogram in self.histograms:
+                lines.extend(histogram.expose(self.label_names))
+            lines.append('# HELP http_responses_total Число ответов.')
+            lines.append('# TYPE http_responses_total counter')
+            for labels, count in sorted(self.responses.items()):
+                labels = format_labels(
+                    zip((*self.label_names, 'status'), labels)
+                )
+                lines.append(f'http_responses_total{{{labels}}} {count}')
+        for event, counters in (
+            ('hits', 'Попадания'), ('misses', 'Промахи'),
+            ('evictions', 'Вытеснения'),
+        ):
+            name = f'cache_{event}_total'
+            lines.append(f'# HELP {name} {counters} кэша.')
+            lines.append(f'# TYPE {name} counter')
+            for location, stats in sorted(cache_stats().items()):
+                labels = format_labels([('cache', location)])
+                lines.append(f'{name}{{{labels}}} {stats[event]}')
+        return '\n'.join(lines) + '\n'
+
+    def clear(self):
+        with self.lock:
+            for histogram in self.histograms:
+                histogram.series.clear()
+            self.responses.clear()
+
+
+registry = Registry()
+
+
+def server_timing(duration, timings):
+    return (
+        f'db;dur={timings.db * 1000:.2f};desc="{timings.queries} queries", '
+        f'render;dur={timings.render * 1000:.2f}, '
+        f'total;dur={duration * 1000:.2f}'
+    )
+
+
+class MetricsMiddleware:
+    """Замеряет запрос и отдаёт замеры в Server-Timing и /metrics.
+
+    Middleware работает и в синхронном, и в асинхронном режиме, чтобы
+    под ASGI не добавлять переходов между потоками.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        install_query_timer()
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timings = RequestTimings()
+        token = _timings.set(timings)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _timings.reset(token)
+        return self.finish(request, response, started, timings)
+
+    async def __acall__(self, request):
+        timings = RequestTimings()
+        token = _timings.set(timings)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _timings.reset(token)
+        return self.finish(request, response, started, timings)
+
+    def finish(self, request, response, started, timings):
+        duration = time.perf_counter() - started
+        match = request.resolver_match
+        if response.streaming:
+            size = None
+        else:
+            size = len(response.content)
+        registry.observe(
+            match.view_name if match else UNMATCHED,
+            request.method,
+            response.status_code,
+            duration,
+            timings,
+            size
+        )
+        response['Server-Timing'] = server_timing(duration, timings)
+        return response
+
+
+def metrics_allowed(request):
+    if request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS:
+        return True
+    scheme, _, token = request.headers.get('Authorization', '').partition(
+        ' '
+    )
+    return bool(settings.METRICS_TOKEN) and scheme == 'Bearer' and (
+        compare_digest(token.encode(), settings.METRICS_TOKEN.encode())
+    )
+
+
+def metrics_view(request):
+    if not metrics_allowed(request):
+        return HttpResponseNotFound()
+    return HttpResponse(registry.expose(), content_type=CONTENT_TYPE)
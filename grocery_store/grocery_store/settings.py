@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
+from datetime import timedelta
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -49,6 +51,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'grocery_store.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -56,6 +59,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.guest_cart.GuestCartMiddleware',
 ]
 
 ROOT_URLCONF = 'grocery_store.urls'
@@ -82,10 +86,40 @@ WSGI_APPLICATION = 'grocery_store.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# Профиль БД выбирается переменной окружения DATABASE_PROFILE:
+# 'sqlite' — файл db.sqlite3 в режиме WAL с ожиданием блокировок;
+# 'postgresql' — серверная БД, параметры берутся из POSTGRES_*.
+DATABASE_PROFILES = {
+    'sqlite': {
+        'ENGINE': 'grocery_store.sqlite3',
+        'NAME': os.getenv('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+        'OPTIONS': {
+            'timeout': 20,
+            'transaction_mode': 'IMMEDIATE',
+            'pragmas': {
+                'journal_mode': 'WAL',
+                'synchronous': 'NORMAL',
+                'cache_size': -20000,
+                'mmap_size': 268435456,
+                'temp_store': 'MEMORY',
+            },
+        },
+    },
+    'postgresql': {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.getenv('POSTGRES_DB', 'grocery_store'),
+        'USER': os.getenv('POSTGRES_USER', 'grocery_store'),
+        'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
+        'HOST': os.getenv('POSTGRES_HOST', 'localhost'),
+        'PORT': os.getenv('POSTGRES_PORT', '5432'),
+    },
+}
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        **DATABASE_PROFILES[os.getenv('DATABASE_PROFILE', 'sqlite')],
+        'CONN_MAX_AGE': int(os.getenv('DATABASE_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
@@ -139,14 +173,173 @@ SPECTACULAR_SETTINGS = {
     "SERVE_INCLUDE_SCHEMA": False,
 }
 
-REST_FRAMEWORK = {
-    'DEFAULT_AUTHENTICATION_CLASSES': [
+# Способ аутентификации API:
+# 'token' — токен DRF, запрос к БД на каждый запрос;
+# 'cached_token' — токен DRF с кэшем 'auth', см. AUTH_CACHES;
+# 'jwt' — JWT без обращения к БД, токены DRF тоже принимаются.
+AUTHENTICATION_CLASSES = {
+    'token': [
         'rest_framework.authentication.TokenAuthentication',
     ],
+    'cached_token': [
+        'api.authentication.CachedTokenAuthentication',
+    ],
+    'jwt': [
+        'rest_framework_simplejwt.authentication.'
+        'JWTStatelessUserAuthentication',
+        'api.authentication.CachedTokenAuthentication',
+    ],
+}
+
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': AUTHENTICATION_CLASSES[
+        os.getenv('AUTHENTICATION_MODE', 'cached_token')
+    ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 5,
 }
 
+# Сериализация ответов только для чтения: 'values' — прямо из .values()
+# без экземпляров моделей, 'drf' — сериализаторами DRF.
+READ_SERIALIZER = os.getenv('READ_SERIALIZER', 'values')
+
+# Асинхронные вьюхи каталога и корзины под ASGI, см. grocery_store.asgi.
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', 'true').lower() == 'true'
+
+# Замеры запросов в заголовке Server-Timing и на /metrics,
+# см. grocery_store.metrics.
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+# Кому доступен /metrics: адреса клиентов через запятую и токен
+# для заголовка «Authorization: Bearer <токен>». По умолчанию — никому.
+METRICS_ALLOWED_IPS = [
+    address.strip()
+    for address in os.getenv('METRICS_ALLOWED_IPS', '').split(',')
+    if address.strip()
+]
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+
+# Число процессов для построения производных изображений,
+# 0 — строить сразу в текущем процессе.
+IMAGE_DERIVATIVES_WORKERS = int(os.getenv('IMAGE_DERIVATIVES_WORKERS', 2))
+
+# Каталог на сервере, относительно которого указаны изображения
+# в файлах импорта каталога через API, см. products.importer.
+CATALOG_IMPORT_IMAGES_DIR = Path(
+    os.getenv('CATALOG_IMPORT_IMAGES_DIR', BASE_DIR / 'import')
+)
+
+# Корзина гостя в подписанной cookie, см. api.guest_cart: срок жизни
+# в секундах и наибольшее число продуктов.
+GUEST_CART_MAX_AGE = int(os.getenv('GUEST_CART_MAX_AGE', 30 * 24 * 60 * 60))
+GUEST_CART_MAX_ITEMS = int(os.getenv('GUEST_CART_MAX_ITEMS', 100))
+
+# Буфер записи корзины, см. api.cart_buffer: изменения продуктов
+# в корзине копятся в кэше 'cart_buffer' и сбрасываются в БД раз
+# в CART_WRITE_BEHIND_INTERVAL секунд или по накоплении
+# CART_WRITE_BEHIND_MAX_PRODUCTS изменённых продуктов пользователя.
+CART_WRITE_BEHIND = os.getenv('CART_WRITE_BEHIND', 'false').lower() == 'true'
+CART_WRITE_BEHIND_INTERVAL = float(
+    os.getenv('CART_WRITE_BEHIND_INTERVAL', 2)
+)
+CART_WRITE_BEHIND_MAX_PRODUCTS = int(
+    os.getenv('CART_WRITE_BEHIND_MAX_PRODUCTS', 20)
+)
+
+# Версии каталога, дерева категорий и индекса поиска, см.
+# products.versions: по ним процессы узнают об изменениях, сделанных
+# другими процессами и командами. 'file' общий для процессов одной
+# машины, 'locmem' годится только для одного процесса. На нескольких
+# машинах нужен общий бэкенд, например Redis.
+VERSIONS_CACHES = {
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'versions',
+        'TIMEOUT': None,
+    },
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'versions',
+        'TIMEOUT': None,
+    },
+}
+
+# Кэш ответов каталога: 'locmem' (LRU в памяти процесса) или 'file'
+# (общий для процессов одной машины).
+CATALOG_CACHES = {
+    'locmem': {
+        'BACKEND': 'api.response_cache.LRUCache',
+        'LOCATION': 'catalog',
+        'TIMEOUT': 600,
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+    'file': {
+        'BACKEND': 'api.response_cache.FileCache',
+        'LOCATION': BASE_DIR / 'cache' / 'catalog',
+        'TIMEOUT': 600,
+        'OPTIONS': {'MAX_ENTRIES': 50000},
+    },
+}
+
+# Кэш проверенных токенов режима 'cached_token', см.
+# api.authentication. 'file' общий для процессов одной машины: выход
+# и деактивация пользователя сразу видны всем процессам. 'locmem'
+# живёт в памяти процесса, и остальные процессы принимают отозванный
+# токен ещё до TIMEOUT секунд. На нескольких машинах нужен общий
+# бэкенд, например Redis.
+AUTH_CACHES = {
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'auth',
+        'TIMEOUT': 300,
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'auth',
+        'TIMEOUT': 300,
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+
+# Хранилище буфера записи корзины: 'file' переживает перезапуск
+# и общее для процессов одной машины, 'locmem' — только для одного
+# процесса без перезапусков.
+CART_BUFFER_CACHES = {
+    'file': {
+        'BACKEND': 'api.cart_buffer.CartBufferFileCache',
+        'LOCATION': BASE_DIR / 'cache' / 'cart_buffer',
+        'TIMEOUT': None,
+    },
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'cart_buffer',
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': 10 ** 9},
+    },
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'versions': VERSIONS_CACHES[os.getenv('VERSIONS_CACHE', 'file')],
+    'catalog': CATALOG_CACHES[os.getenv('CATALOG_CACHE', 'locmem')],
+    'auth': AUTH_CACHES[os.getenv('AUTH_CACHE', 'file')],
+    'cart_buffer': CART_BUFFER_CACHES[
+        os.getenv('CART_BUFFER_CACHE', 'file')
+    ],
+}
+
+SIMPLE_JWT = {
+    'ACCESS_TOKEN_LIFETIME': timedelta(minutes=15),
+    'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
+    'AUTH_HEADER_TYPES': ('Bearer', ),
+}
@@ -0,0 +1,39 @@
+"""SQLite с прагмами и режимом транзакций из OPTIONS.
+
+Помимо параметров sqlite3.connect в OPTIONS принимаются:
+
+    'pragmas' — словарь PRAGMA, выполняемых при каждом подключении;
+    'transaction_mode' — DEFERRED, IMMEDIATE или EXCLUSIVE.
+
+В режиме IMMEDIATE транзакция сразу берёт блокировку записи и ждёт
+её не дольше 'timeout' секунд. При DEFERRED чтение внутри транзакции,
+за которым следует запись, не ждёт освобождения блокировки и сразу
+падает с «database is locked».
+"""
+from django.db.backends.sqlite3 import base
+
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        self.pragmas = kwargs.pop('pragmas', {})
+        self.transaction_mode = kwargs.pop(
+            'transaction_mode', 'DEFERRED'
+        ).upper()
+        if self.transaction_mode not in TRANSACTION_MODES:
+            raise ValueError(
+                f'Неизвестный режим транзакций: {self.transaction_mode}.'
+            )
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute(f'BEGIN {self.transaction_mode}')
@@ -1,37 +1,162 @@
+"""Админка каталога и корзин.
+
+Таблицы продуктов, изображений и позиций корзин могут содержать
+миллионы строк, поэтому:
+
+- связи из list_display и __str__ загружаются одним JOIN
+  (list_select_related или get_queryset);
+- внешние ключи в формах выбираются через автодополнение, а не
+  выпадающим списком всех объектов;
+- поиск идёт только по индексам: префикс slug, имени пользователя
+  или названия продукта (индекс product_name_prefix_idx из миграции;
+  в SQLite регистр при этом не учитывается только для латиницы);
+- число строк без фильтров оценивается, а не считается COUNT(*).
+"""
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Max, Q
+from django.utils.functional import cached_property
 
 from .models import (
     CartItem, Category, Product, ProductImage, ShoppingCart, Subcategory
 )
 
+# До скольких строк таблицы без фильтров считаются точно.
+EXACT_COUNT_LIMIT = 10000
+# Больше любой строки с тем же началом: граница поиска по префиксу.
+PREFIX_END = '\U0010ffff'
+
+
+def estimate_count(queryset):
+    """Примерное число строк таблицы модели queryset.
+
+    PostgreSQL берёт оценку из статистики pg_class, остальные БД —
+    наибольший первичный ключ, который читается из индекса. После
+    удалений оценка по ключу завышена. None — оценки нет.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+                [queryset.model._meta.db_table]
+            )
+            row = cursor.fetchone()
+        # -1 — таблица ещё ни разу не анализировалась.
+        return int(row[0]) if row and row[0] >= 0 else None
+    return queryset.model._default_manager.using(queryset.db).aggregate(
+        max_pk=Max('pk')
+    )['max_pk'] or 0
+
+
+class EstimatedCountPaginator(Paginator):
+    """Пагинатор с оценкой числа строк большой таблицы без фильтров.
+
+    С фильтрами или поиском строки считаются точно: выборка идёт
+    по индексу и обычно невелика.
+    """
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is None or query.where:
+            return super().count
+        estimate = estimate_count(self.object_list)
+        if estimate is None or estimate < EXACT_COUNT_LIMIT:
+            return super().count
+        return estimate
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Список большой таблицы без COUNT(*) по всей таблице."""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    # Порядок по первичному ключу и для автодополнения.
+    ordering = ('-pk',)
+
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
     list_display = ('name', 'slug')
+    search_fields = ('name', 'slug')
 
 
 @admin.register(Subcategory)
 class SubcategoryAdmin(admin.ModelAdmin):
     list_display = ('name', 'slug', 'category')
+    list_select_related = ('category',)
+    autocomplete_fields = ('category',)
+    search_fields = ('name', 'slug')
 
 
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
+class ProductAdmin(LargeTableAdmin):
     list_display = ('name', 'slug', 'price', 'category', 'subcategory')
+    list_select_related = ('category', 'subcategory')
+    # Фильтры используют индексы (category, price) и (subcategory, price).
+    list_filter = ('category', 'subcategory')
+    autocomplete_fields = ('category', 'subcategory')
+    # Поиск целиком в get_search_results(), поле нужно для строки поиска.
+    search_fields = ('name',)
+    search_help_text = 'Начало названия продукта или slug.'
+
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        # Префикс slug — диапазон по уникальному индексу: LIKE в SQLite
+        # без учёта регистра этот индекс не использует. Название ищется
+        # по началу целиком, а не по отдельным словам.
+        return queryset.filter(
+            Q(slug__gte=search_term, slug__lt=search_term + PREFIX_END)
+            | Q(name__istartswith=search_term)
+        ), False
 
 
 @admin.register(ProductImage)
-class ProductImageAdmin(admin.ModelAdmin):
+class ProductImageAdmin(LargeTableAdmin):
     list_display = ('product', 'image')
+    list_select_related = ('product',)
+    autocomplete_fields = ('product',)
+
+    def get_queryset(self, request):
+        # __str__ выводит название продукта.
+        return super().get_queryset(request).select_related('product')
 
 
 @admin.register(CartItem)
-class CartItemAdmin(admin.ModelAdmin):
+class CartItemAdmin(LargeTableAdmin):
     list_display = (
         'shopping_cart', 'product', 'product_quantity', 'product_price'
     )
+    list_select_related = ('shopping_cart__user', 'product')
+    autocomplete_fields = ('shopping_cart', 'product')
+    search_fields = ('shopping_cart__user__username__startswith',)
+    search_help_text = 'Начало имени пользователя.'
+
+    def get_queryset(self, request):
+        # __str__ позиции и корзины выводит имя пользователя.
+        return super().get_queryset(request).select_related(
+            'shopping_cart__user', 'product'
+        )
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name == 'shopping_cart':
+            # Виджет выводит выбранную корзину с именем пользователя.
+            kwargs['queryset'] = ShoppingCart.objects.select_related('user')
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
 
 
 @admin.register(ShoppingCart)
-class ShoppingCartAdmin(admin.ModelAdmin):
-    list_display = ('user', )
+class ShoppingCartAdmin(LargeTableAdmin):
+    list_display = ('user', 'total_quantity', 'total_price')
+    list_select_related = ('user',)
+    readonly_fields = ('total_quantity', 'total_price')
+    autocomplete_fields = ('user',)
+    search_fields = ('user__username__startswith',)
+    search_help_text = 'Начало имени пользователя.'
+
+    def get_queryset(self, request):
+        # Автодополнение корзин выводит их __str__ с именем пользователя.
+        return super().get_queryset(request).select_related('user')
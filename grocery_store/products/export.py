@@ -0,0 +1,178 @@
+"""Выгрузка всего каталога в NDJSON или CSV потоком.
+
+Продукты читаются порциями по возрастанию id (по два запроса на
+порцию: продукты с категорией и подкатегорией через JOIN
+и изображения), каждая порция сразу кодируется и, при необходимости,
+сжимается gzip. В памяти держится одна порция, поэтому выгрузка
+не зависит от размера каталога и не держит курсор или транзакцию
+открытыми между порциями.
+"""
+import csv
+import json
+import time
+import zlib
+from collections import defaultdict
+from io import StringIO
+
+from django.core.files.storage import FileSystemStorage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+from django.utils.encoding import filepath_to_uri
+
+from .models import Product, ProductImage
+
+CHUNK_SIZE = 2000
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+CSV_FIELDS = (
+    'id', 'name', 'slug', 'price', 'category_slug', 'category',
+    'subcategory_slug', 'subcategory', 'updated_at', 'images',
+)
+
+
+class CatalogExport:
+    """Итератор по байтам выгрузки; считает выгруженные продукты.
+
+    build_url превращает относительный адрес изображения в полный.
+    """
+
+    def __init__(self, export_format='ndjson', compress=False,
+                 queryset=None, chunk_size=CHUNK_SIZE, build_url=None):
+        if export_format not in FORMATS:
+            raise ValueError(f'Неизвестный формат выгрузки: {export_format}')
+        self.export_format = export_format
+        self.compress = compress
+        if queryset is None:
+            queryset = Product.objects.all()
+        self.queryset = queryset
+        self.chunk_size = chunk_size
+        self.build_url = build_url or (lambda url: url)
+        self.rows = 0
+        self.elapsed = 0.0
+
+    @property
+    def content_type(self):
+        return f'{FORMATS[self.export_format]}; charset=utf-8'
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def get_rows(self, last_id):
+        return list(
+            self.queryset.filter(id__gt=last_id).order_by('id').values(
+                'id', 'name', 'slug', 'price', 'updated_at',
+                category_slug=F('category__slug'),
+                category_name=F('category__name'),
+                subcategory_slug=F('subcategory__slug'),
+                subcategory_name=F('subcategory__name'),
+            )[:self.chunk_size]
+        )
+
+    def get_image_url(self):
+        """Функция: имя файла изображения → полный адрес.
+
+        У файлового хранилища адрес — префикс и имя файла, поэтому
+        urljoin для каждого изображения не нужен: на нём уходило больше
+        половины времени выгрузки.
+        """
+        storage = ProductImage._meta.get_field('image').storage
+        if isinstance(storage, FileSystemStorage):
+            prefix = self.build_url(storage.url(''))
+            return lambda name: prefix + filepath_to_uri(name).lstrip('/')
+        return lambda name: self.build_url(storage.url(name))
+
+    def get_images(self, product_ids, image_url):
+        images = defaultdict(list)
+        for product_id, name in ProductImage.objects.filter(
+            product_id__in=product_ids
+        ).order_by('id').values_list('product_id', 'image'):
+            images[product_id].append(image_url(name))
+        return images
+
+    def iter_chunks(self):
+        """Порции продуктов в виде словарей выгрузки."""
+        image_url = self.get_image_url()
+        last_id = 0
+        while True:
+            rows = self.get_rows(last_id)
+            if not rows:
+                return
+            images = self.get_images([row['id'] for row in rows], image_url)
+            yield [
+                {
+                    'id': row['id'],
+                    'name': row['name'],
+                    'slug': row['slug'],
+                    'price': row['price'],
+                    'category': {
+                        'slug': row['category_slug'],
+                        'name': row['category_name'],
+                    },
+                    'subcategory': {
+                        'slug': row['subcategory_slug'],
+                        'name': row['subcategory_name'],
+                    },
+                    'updated_at': row['updated_at'],
+                    'images': images[row['id']],
+                }
+                for row in rows
+            ]
+            last_id = rows[-1]['id']
+
+    def encode_ndjson(self, products):
+        return ''.join(
+            json.dumps(product, ensure_ascii=False, cls=DjangoJSONEncoder)
+            + '\n'
+            for product in products
+        )
+
+    def encode_csv(self, products, header=False):
+        buffer = StringIO()
+        writer = csv.writer(buffer)
+        if header:
+            writer.writerow(CSV_FIELDS)
+        writer.writerows(
+            (
+                product['id'], product['name'], product['slug'],
+                product['price'], product['category']['slug'],
+                product['category']['name'], product['subcategory']['slug'],
+                product['subcategory']['name'],
+                product['updated_at'].isoformat(),
+                ' '.join(product['images']),
+            )
+            for product in products
+        )
+        return buffer.getvalue()
+
+    def encode(self, products):
+        if self.export_format == 'csv':
+            return self.encode_csv(products)
+        return self.encode_ndjson(products)
+
+    def __iter__(self):
+        started = time.perf_counter()
+        # wbits=31: поток в формате gzip, а не голый zlib.
+        compressor = zlib.compressobj(wbits=31) if self.compress else None
+        # Заголовок CSV есть и у пустой выгрузки.
+        pending = (
+            self.encode_csv([], header=True)
+            if self.export_format == 'csv' else ''
+        )
+        for products in self.iter_chunks():
+            self.rows += len(products)
+            data = (pending + self.encode(products)).encode()
+            pending = ''
+            if compressor is not None:
+                data = compressor.compress(data)
+            if data:
+                yield data
+            self.elapsed = time.perf_counter() - started
+        data = pending.encode()
+        if compressor is not None:
+            data = compressor.compress(data) + compressor.flush()
+        if data:
+            yield data
+        self.elapsed = time.perf_counter() - started
@@ -0,0 +1,226 @@
+"""Потоковая загрузка больших фикстур.
+
+loaddata разбирает файл целиком и сохраняет объекты по одному. Здесь
+объекты читаются из JSON-массива или NDJSON по мере разбора, копятся
+порциями одной модели и вставляются через bulk_create: существующие
+строки с тем же pk обновляются, как при loaddata. В памяти держатся
+только текущая порция и непрочитанный хвост буфера.
+"""
+import json
+from itertools import groupby
+
+from django.apps import apps
+from django.core.management.color import no_style
+from django.core.serializers.python import Deserializer
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import CartItem, Product, ShoppingCart
+from .versions import CATALOG, CATEGORY_TREE, SEARCH_INDEX, set_version
+
+CHUNK_SIZE = 64 * 1024
+WHITESPACE = ' \t\n\r'
+
+
+def iter_json_array(file, chunk_size=CHUNK_SIZE):
+    """Элементы JSON-массива из текстового файла по одному."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    eof = False
+    started = False
+
+    def read():
+        nonlocal buffer, position, eof
+        chunk = file.read(chunk_size)
+        eof = not chunk
+        buffer = buffer[position:] + chunk
+        position = 0
+
+    while True:
+        while position < len(buffer) and buffer[position] in WHITESPACE:
+            position += 1
+        if position == len(buffer):
+            if eof:
+                raise ValueError('Неожиданный конец JSON-массива.')
+            read()
+            continue
+        char = buffer[position]
+        if not started:
+            if char != '[':
+                raise ValueError('Фикстура должна быть JSON-массивом.')
+            started = True
+            position += 1
+        elif char == ']':
+            return
+        elif char == ',':
+            position += 1
+        else:
+            try:
+                value, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                read()
+                continue
+            # Число на границе буфера могло прочитаться не полностью.
+            if end == len(buffer) and not eof:
+                read()
+                continue
+            position = end
+            yield value
+
+
+def iter_ndjson(file):
+    """Объекты NDJSON: по одному JSON-объекту в строке."""
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+def iter_batches(records, batch_size):
+    """Подряд идущие записи одной модели порциями до batch_size."""
+    for label, group in groupby(records, key=lambda record: record['model']):
+        batch = []
+        for record in group:
+            batch.append(record)
+            if len(batch) == batch_size:
+                yield label, batch
+                batch = []
+        if batch:
+            yield label, batch
+
+
+def timestamp_fields(model):
+    return [
+        field for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False)
+        or getattr(field, 'auto_now_add', False)
+    ]
+
+
+def fixture_timestamps(model, instances):
+    """Даты auto_now и auto_now_add из фикстуры по объектам."""
+    fields = timestamp_fields(model)
+    return fields, [
+        [getattr(instance, field.attname) for field in fields]
+        for instance in instances
+    ]
+
+
+def restore_timestamps(model, instances, timestamps, using):
+    """Даты auto_now и auto_now_add берутся из фикстуры, как в loaddata.
+
+    bulk_create всегда проставляет такие поля заново, а определения
+    полей общие для всех потоков, поэтому даты из фикстуры
+    записываются после вставки через bulk_update: он берёт значения
+    из объектов. Недостающие даты остаются временем вставки.
+    """
+    fields, values = timestamps
+    if not fields:
+        return
+    for instance, instance_values in zip(instances, values):
+        for field, value in zip(fields, instance_values):
+            if value is not None:
+                setattr(instance, field.attname, value)
+    model._base_manager.using(using).bulk_update(
+        [instance for instance in instances if instance.pk is not None],
+        [field.name for field in fields]
+    )
+
+
+def recalculate_cart_totals(cart_ids, using):
+    """Итоги корзин по их позициям, как в recalculate_cart_totals.
+
+    bulk_create позиций обходит CartItem.save(), поэтому итоги
+    затронутых корзин считаются заново одним UPDATE.
+    """
+    cart_items = CartItem.objects.using(using).filter(
+        shopping_cart=OuterRef('pk')
+    ).order_by().values('shopping_cart')
+    ShoppingCart.objects.using(using).filter(pk__in=cart_ids).update(
+        total_quantity=Coalesce(Subquery(cart_items.annotate(
+            total=Sum('product_quantity')
+        ).values('total')), 0),
+        total_price=Coalesce(Subquery(cart_items.annotate(
+            total=Sum('product_price')
+        ).values('total')), Value(0.0)),
+        updated_at=timezone.now()
+    )
+
+
+def save_batch(model, records, using):
+    objects = list(Deserializer(records, using=using))
+    instances = [deserialized.object for deserialized in objects]
+    update_fields = [
+        field.name for field in model._meta.concrete_fields
+        if not field.primary_key
+    ]
+    manager = model._base_manager.using(using)
+    with transaction.atomic(using=using):
+        if model is CartItem:
+            # Позиция могла перейти в другую корзину.
+            cart_ids = set(manager.filter(pk__in=[
+                instance.pk for instance in instances
+            ]).values_list('shopping_cart', flat=True))
+        timestamps = fixture_timestamps(model, instances)
+        manager.bulk_create(
+            [instance for instance in instances if instance.pk is None]
+        )
+        manager.bulk_create(
+            [instance for instance in instances if instance.pk is not None],
+            update_conflicts=True,
+            unique_fields=[model._meta.pk.name],
+            update_fields=update_fields
+        )
+        for deserialized in objects:
+            for name, values in (deserialized.m2m_data or {}).items():
+                getattr(deserialized.object, name).set(values)
+        if model is Product:
+            # Цены существующих продуктов могли измениться.
+            CartItem.objects.using(using).reprice_products(
+                instance.pk for instance in instances
+            )
+        elif model is CartItem:
+            recalculate_cart_totals(cart_ids | {
+                instance.shopping_cart_id for instance in instances
+            }, using)
+        elif model is ShoppingCart:
+            # Позиции корзины могли загрузиться раньше неё.
+            recalculate_cart_totals(
+                [instance.pk for instance in instances], using
+            )
+        restore_timestamps(model, instances, timestamps, using)
+    return len(instances)
+
+
+def load_records(records, batch_size=5000, using=DEFAULT_DB_ALIAS):
+    """Загружает записи фикстуры, возвращает число строк по моделям.
+
+    Как и loaddata, загрузка идёт в одной транзакции, каждая порция —
+    в своей точке сохранения. Внешние ключи проверяются в конце
+    загрузки, поэтому записи могут ссылаться на объекты из следующих
+    порций; при ошибке не сохраняется ничего.
+    """
+    connection = connections[using]
+    counts = {}
+    with transaction.atomic(using=using):
+        with connection.constraint_checks_disabled():
+            for label, batch in iter_batches(records, batch_size):
+                model = apps.get_model(label)
+                counts[model] = counts.get(model, 0) + save_batch(
+                    model, batch, using
+                )
+        table_names = [model._meta.db_table for model in counts]
+        connection.check_constraints(table_names=table_names)
+        sequence_sql = connection.ops.sequence_reset_sql(no_style(), counts)
+        if sequence_sql:
+            with connection.cursor() as cursor:
+                for sql in sequence_sql:
+                    cursor.execute(sql)
+    # bulk_create не отправляет сигналы моделей.
+    for name in (CATALOG, CATEGORY_TREE, SEARCH_INDEX):
+        set_version(name)
+    return counts
@@ -0,0 +1,204 @@
+"""Производные изображения: несколько пропорций, ширин и форматов.
+
+Производные строятся в пуле процессов вне обработки запроса и лежат
+рядом с оригиналом по детерминированным путям:
+
+    derivatives/<оригинал без расширения>/<пропорция>_<ширина>.<формат>
+
+Рядом записывается widths.json с действительными ширинами построенных
+производных: srcset выводит только их, а у изображений без производных
+(например, загруженных через bulk_create) srcset пуст.
+"""
+import json
+import logging
+import os
+import posixpath
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from threading import Lock
+
+from PIL import Image, ImageOps
+
+ASPECT_RATIOS = {
+    '1x1': (1, 1),
+    '4x3': (4, 3),
+    '16x9': (16, 9),
+}
+WIDTHS = (320, 640, 1280)
+FORMATS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+    'jpeg': {'format': 'JPEG', 'quality': 82, 'optimize': True},
+}
+DERIVATIVES_DIR = 'derivatives'
+WIDTHS_FILE = 'widths.json'
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = Lock()
+
+
+def derivative_dir(name):
+    # Строковые операции вместо PurePosixPath: имена строятся на каждое
+    # изображение в каждом ответе API.
+    return posixpath.join(DERIVATIVES_DIR, posixpath.splitext(name)[0])
+
+
+def derivative_name(name, ratio, width, image_format):
+    return f'{derivative_dir(name)}/{ratio}_{width}.{image_format}'
+
+
+def widths_name(name):
+    return f'{derivative_dir(name)}/{WIDTHS_FILE}'
+
+
+def crop_to_ratio(image, ratio):
+    """Центральная обрезка до пропорции без масштабирования."""
+    ratio_width, ratio_height = ASPECT_RATIOS[ratio]
+    width, height = image.size
+    if width * ratio_height > height * ratio_width:
+        width = height * ratio_width // ratio_height
+    else:
+        height = width * ratio_height // ratio_width
+    return ImageOps.fit(image, (width, height))
+
+
+def generate_derivatives(media_root, name):
+    """Строит производные одного изображения, возвращает число файлов.
+
+    Выполняется в рабочем процессе, поэтому обходится без Django.
+    Актуальные производные (не старше оригинала) не перестраиваются.
+    Оригинал не увеличивается: если он уже нужной ширины, производная
+    сохраняется в исходном размере, а в widths.json записывается её
+    действительная ширина.
+    """
+    source = os.path.join(media_root, name)
+    if not os.path.exists(source):
+        return 0
+    widths_path = os.path.join(media_root, widths_name(name))
+    if (
+        os.path.exists(widths_path)
+        and os.path.getmtime(widths_path) >= os.path.getmtime(source)
+    ):
+        return 0
+    os.makedirs(os.path.dirname(widths_path), exist_ok=True)
+    widths = {}
+    with Image.open(source) as original:
+        # JPEG декодируется сразу в уменьшенном масштабе.
+        original.draft('RGB', (max(WIDTHS), max(WIDTHS)))
+        original = ImageOps.exif_transpose(original).convert('RGB')
+        for ratio in ASPECT_RATIOS:
+            cropped = crop_to_ratio(original, ratio)
+            widths[ratio] = {}
+            for width in WIDTHS:
+                image = cropped
+                if image.width > width:
+                    height = round(image.height * width / image.width)
+                    image = image.resize((width, height), Image.LANCZOS)
+                for image_format, options in FORMATS.items():
+                    image.save(os.path.join(media_root, derivative_name(
+                        name, ratio, width, image_format
+                    )), **options)
+                widths[ratio][width] = image.width
+    # Файл ширин пишется последним и атомарно: по нему srcset судит,
+    # что производные готовы.
+    temp_path = f'{widths_path}.{os.getpid()}.tmp'
+    with open(temp_path, 'w') as file:
+        json.dump(widths, file)
+    os.replace(temp_path, widths_path)
+    return len(ASPECT_RATIOS) * len(WIDTHS) * len(FORMATS)
+
+
+def get_executor(workers):
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=workers)
+        return _executor
+
+
+def schedule_derivatives(name):
+    """Ставит построение производных в пул процессов.
+
+    При IMAGE_DERIVATIVES_WORKERS = 0 производные строятся сразу,
+    это удобно для тестов и управляющих команд. Когда производные
+    готовы, сбрасывается версия каталога, чтобы кэшированные ответы
+    получили srcset; ошибки пула пишутся в лог.
+    """
+    from django.conf import settings
+
+    workers = settings.IMAGE_DERIVATIVES_WORKERS
+    if not workers:
+        return derivatives_done(
+            generate_derivatives(str(settings.MEDIA_ROOT), name)
+        )
+    future = get_executor(workers).submit(
+        generate_derivatives, str(settings.MEDIA_ROOT), name
+    )
+    future.add_done_callback(lambda future: derivatives_finished(name, future))
+    return future
+
+
+def derivatives_done(created):
+    from .versions import CATALOG, set_version
+
+    if created:
+        set_version(CATALOG)
+    return created
+
+
+def derivatives_finished(name, future):
+    error = future.exception()
+    if error is not None:
+        logger.error(
+            'Не удалось построить производные %s', name, exc_info=error
+        )
+    else:
+        derivatives_done(future.result())
+
+
+@lru_cache(maxsize=10000)
+def load_widths(path, mtime_ns):
+    """Ширины из widths.json; mtime_ns в ключе сбрасывает кэш."""
+    with open(path) as file:
+        return {
+            ratio: {int(width): actual for width, actual in widths.items()}
+            for ratio, widths in json.load(file).items()
+        }
+
+
+def get_widths(name):
+    """{пропорция: {ширина в имени: действительная ширина}} или None."""
+    from django.conf import settings
+
+    path = os.path.join(settings.MEDIA_ROOT, widths_name(name))
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    return load_widths(path, mtime_ns)
+
+
+def get_srcset(name, build_url):
+    """Карта {пропорция: {формат: 'url 320w, url 640w, ...'}}.
+
+    Выводятся только построенные производные с их действительной
+    шириной; одинаковые по ширине производные небольшого оригинала
+    выводятся один раз. Без производных возвращается None.
+    """
+    widths = get_widths(name)
+    if widths is None:
+        return None
+    srcset = {}
+    for ratio, ratio_widths in widths.items():
+        unique = {}
+        for width, actual in sorted(ratio_widths.items()):
+            unique.setdefault(actual, width)
+        srcset[ratio] = {}
+        for image_format in FORMATS:
+            entries = []
+            for actual, width in unique.items():
+                derivative = derivative_name(name, ratio, width, image_format)
+                entries.append(f'{build_url(derivative)} {actual}w')
+            srcset[ratio][image_format] = ', '.join(entries)
+    return srcset
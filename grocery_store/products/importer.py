@@ -0,0 +1,458 @@
+"""Массовый импорт каталога поставщика с обновлением по slug.
+
+Записи читаются из CSV или NDJSON (тех же форматов, что и выгрузка
+каталога) и обрабатываются порциями, каждая — в своей транзакции.
+Категории, подкатегории и продукты сравниваются с уже сохранёнными
+строками: новые вставляются через bulk_create, изменившиеся
+обновляются через bulk_update, неизменные не переписываются.
+
+Изображения берутся из локального каталога и в пуле процессов
+проверяются декодированием, копируются в хранилище под именем по хешу
+содержимого и получают производные. Имя по хешу позволяет сравнивать
+изображения продукта без чтения файлов: тот же файл даёт то же имя.
+Пул обрабатывает изображения порции, пока её строки пишутся в БД.
+"""
+import csv
+import hashlib
+import os
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import contextmanager, nullcontext
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image
+
+from .fixtures import iter_ndjson
+from .images import generate_derivatives
+from .models import Category, Product, ProductImage, Subcategory
+from .search import search_index
+from .versions import CATALOG, CATEGORY_TREE, set_version
+
+BATCH_SIZE = 1000
+FORMATS = ('csv', 'ndjson')
+IMPORT_DIR = 'products/import'
+IMAGE_EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp'}
+REQUIRED_CSV_FIELDS = (
+    'name', 'slug', 'price', 'category_slug', 'category',
+    'subcategory_slug', 'subcategory',
+)
+MAX_ERRORS = 100
+PHASES = ('read', 'categories', 'subcategories', 'products', 'images')
+
+
+class CatalogImportError(ValueError):
+    """Файл импорта нельзя прочитать целиком."""
+
+
+def iter_csv(file):
+    reader = csv.DictReader(file)
+    missing = [
+        field for field in REQUIRED_CSV_FIELDS
+        if field not in (reader.fieldnames or ())
+    ]
+    if missing:
+        raise CatalogImportError(
+            f'В CSV нет столбцов: {", ".join(missing)}.'
+        )
+    yield from reader
+
+
+def iter_records(file, import_format):
+    if import_format not in FORMATS:
+        raise CatalogImportError(
+            f'Неизвестный формат импорта: {import_format}'
+        )
+    if import_format == 'csv':
+        return iter_csv(file)
+    return iter_ndjson(file)
+
+
+def stored_name(media_root, digest):
+    """Уже сохранённое изображение с таким хешем или None."""
+    for extension in IMAGE_EXTENSIONS.values():
+        name = f'{IMPORT_DIR}/{digest[:2]}/{digest}.{extension}'
+        if os.path.exists(os.path.join(media_root, name)):
+            return name
+    return None
+
+
+def ingest_image(source_dir, media_root, path, derivatives=True):
+    """Проверяет и сохраняет изображение поставщика.
+
+    Выполняется в рабочем процессе, поэтому обходится без Django.
+    Файл, уже сохранённый при прошлом импорте, повторно
+    не декодируется. Возвращает (имя в хранилище, None) или
+    (None, текст ошибки).
+    """
+    source_dir = os.path.realpath(source_dir)
+    source = os.path.realpath(os.path.join(source_dir, path))
+    if not source.startswith(source_dir + os.sep):
+        return None, f'Изображение {path} вне каталога импорта.'
+    try:
+        with open(source, 'rb') as file:
+            data = file.read()
+        digest = hashlib.sha1(data).hexdigest()
+        name = stored_name(media_root, digest)
+        if name is None:
+            with Image.open(BytesIO(data)) as image:
+                # Полное декодирование находит и обрезанные файлы.
+                image.load()
+                image_format = image.format
+    except FileNotFoundError:
+        return None, f'Изображение {path} не найдено.'
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None, f'Изображение {path} не читается.'
+    if name is None:
+        if image_format not in IMAGE_EXTENSIONS:
+            return None, f'Изображение {path} в неподдерживаемом формате.'
+        name = (
+            f'{IMPORT_DIR}/{digest[:2]}/{digest}.'
+            f'{IMAGE_EXTENSIONS[image_format]}'
+        )
+        target = os.path.join(media_root, name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        temporary = f'{target}.{os.getpid()}.tmp'
+        with open(temporary, 'wb') as file:
+            file.write(data)
+        os.replace(temporary, target)
+    if derivatives:
+        generate_derivatives(media_root, name)
+    return name, None
+
+
+def parse_images(value):
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return value.split()
+    return [str(path) for path in value]
+
+
+def clean_group(model, slug, name, groups):
+    """Проверенная категория или подкатегория.
+
+    Записи повторяют одни и те же группы, поэтому результат проверки
+    запоминается в groups.
+    """
+    key = (model, slug, name)
+    if key not in groups:
+        group = model(slug=slug, name=name)
+        try:
+            group.clean_fields(exclude=('category',))
+        except ValidationError as error:
+            group = error
+        groups[key] = group
+    group = groups[key]
+    if isinstance(group, ValidationError):
+        raise group
+    return group
+
+
+def parse_record(record, groups):
+    """Запись файла → проверенные значения строк трёх моделей.
+
+    Принимает как плоские строки CSV, так и вложенные объекты NDJSON.
+    """
+    if not isinstance(record, dict):
+        raise ValidationError('Запись должна быть объектом.')
+    category = record.get('category')
+    subcategory = record.get('subcategory')
+    if isinstance(category, dict):
+        category_slug, category_name = (
+            category.get('slug'), category.get('name')
+        )
+    else:
+        category_slug, category_name = record.get('category_slug'), category
+    if isinstance(subcategory, dict):
+        subcategory_slug, subcategory_name = (
+            subcategory.get('slug'), subcategory.get('name')
+        )
+    else:
+        subcategory_slug, subcategory_name = (
+            record.get('subcategory_slug'), subcategory
+        )
+    product = Product(
+        slug=record.get('slug'), name=record.get('name'),
+        price=record.get('price')
+    )
+    product.clean_fields(exclude=('category', 'subcategory'))
+    return {
+        'category': clean_group(
+            Category, category_slug, category_name, groups
+        ),
+        'subcategory': clean_group(
+            Subcategory, subcategory_slug, subcategory_name, groups
+        ),
+        'product': product,
+        'images': parse_images(record.get('images')),
+    }
+
+
+def format_error(error):
+    if hasattr(error, 'error_dict'):
+        return '; '.join(
+            f'{field}: {" ".join(messages)}'
+            for field, messages in error.message_dict.items()
+        )
+    return ' '.join(error.messages)
+
+
+class ImportReport:
+    """Счётчики импорта по моделям, ошибки записей и время этапов."""
+
+    def __init__(self):
+        self.rows = 0
+        self.created = Counter()
+        self.updated = Counter()
+        self.unchanged = Counter()
+        self.deleted = Counter()
+        self.error_count = 0
+        self.errors = []
+        self.timings = dict.fromkeys(PHASES, 0.0)
+        self.elapsed = 0.0
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] += time.perf_counter() - started
+
+    def add_error(self, number, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append(f'Запись {number}: {message}')
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self):
+        models = (Category, Subcategory, Product, ProductImage)
+        return {
+            'rows': self.rows,
+            'error_count': self.error_count,
+            'errors': self.errors,
+            **{
+                model._meta.model_name: {
+                    'created': self.created[model],
+                    'updated': self.updated[model],
+                    'unchanged': self.unchanged[model],
+                    'deleted': self.deleted[model],
+                }
+                for model in models
+            },
+            'timings': {
+                name: round(seconds, 3)
+                for name, seconds in self.timings.items()
+            },
+            'elapsed': round(self.elapsed, 3),
+        }
+
+
+class CatalogImport:
+    """Импорт записей каталога порциями по batch_size.
+
+    images_dir — каталог, относительно которого указаны изображения
+    в записях; workers — число процессов пула изображений (0 —
+    обрабатывать в текущем процессе, None — по числу ядер). Вместо
+    собственного пула можно передать общий executor.
+    """
+
+    def __init__(self, images_dir=None, batch_size=BATCH_SIZE, workers=None,
+                 derivatives=True, executor=None):
+        self.images_dir = str(images_dir) if images_dir else None
+        self.batch_size = batch_size
+        self.workers = workers
+        self.derivatives = derivatives
+        self.media_root = str(settings.MEDIA_ROOT)
+        self.report = ImportReport()
+        self.executor = executor
+        # Изображение, общее для нескольких записей, обрабатывается
+        # один раз за импорт.
+        self.images = {}
+        self.groups = {}
+
+    def submit_image(self, path):
+        if self.images_dir is None:
+            future = Future()
+            future.set_result(
+                (None, f'Изображение {path}: каталог изображений не задан.')
+            )
+            return future
+        arguments = (self.images_dir, self.media_root, path, self.derivatives)
+        if self.executor is None:
+            future = Future()
+            future.set_result(ingest_image(*arguments))
+            return future
+        return self.executor.submit(ingest_image, *arguments)
+
+    def iter_batches(self, records):
+        """Проверенные записи порциями; строки с ошибками отбрасываются.
+
+        Повтор slug внутри порции заменяет предыдущую запись.
+        """
+        batch = {}
+        records = enumerate(records, start=1)
+        while True:
+            with self.report.phase('read'):
+                number, record = next(records, (None, None))
+                if number is not None:
+                    self.report.rows += 1
+                    try:
+                        row = parse_record(record, self.groups)
+                    except ValidationError as error:
+                        self.report.add_error(number, format_error(error))
+                    else:
+                        batch[row['product'].slug] = (number, row)
+            if number is None or len(batch) == self.batch_size:
+                if batch:
+                    yield list(batch.values())
+                batch = {}
+            if number is None:
+                return
+
+    def upsert(self, model, rows):
+        """Вставляет и обновляет строки {slug: {поле: значение}}.
+
+        Возвращает id по slug. Строки, значения которых совпадают
+        с сохранёнными, не переписываются. Если записи порции расходятся
+        в названии категории или подкатегории, берётся последняя.
+        """
+        fields = list(next(iter(rows.values())))
+        existing = {
+            row['slug']: row
+            for row in model.objects.filter(slug__in=list(rows)).values(
+                'id', 'slug', *fields
+            )
+        }
+        ids = {}
+        created, updated = [], []
+        now = timezone.now()
+        for slug, values in rows.items():
+            row = existing.get(slug)
+            if row is None:
+                created.append(model(slug=slug, **values))
+            elif any(row[field] != values[field] for field in fields):
+                updated.append(
+                    model(id=row['id'], slug=slug, updated_at=now, **values)
+                )
+                ids[slug] = row['id']
+            else:
+                self.report.unchanged[model] += 1
+                ids[slug] = row['id']
+        if created:
+            for instance in model.objects.bulk_create(created):
+                ids[instance.slug] = instance.pk
+        if updated:
+            # bulk_update не проставляет auto_now.
+            model.objects.bulk_update(updated, [*fields, 'updated_at'])
+        # bulk_create и bulk_update не отправляют сигналы моделей.
+        search_index.record(model._meta.model_name, [
+            ids[instance.slug] for instance in (*created, *updated)
+        ])
+        self.report.created[model] += len(created)
+        self.report.updated[model] += len(updated)
+        return ids
+
+    def save_images(self, product_ids, images):
+        """Заменяет изображения продуктов, у которых изменился список."""
+        existing = defaultdict(list)
+        for product_id, image_id, name in ProductImage.objects.filter(
+            product_id__in=product_ids.values()
+        ).order_by('id').values_list('product_id', 'id', 'image'):
+            existing[product_id].append((image_id, name))
+        stale, created = [], []
+        for slug, names in images.items():
+            product_id = product_ids[slug]
+            current = existing[product_id]
+            if [name for _, name in current] == names:
+                self.report.unchanged[ProductImage] += len(names)
+                continue
+            stale.extend(image_id for image_id, _ in current)
+            created.extend(
+                ProductImage(product_id=product_id, image=name)
+                for name in names
+            )
+        if stale:
+            ProductImage.objects.filter(id__in=stale).delete()
+        ProductImage.objects.bulk_create(created)
+        self.report.deleted[ProductImage] += len(stale)
+        self.report.created[ProductImage] += len(created)
+
+    def import_batch(self, batch):
+        with self.report.phase('images'):
+            for _, row in batch:
+                for path in row['images'] or ():
+                    if path not in self.images:
+                        self.images[path] = self.submit_image(path)
+        with transaction.atomic():
+            with self.report.phase('categories'):
+                category_ids = self.upsert(Category, {
+                    row['category'].slug: {'name': row['category'].name}
+                    for _, row in batch
+                })
+            with self.report.phase('subcategories'):
+                subcategory_ids = self.upsert(Subcategory, {
+                    row['subcategory'].slug: {
+                        'name': row['subcategory'].name,
+                        'category_id': category_ids[row['category'].slug],
+                    }
+                    for _, row in batch
+                })
+            with self.report.phase('products'):
+                product_ids = self.upsert(Product, {
+                    row['product'].slug: {
+                        'name': row['product'].name,
+                        'price': row['product'].price,
+                        'category_id': category_ids[row['category'].slug],
+                        'subcategory_id': subcategory_ids[
+                            row['subcategory'].slug
+                        ],
+                    }
+                    for _, row in batch
+                })
+            with self.report.phase('images'):
+                images = {}
+                for number, row in batch:
+                    if row['images'] is None:
+                        continue
+                    names, failed = [], False
+                    for path in row['images']:
+                        name, error = self.images[path].result()
+                        if error:
+                            self.report.add_error(number, error)
+                            failed = True
+                        else:
+                            names.append(name)
+                    # Если хоть одно изображение не прочитано, прежние
+                    # изображения продукта остаются как есть.
+                    if not failed:
+                        images[row['product'].slug] = names
+                self.save_images(product_ids, images)
+
+    def run(self, records):
+        started = time.perf_counter()
+        if self.executor is not None or self.workers == 0:
+            pool = nullcontext(self.executor)
+        else:
+            pool = ProcessPoolExecutor(max_workers=self.workers)
+        try:
+            with pool as executor:
+                self.executor = executor
+                for batch in self.iter_batches(records):
+                    self.import_batch(batch)
+        finally:
+            # bulk_create и bulk_update не отправляют сигналы моделей,
+            # а порции до ошибки уже сохранены. Индекс поиска получает
+            # изменения через журнал, см. upsert().
+            for name in (CATALOG, CATEGORY_TREE):
+                set_version(name)
+            self.report.elapsed = time.perf_counter() - started
+        return self.report
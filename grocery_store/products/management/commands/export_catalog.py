@@ -0,0 +1,54 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from products.export import CHUNK_SIZE, FORMATS, CatalogExport
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает все продукты с категорией, подкатегорией и адресами '
+        'изображений в NDJSON или CSV, читая каталог порциями.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'output',
+            help='Файл выгрузки; с расширением .gz сжимается gzip.'
+        )
+        parser.add_argument(
+            '--format', choices=tuple(FORMATS),
+            help='Формат выгрузки; по умолчанию определяется по '
+                 'расширению файла, иначе ndjson.'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=CHUNK_SIZE,
+            help='Количество продуктов в одной порции.'
+        )
+        parser.add_argument(
+            '--base-url', default='',
+            help='Префикс адресов изображений, например '
+                 'https://store.example.com.'
+        )
+
+    def handle(self, *args, **options):
+        path = Path(options['output'])
+        compress = path.suffix == '.gz'
+        suffix = Path(path.stem).suffix if compress else path.suffix
+        export_format = options['format'] or (
+            'csv' if suffix == '.csv' else 'ndjson'
+        )
+        base_url = options['base_url'].rstrip('/')
+        export = CatalogExport(
+            export_format,
+            compress=compress,
+            chunk_size=options['chunk_size'],
+            build_url=lambda url: base_url + url
+        )
+        with path.open('wb') as file:
+            for chunk in export:
+                file.write(chunk)
+        self.stdout.write(self.style.SUCCESS(
+            f'Выгружено продуктов: {export.rows} за {export.elapsed:.2f} с '
+            f'({export.rows_per_second:.0f} строк/с).'
+        ))
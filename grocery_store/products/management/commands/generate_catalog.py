@@ -0,0 +1,182 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from products.models import (
+    CartItem, Category, Product, ProductImage, ShoppingCart, Subcategory
+)
+from products.versions import (
+    CATALOG, CATEGORY_TREE, SEARCH_INDEX, set_version
+)
+from users.models import User
+
+ADJECTIVES = (
+    'Свежий', 'Домашний', 'Фермерский', 'Отборный', 'Копчёный',
+    'Сладкий', 'Острый', 'Нежный', 'Хрустящий', 'Душистый',
+)
+NOUNS = (
+    'сыр', 'хлеб', 'йогурт', 'кофе', 'чай', 'творог', 'паштет', 'соус',
+    'мёд', 'джем', 'кефир', 'салат', 'лосось', 'окорок', 'шоколад',
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Генерирует синтетический каталог: категории, подкатегории, '
+        'продукты, изображения и корзины пользователей. Строки '
+        'вставляются через bulk_create порциями, каждая порция — '
+        'в своей транзакции.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categories', type=int, default=10)
+        parser.add_argument(
+            '--subcategories', type=int, default=5,
+            help='Количество подкатегорий в каждой категории.'
+        )
+        parser.add_argument('--products', type=int, default=10000)
+        parser.add_argument(
+            '--images', type=int, default=1,
+            help='Количество изображений каждого продукта.'
+        )
+        parser.add_argument(
+            '--users', type=int, default=0,
+            help='Количество пользователей с корзинами.'
+        )
+        parser.add_argument(
+            '--cart-items', type=int, default=5,
+            help='Количество продуктов в каждой корзине.'
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--prefix', default='gen',
+            help='Префикс slug и имён пользователей, чтобы не пересекаться '
+                 'с существующими данными.'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+
+    def insert(self, model, objects):
+        # Связи задаются через *_id: присваивание объектов через
+        # дескрипторы заметно замедляет создание сотен тысяч строк.
+        with transaction.atomic():
+            created = model.objects.bulk_create(objects)
+        self.counts[model._meta.verbose_name_plural] = (
+            self.counts.get(model._meta.verbose_name_plural, 0)
+            + len(created)
+        )
+        return created
+
+    def batches(self, total, batch_size):
+        for start in range(0, total, batch_size):
+            yield range(start, min(start + batch_size, total))
+
+    def generate_groups(self, options):
+        prefix = options['prefix']
+        categories = self.insert(Category, [
+            Category(
+                name=f'Категория {number}',
+                slug=f'{prefix}-c{number}',
+                image=f'categories/{prefix}-c{number}.jpg'
+            )
+            for number in range(options['categories'])
+        ])
+        return self.insert(Subcategory, [
+            Subcategory(
+                name=f'Подкатегория {category_number}.{number}',
+                slug=f'{prefix}-s{category_number}-{number}',
+                image=f'subcategories/{prefix}-s{category_number}-'
+                      f'{number}.jpg',
+                category_id=category.id
+            )
+            for category_number, category in enumerate(categories)
+            for number in range(options['subcategories'])
+        ])
+
+    def generate_products(self, options, subcategories, rng):
+        """Продукты и изображения порциями; возвращает (id, цена)."""
+        prefix = options['prefix']
+        products = []
+        for numbers in self.batches(
+            options['products'], options['batch_size']
+        ):
+            batch = []
+            for number in numbers:
+                subcategory = subcategories[number % len(subcategories)]
+                batch.append(Product(
+                    name=f'{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} '
+                         f'{number}',
+                    slug=f'{prefix}-p{number}',
+                    price=round(rng.uniform(10, 5000), 2),
+                    category_id=subcategory.category_id,
+                    subcategory_id=subcategory.id
+                ))
+            batch = self.insert(Product, batch)
+            self.insert(ProductImage, [
+                ProductImage(
+                    product_id=product.id,
+                    image=f'products/{product.slug}-{number}.jpg'
+                )
+                for product in batch
+                for number in range(options['images'])
+            ])
+            products.extend((product.id, product.price) for product in batch)
+        return products
+
+    def generate_carts(self, options, products, rng):
+        """Пользователи с корзинами; итоги корзин сразу согласованы."""
+        prefix = options['prefix']
+        cart_size = min(options['cart_items'], len(products))
+        for numbers in self.batches(options['users'], options['batch_size']):
+            users = self.insert(User, [
+                User(username=f'{prefix}-user{number}') for number in numbers
+            ])
+            contents = [rng.sample(products, cart_size) for _ in users]
+            quantities = [
+                [rng.randint(1, 5) for _ in content] for content in contents
+            ]
+            shopping_carts = self.insert(ShoppingCart, [
+                ShoppingCart(
+                    user_id=user.id,
+                    total_quantity=sum(cart_quantities),
+                    total_price=sum(
+                        quantity * price for (_, price), quantity
+                        in zip(content, cart_quantities)
+                    )
+                )
+                for user, content, cart_quantities
+                in zip(users, contents, quantities)
+            ])
+            self.insert(CartItem, [
+                CartItem(
+                    shopping_cart_id=shopping_cart.id,
+                    product_id=product_id,
+                    product_quantity=quantity,
+                    product_price=quantity * price
+                )
+                for shopping_cart, content, cart_quantities
+                in zip(shopping_carts, contents, quantities)
+                for (product_id, price), quantity
+                in zip(content, cart_quantities)
+            ])
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        self.counts = {}
+        started = time.perf_counter()
+        subcategories = self.generate_groups(options)
+        products = self.generate_products(options, subcategories, rng)
+        if options['users']:
+            self.generate_carts(options, products, rng)
+        elapsed = time.perf_counter() - started
+        # bulk_create не отправляет сигналы моделей.
+        for name in (CATALOG, CATEGORY_TREE, SEARCH_INDEX):
+            set_version(name)
+        rows = sum(self.counts.values())
+        for name, count in self.counts.items():
+            self.stdout.write(f'{name}: {count}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано строк: {rows} за {elapsed:.2f} с '
+            f'({rows / elapsed:.0f} строк/с).'
+        ))
@@ -0,0 +1,48 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from products.images import generate_derivatives
+from products.models import Category, ProductImage, Subcategory
+from products.versions import CATALOG, set_version
+
+
+class Command(BaseCommand):
+    help = (
+        'Строит недостающие и устаревшие производные изображений '
+        'продуктов, категорий и подкатегорий.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=None,
+            help='Количество процессов, по умолчанию по числу ядер.'
+        )
+
+    def get_image_names(self):
+        names = set()
+        for model in (ProductImage, Category, Subcategory):
+            names.update(
+                model.objects.exclude(image='').exclude(
+                    image__isnull=True
+                ).values_list('image', flat=True).iterator()
+            )
+        return sorted(names)
+
+    def handle(self, *args, **options):
+        names = self.get_image_names()
+        media_root = str(settings.MEDIA_ROOT)
+        with ProcessPoolExecutor(max_workers=options['workers']) as executor:
+            created = sum(executor.map(
+                generate_derivatives,
+                [media_root] * len(names),
+                names,
+                chunksize=16
+            ))
+        if created:
+            # Кэшированные ответы каталога получат новые srcset.
+            set_version(CATALOG)
+        self.stdout.write(self.style.SUCCESS(
+            f'Изображений: {len(names)}, построено производных: {created}.'
+        ))
@@ -0,0 +1,63 @@
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.base import DeserializationError
+
+from products.fixtures import (
+    CHUNK_SIZE, iter_json_array, iter_ndjson, load_records
+)
+
+NDJSON_SUFFIXES = ('.ndjson', '.jsonl')
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает большую фикстуру в формате JSON или NDJSON, разбирая '
+        'её по мере чтения и вставляя объекты порциями через bulk_create.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('fixture')
+        parser.add_argument(
+            '--format', choices=('json', 'ndjson'),
+            help='Формат фикстуры; по умолчанию определяется по '
+                 'расширению файла.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Количество объектов в одной порции bulk_create.'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=CHUNK_SIZE,
+            help='Размер блока чтения JSON в символах.'
+        )
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        path = Path(options['fixture'])
+        if not path.is_file():
+            raise CommandError(f'Фикстура {path} не найдена.')
+        fixture_format = options['format'] or (
+            'ndjson' if path.suffix in NDJSON_SUFFIXES else 'json'
+        )
+        started = time.perf_counter()
+        with path.open(encoding='utf-8') as file:
+            if fixture_format == 'ndjson':
+                records = iter_ndjson(file)
+            else:
+                records = iter_json_array(file, options['chunk_size'])
+            try:
+                counts = load_records(
+                    records, options['batch_size'], options['database']
+                )
+            except (DeserializationError, LookupError, ValueError) as error:
+                raise CommandError(f'Ошибка в фикстуре {path}: {error}')
+        elapsed = time.perf_counter() - started
+        rows = sum(counts.values())
+        for model, count in counts.items():
+            self.stdout.write(f'{model._meta.verbose_name_plural}: {count}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено строк: {rows} за {elapsed:.2f} с '
+            f'({rows / elapsed:.0f} строк/с).'
+        ))
@@ -0,0 +1,85 @@
+from math import isclose
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from products.models import CartItem, ShoppingCart
+
+
+class Command(BaseCommand):
+    help = (
+        'Сверяет сохранённые итоги корзин с их позициями '
+        'и исправляет расхождения порциями.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help='Количество корзин в одной транзакции.'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только найти расхождения, ничего не исправляя.'
+        )
+
+    def get_actual_totals(self, cart_ids):
+        return {
+            row['shopping_cart']: (row['quantity'], row['price'])
+            for row in CartItem.objects.filter(
+                shopping_cart__in=cart_ids
+            ).order_by().values('shopping_cart').annotate(
+                quantity=Sum('product_quantity'),
+                price=Sum('product_price'),
+            )
+        }
+
+    def fix_chunk(self, cart_ids, dry_run):
+        with transaction.atomic():
+            shopping_carts = ShoppingCart.objects.select_for_update().filter(
+                pk__in=cart_ids
+            ).only('total_quantity', 'total_price', 'updated_at')
+            actual_totals = self.get_actual_totals(cart_ids)
+            drifted = []
+            for shopping_cart in shopping_carts:
+                quantity, price = actual_totals.get(
+                    shopping_cart.pk, (0, 0.0)
+                )
+                if (
+                    shopping_cart.total_quantity != quantity
+                    or not isclose(
+                        shopping_cart.total_price, price, abs_tol=1e-6
+                    )
+                ):
+                    shopping_cart.total_quantity = quantity
+                    shopping_cart.total_price = price
+                    drifted.append(shopping_cart)
+            if drifted and not dry_run:
+                now = timezone.now()
+                for shopping_cart in drifted:
+                    shopping_cart.updated_at = now
+                ShoppingCart.objects.bulk_update(
+                    drifted, ('total_quantity', 'total_price', 'updated_at')
+                )
+        return len(drifted)
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        checked = drifted = 0
+        last_id = 0
+        while True:
+            cart_ids = list(
+                ShoppingCart.objects.filter(pk__gt=last_id).order_by(
+                    'pk'
+                ).values_list('pk', flat=True)[:chunk_size]
+            )
+            if not cart_ids:
+                break
+            drifted += self.fix_chunk(cart_ids, options['dry_run'])
+            checked += len(cart_ids)
+            last_id = cart_ids[-1]
+        action = 'найдено' if options['dry_run'] else 'исправлено'
+        self.stdout.write(self.style.SUCCESS(
+            f'Проверено корзин: {checked}, {action} расхождений: {drifted}.'
+        ))
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.16 on 2026-10-18 17:48
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicate_cart_items(apps, schema_editor):
+    CartItem = apps.get_model('products', 'CartItem')
+    duplicates = CartItem.objects.values(
+        'shopping_cart', 'product'
+    ).annotate(
+        items=Count('id'),
+        first_id=Min('id'),
+        quantity=Sum('product_quantity'),
+        price=Sum('product_price'),
+    ).filter(items__gt=1)
+    for duplicate in duplicates:
+        CartItem.objects.filter(pk=duplicate['first_id']).update(
+            product_quantity=duplicate['quantity'],
+            product_price=duplicate['price'],
+        )
+        CartItem.objects.filter(
+            shopping_cart=duplicate['shopping_cart'],
+            product=duplicate['product'],
+        ).exclude(pk=duplicate['first_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_remove_shoppingcart_total_price_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_cart_items, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='cartitem',
+            constraint=models.UniqueConstraint(fields=('shopping_cart', 'product'), name='unique_cart_item'),
+        ),
+    ]
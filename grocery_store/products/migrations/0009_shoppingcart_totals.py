@@ -0,0 +1,48 @@
+# Generated by Django 4.2.16 on 2026-10-18 17:55
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_totals(apps, schema_editor):
+    CartItem = apps.get_model('products', 'CartItem')
+    ShoppingCart = apps.get_model('products', 'ShoppingCart')
+    cart_items = CartItem.objects.filter(
+        shopping_cart=OuterRef('pk')
+    ).order_by().values('shopping_cart')
+    ShoppingCart.objects.update(
+        total_quantity=Coalesce(
+            Subquery(cart_items.annotate(
+                total=Sum('product_quantity')
+            ).values('total')),
+            0
+        ),
+        total_price=Coalesce(
+            Subquery(cart_items.annotate(
+                total=Sum('product_price')
+            ).values('total')),
+            Value(0.0)
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0008_cartitem_unique_cart_item'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shoppingcart',
+            name='total_price',
+            field=models.FloatField(default=0, verbose_name='Суммарная цена продуктов'),
+        ),
+        migrations.AddField(
+            model_name='shoppingcart',
+            name='total_quantity',
+            field=models.PositiveIntegerField(default=0, verbose_name='Суммарное количество продуктов'),
+        ),
+        migrations.RunPython(fill_totals, migrations.RunPython.noop),
+    ]
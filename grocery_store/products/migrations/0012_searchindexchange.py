@@ -0,0 +1,25 @@
+# Generated by Django 4.2.16 on 2026-10-18 20:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0011_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchIndexChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=16, verbose_name='Тип объекта')),
+                ('object_id', models.PositiveBigIntegerField(verbose_name='id объекта')),
+            ],
+            options={
+                'verbose_name': 'изменение для поиска',
+                'verbose_name_plural': 'Изменения для поиска',
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.16 on 2026-10-18 20:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0012_searchindexchange'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GuestCartMerge',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nonce', models.CharField(max_length=32, unique=True, verbose_name='Nonce корзины')),
+                ('merged_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата переноса')),
+            ],
+            options={
+                'verbose_name': 'перенос корзины гостя',
+                'verbose_name_plural': 'Переносы корзин гостей',
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.16 on 2026-10-18 21:05
+
+from django.db import migrations
+
+INDEX_NAME = 'product_name_prefix_idx'
+
+# Индекс под name__istartswith. PostgreSQL сравнивает UPPER(name::text)
+# через LIKE, для него нужен класс операторов text_pattern_ops. SQLite
+# применяет к LIKE индекс только с сопоставлением NOCASE.
+CREATE_INDEX = {
+    'postgresql': (
+        f'CREATE INDEX {INDEX_NAME} ON products_product '
+        '(UPPER(name::text) text_pattern_ops)'
+    ),
+    'sqlite': (
+        f'CREATE INDEX {INDEX_NAME} ON products_product '
+        '(name COLLATE NOCASE)'
+    ),
+}
+
+
+def create_index(apps, schema_editor):
+    sql = CREATE_INDEX.get(schema_editor.connection.vendor)
+    if sql is not None:
+        schema_editor.execute(sql)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor in CREATE_INDEX:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {INDEX_NAME}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0013_guestcartmerge'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.16 on 2026-10-18 22:10
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0014_product_name_prefix_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='searchindexchange',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True, default=django.utils.timezone.now, verbose_name='Дата записи'),
+            preserve_default=False,
+        ),
+    ]
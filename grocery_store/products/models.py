@@ -1,8 +1,18 @@
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import (
+    ExpressionWrapper, F, OuterRef, Subquery, Sum, Value
+)
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 
 from users.models import User
 
+from .versions import CATALOG, bump_version
+
+# Сколько продуктов пересчитывается в корзинах одним набором UPDATE.
+REPRICE_BATCH_SIZE = 1000
+
 
 class Category(models.Model):
     """Категория продукта."""
@@ -13,6 +23,7 @@ class Category(models.Model):
         upload_to='categories/',
         blank=True
     )
+    updated_at = models.DateTimeField('Дата изменения', auto_now=True)
 
     class Meta:
         verbose_name = 'категория'
@@ -37,6 +48,7 @@ class Subcategory(models.Model):
         related_name='subcategories',
         verbose_name='Категория'
     )
+    updated_at = models.DateTimeField('Дата изменения', auto_now=True)
 
     class Meta:
         verbose_name = 'подкатегория'
@@ -46,6 +58,42 @@ class Subcategory(models.Model):
         return self.name
 
 
+class ProductQuerySet(models.QuerySet):
+
+    def with_related(self, category=True, subcategory=True, images=True):
+        """Категория и подкатегория через JOIN, изображения одним запросом.
+
+        Ненужные для ответа связи можно отключить.
+        """
+        related = [
+            name for name, needed in (
+                ('category', category), ('subcategory', subcategory)
+            )
+            if needed
+        ]
+        queryset = self.select_related(*related) if related else self
+        if images:
+            queryset = queryset.prefetch_related(models.Prefetch(
+                'product_images', queryset=ProductImage.objects.order_by('id')
+            ))
+        return queryset
+
+    def update(self, **kwargs):
+        """При изменении цены пересчитывает позиции корзин.
+
+        bulk_update() обновляет строки через update(), поэтому тоже
+        пересчитывает корзины.
+        """
+        if 'price' not in kwargs:
+            return super().update(**kwargs)
+        with transaction.atomic(using=self.db, savepoint=False):
+            # После UPDATE фильтр по цене может уже не совпасть.
+            product_ids = list(self.values_list('pk', flat=True))
+            rows = super().update(**kwargs)
+            CartItem.objects.reprice_products(product_ids)
+        return rows
+
+
 class Product(models.Model):
     """Продукт."""
     name = models.CharField('Наименование', max_length=128, blank=False)
@@ -57,14 +105,53 @@ class Product(models.Model):
     subcategory = models.ForeignKey(
         Subcategory, on_delete=models.CASCADE, verbose_name='Подкатегория'
     )
+    updated_at = models.DateTimeField('Дата изменения', auto_now=True)
+
+    objects = ProductQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'продукт'
         verbose_name_plural = 'Продукты'
+        # Фильтр по категории или подкатегории с сортировкой по цене
+        # читается из индекса без отдельной сортировки.
+        indexes = (
+            models.Index(
+                fields=('category', 'price'),
+                name='product_category_price_idx'
+            ),
+            models.Index(
+                fields=('subcategory', 'price'),
+                name='product_subcategory_price_idx'
+            ),
+            models.Index(fields=('price',), name='product_price_idx'),
+        )
 
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # По цене при загрузке post_save решает, пересчитывать ли
+        # позиции корзин.
+        instance._loaded_price = instance.__dict__.get('price')
+        return instance
+
+
+class ProductImageQuerySet(models.QuerySet):
+
+    def delete(self):
+        """Удаляет изображения одним DELETE и один раз сбрасывает версию.
+
+        На изображения ничего не ссылается, а из сигналов post_delete у
+        них только сброс версии каталога, поэтому сборщик с выборкой
+        строк и сигналом на каждую не нужен.
+        """
+        with transaction.atomic(using=self.db):
+            deleted = self._raw_delete(self.db)
+            bump_version(CATALOG)
+        return deleted, {self.model._meta.label: deleted}
+
 
 class ProductImage(models.Model):
     product = models.ForeignKey(
@@ -78,6 +165,8 @@ class ProductImage(models.Model):
         upload_to='products/'
     )
 
+    objects = ProductImageQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'изображение продукта'
         verbose_name_plural = 'Изображения продукта'
@@ -86,11 +175,38 @@ class ProductImage(models.Model):
         return f'Изображение продукта {self.product.name}'
 
 
+class SearchIndexChange(models.Model):
+    """Изменение продукта или группы для индексов поиска процессов.
+
+    Каждый процесс применяет к своему индексу записи после последней
+    применённой и записи с пропущенными id, см. products.search.
+    По времени записи удаляются устаревшие изменения.
+    """
+    kind = models.CharField('Тип объекта', max_length=16)
+    object_id = models.PositiveBigIntegerField('id объекта')
+    created_at = models.DateTimeField(
+        'Дата записи', auto_now_add=True, db_index=True
+    )
+
+    class Meta:
+        verbose_name = 'изменение для поиска'
+        verbose_name_plural = 'Изменения для поиска'
+
+
 class ShoppingCart(models.Model):
-    """Корзина."""
+    """Корзина.
+
+    Итоги хранятся в самой корзине и обновляются вместе с каждым
+    изменением её позиций, поэтому вывод корзины обходится без агрегации.
+    """
     user = models.OneToOneField(
         User, on_delete=models.CASCADE, verbose_name='Пользователь'
     )
+    total_quantity = models.PositiveIntegerField(
+        'Суммарное количество продуктов', default=0
+    )
+    total_price = models.FloatField('Суммарная цена продуктов', default=0)
+    updated_at = models.DateTimeField('Дата изменения', auto_now=True)
 
     class Meta:
         verbose_name = 'корзина'
@@ -100,6 +216,177 @@ class ShoppingCart(models.Model):
         return f'Корзина пользователя - {self.user.username}'
 
 
+class GuestCartMerge(models.Model):
+    """Перенесённая корзина гостя, см. api.guest_cart.
+
+    По уникальному nonce корзина из cookie переносится один раз, даже
+    если браузер прислал её ещё раз до удаления cookie.
+    """
+    nonce = models.CharField('Nonce корзины', max_length=32, unique=True)
+    merged_at = models.DateTimeField('Дата переноса', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'перенос корзины гостя'
+        verbose_name_plural = 'Переносы корзин гостей'
+
+
+class CartItemQuerySet(models.QuerySet):
+
+    def with_product(
+        self, product=True, category=True, subcategory=True, images=True
+    ):
+        """Продукт со связанными объектами для вложенного сериализатора.
+
+        Ненужные для ответа связи можно отключить.
+        """
+        if not product:
+            return self
+        related = ['product'] + [
+            f'product__{name}' for name, needed in (
+                ('category', category), ('subcategory', subcategory)
+            )
+            if needed
+        ]
+        queryset = self.select_related(*related)
+        if images:
+            queryset = queryset.prefetch_related(models.Prefetch(
+                'product__product_images',
+                queryset=ProductImage.objects.order_by('id')
+            ))
+        return queryset
+
+    def change_totals(self, sign):
+        """Прибавляет к итогам корзин позиции из выборки или вычитает их.
+
+        Итоги всех затронутых корзин меняются одним UPDATE
+        с коррелированными подзапросами.
+        """
+        cart_items = self.filter(
+            shopping_cart=OuterRef('pk')
+        ).order_by().values('shopping_cart')
+        quantity = Coalesce(
+            Subquery(cart_items.annotate(
+                total=Sum('product_quantity')
+            ).values('total')),
+            0
+        )
+        price = Coalesce(
+            Subquery(cart_items.annotate(
+                total=Sum('product_price')
+            ).values('total')),
+            Value(0.0)
+        )
+        if sign < 0:
+            quantity, price = -quantity, -price
+        return ShoppingCart.objects.filter(
+            pk__in=self.values('shopping_cart')
+        ).update(
+            total_quantity=F('total_quantity') + quantity,
+            total_price=F('total_price') + price,
+            updated_at=timezone.now()
+        )
+
+    def reprice(self):
+        """Пересчитывает стоимость позиций по текущим ценам продуктов.
+
+        Затрагиваются только позиции, стоимость которых разошлась
+        с ценой. Итоги корзин сдвигаются на разницу одним UPDATE,
+        затем позиции обновляются вторым; корзины блокируются раньше
+        позиций, как и в add_product. Возвращает число позиций.
+        """
+        stale = self.alias(
+            new_price=F('product_quantity') * F('product__price')
+        ).exclude(product_price=F('new_price'))
+        price_delta = stale.filter(
+            shopping_cart=OuterRef('pk')
+        ).order_by().values('shopping_cart').annotate(
+            delta=Sum(F('new_price') - F('product_price'))
+        ).values('delta')
+        product_price = Subquery(
+            Product.objects.filter(pk=OuterRef('product_id')).values('price')
+        )
+        with transaction.atomic(using=self.db, savepoint=False):
+            ShoppingCart.objects.using(self.db).filter(
+                pk__in=stale.values('shopping_cart')
+            ).update(
+                total_price=F('total_price') + Subquery(price_delta),
+                updated_at=timezone.now()
+            )
+            return stale.update(
+                product_price=F('product_quantity') * product_price
+            )
+
+    def reprice_products(self, product_ids, batch_size=REPRICE_BATCH_SIZE):
+        """Пересчитывает позиции продуктов порциями по batch_size."""
+        product_ids = list(product_ids)
+        return sum(
+            self.filter(
+                product_id__in=product_ids[start:start + batch_size]
+            ).reprice()
+            for start in range(0, len(product_ids), batch_size)
+        )
+
+    def add_to_totals(self):
+        return self.change_totals(1)
+
+    def subtract_from_totals(self):
+        return self.change_totals(-1)
+
+    def delete(self):
+        with transaction.atomic():
+            self.subtract_from_totals()
+            return super().delete()
+
+    def add_product(self, user, product, quantity=1):
+        """Атомарно увеличивает количество продукта в корзине.
+
+        Существующая позиция обновляется одним UPDATE с F-выражениями,
+        стоимость пересчитывается в том же запросе. Перед этим итоги
+        корзины сдвигаются на разницу между новой и старой позицией.
+        Если позиции нет, она создаётся; гонку двух вставок разрешает
+        уникальное ограничение. Всё выполняется в одной транзакции,
+        поэтому в ответе возвращается позиция ровно после этого увеличения.
+        """
+        cart_items = self.filter(
+            shopping_cart__user_id=user.pk, product=product
+        )
+        new_quantity = F('product_quantity') + quantity
+        new_price = ExpressionWrapper(
+            new_quantity * product.price, output_field=models.FloatField()
+        )
+        price_delta = cart_items.annotate(
+            delta=new_price - F('product_price')
+        ).values('delta')
+        shopping_carts = ShoppingCart.objects.filter(
+            pk__in=cart_items.values('shopping_cart')
+        )
+        increment_totals = {
+            'total_quantity': F('total_quantity') + quantity,
+            'total_price': F('total_price') + Subquery(price_delta),
+            'updated_at': timezone.now(),
+        }
+        with transaction.atomic():
+            if not shopping_carts.update(**increment_totals):
+                shopping_cart, _ = ShoppingCart.objects.get_or_create(
+                    user_id=user.pk
+                )
+                try:
+                    with transaction.atomic():
+                        return self.create(
+                            shopping_cart=shopping_cart,
+                            product=product,
+                            product_quantity=quantity
+                        )
+                except IntegrityError:
+                    shopping_carts.update(**increment_totals)
+            cart_items.update(
+                product_quantity=new_quantity, product_price=new_price
+            )
+            cart_item = cart_items.get()
+        cart_item.product = product
+        return cart_item
+
+
 class CartItem(models.Model):
     """Продукт в корзине."""
     shopping_cart = models.ForeignKey(
@@ -121,13 +408,30 @@ class CartItem(models.Model):
     )
     product_price = models.FloatField('Цена продуктов', default=0)
 
+    objects = CartItemQuerySet.as_manager()
+
     def save(self, *args, **kwargs):
         self.product_price = self.product_quantity * self.product.price
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            if self.pk is not None:
+                CartItem.objects.filter(pk=self.pk).subtract_from_totals()
+            super().save(*args, **kwargs)
+            CartItem.objects.filter(pk=self.pk).add_to_totals()
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            CartItem.objects.filter(pk=self.pk).subtract_from_totals()
+            return super().delete(*args, **kwargs)
 
     class Meta:
         verbose_name = 'продукт в корзине'
         verbose_name_plural = 'Продукты в корзинах'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('shopping_cart', 'product'),
+                name='unique_cart_item'
+            ),
+        )
 
     def __str__(self):
         return f'Продукт в корзине {self.shopping_cart.user.username}'
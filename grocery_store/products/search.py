@@ -0,0 +1,445 @@
+"""Поиск продуктов по инвертированному индексу в памяти процесса.
+
+Индексируются названия продуктов, их категорий и подкатегорий. Слова
+приводятся к упрощённой основе, чтобы «молоко» и «молочный» совпадали,
+а опечатки и непредусмотренные формы находятся по триграммам.
+
+Индекс строится при первом поиске. Изменения продуктов и групп
+записываются в журнал SearchIndexChange, и каждый процесс перед
+поиском применяет к своему индексу записи после последней
+применённой. Версия индекса в кэше 'versions' означает «перестроить
+целиком»: её меняют rebuild_search_index и массовые загрузки каталога,
+которые обходят сигналы моделей.
+
+id журнала в PostgreSQL выдаются последовательностью и фиксируются
+не по порядку: запись долгой транзакции импорта может появиться после
+записи с большим id. Поэтому пропущенные id запоминаются и читаются
+повторно CHANGES_GAP_TIMEOUT секунд. Записи старше CHANGES_RETENTION
+удаляются при записи новых, а процесс, не читавший журнал дольше,
+перестраивает индекс целиком.
+"""
+import heapq
+import re
+import time
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+from datetime import timedelta
+from functools import lru_cache
+from threading import RLock
+
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import Category, Product, SearchIndexChange, Subcategory
+from .versions import SEARCH_INDEX, get_version, set_version
+
+MAX_RESULTS = 1000
+# Сколько изменённых продуктов читается из БД одним запросом.
+CHANGES_CHUNK_SIZE = 10000
+# Сколько секунд ждать фиксации записи журнала с пропущенным id
+# и сколько пропусков помнить.
+CHANGES_GAP_TIMEOUT = 10 * 60
+MAX_CHANGE_GAPS = 10000
+# Сколько секунд хранятся записи журнала и как часто процесс удаляет
+# устаревшие.
+CHANGES_RETENTION = 24 * 60 * 60
+CHANGES_PRUNE_INTERVAL = 60
+MIN_SIMILARITY = 0.3
+EXACT_SCORE = 1.0
+PREFIX_SCORE = 0.8
+TRIGRAM_SCORE = 0.6
+NAME_WEIGHT = 1.0
+GROUP_WEIGHT = 0.5
+
+WORD_RE = re.compile(r'\w+')
+ADJECTIVE_ENDINGS = (
+    'ого', 'его', 'ому', 'ему', 'ыми', 'ими', 'ая', 'яя', 'ое', 'ее',
+    'ые', 'ие', 'ый', 'ий', 'ой', 'ую', 'юю', 'ых', 'их', 'ым', 'им',
+)
+NOUN_ENDINGS = (
+    'ами', 'ями', 'ах', 'ях', 'ам', 'ям', 'ов', 'ев', 'ей', 'ом', 'ем',
+    'ия', 'ие', 'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'ь', 'й',
+)
+ADJECTIVE_SUFFIXES = ('ск', 'нн', 'н')
+ALTERNATIONS = {'ч': 'к', 'ж': 'г', 'ш': 'х'}
+MIN_STEM = 3
+PRODUCT = 'product'
+GROUP_MODELS = {'category': Category, 'subcategory': Subcategory}
+
+
+@lru_cache(maxsize=100000)
+def stem(word):
+    """Упрощённая основа русского слова.
+
+    Отрезаются окончания, у прилагательных ещё и суффиксы -н-, -ск-,
+    а чередование в конце основы сводится к исходной согласной:
+    «молочный» → «молоч» → «молок».
+    """
+    for ending in ADJECTIVE_ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= MIN_STEM:
+            word = word[:-len(ending)]
+            for suffix in ADJECTIVE_SUFFIXES:
+                if (
+                    word.endswith(suffix)
+                    and len(word) - len(suffix) >= MIN_STEM
+                ):
+                    word = word[:-len(suffix)]
+                    break
+            break
+    else:
+        for ending in NOUN_ENDINGS:
+            if word.endswith(ending) and len(word) - len(ending) >= MIN_STEM:
+                word = word[:-len(ending)]
+                break
+    if word[-1] in ALTERNATIONS and len(word) > MIN_STEM:
+        word = word[:-1] + ALTERNATIONS[word[-1]]
+    return word
+
+
+def tokenize(text):
+    """Основы слов текста без повторов, в порядке появления."""
+    words = WORD_RE.findall(text.lower().replace('ё', 'е'))
+    return tuple(dict.fromkeys(stem(word) for word in words))
+
+
+@lru_cache(maxsize=100000)
+def trigrams(term):
+    return frozenset(term[i:i + 3] for i in range(len(term) - 2))
+
+
+class SearchIndex:
+    """Инвертированный индекс: основа слова → продукты.
+
+    Слова названий категорий и подкатегорий указывают на группу,
+    а группа — на свои продукты, поэтому переименование категории
+    не требует переиндексации её продуктов.
+    """
+
+    def __init__(self):
+        self._lock = RLock()
+        self._version = None
+        self._last_change = 0
+        # Пропущенные id журнала → время обнаружения пропуска.
+        self._gaps = {}
+        self._synced_at = 0
+        self._pruned_at = 0
+        self._building = False
+        self.clear()
+
+    def clear(self):
+        self.products = {}
+        self.name_postings = defaultdict(set)
+        self.groups = {}
+        self.group_postings = defaultdict(set)
+        self.group_products = defaultdict(set)
+        self.term_counts = Counter()
+        self.terms = []
+        self.trigram_postings = defaultdict(set)
+
+    def _add_terms(self, terms):
+        for term in terms:
+            self.term_counts[term] += 1
+            if self.term_counts[term] == 1:
+                if not self._building:
+                    insort(self.terms, term)
+                for trigram in trigrams(term):
+                    self.trigram_postings[trigram].add(term)
+
+    def _remove_terms(self, terms):
+        for term in terms:
+            self.term_counts[term] -= 1
+            if self.term_counts[term]:
+                continue
+            del self.term_counts[term]
+            del self.terms[bisect_left(self.terms, term)]
+            for trigram in trigrams(term):
+                self.trigram_postings[trigram].discard(term)
+
+    def _add_product(self, product_id, name, category_id, subcategory_id):
+        terms = tokenize(name)
+        self.products[product_id] = (terms, category_id, subcategory_id)
+        for term in terms:
+            self.name_postings[term].add(product_id)
+        self._add_terms(terms)
+        self.group_products[('category', category_id)].add(product_id)
+        self.group_products[('subcategory', subcategory_id)].add(product_id)
+
+    def _remove_product(self, product_id):
+        if product_id not in self.products:
+            return
+        terms, category_id, subcategory_id = self.products.pop(product_id)
+        for term in terms:
+            self.name_postings[term].discard(product_id)
+            if not self.name_postings[term]:
+                del self.name_postings[term]
+        self._remove_terms(terms)
+        self.group_products[('category', category_id)].discard(product_id)
+        self.group_products[('subcategory', subcategory_id)].discard(
+            product_id
+        )
+
+    def _set_group(self, key, name):
+        self._remove_group(key)
+        terms = tokenize(name)
+        self.groups[key] = terms
+        for term in terms:
+            self.group_postings[term].add(key)
+        self._add_terms(terms)
+
+    def _remove_group(self, key):
+        terms = self.groups.pop(key, ())
+        for term in terms:
+            self.group_postings[term].discard(key)
+            if not self.group_postings[term]:
+                del self.group_postings[term]
+        self._remove_terms(terms)
+
+    def build(self):
+        """Полностью перестраивает индекс по БД."""
+        with self._lock:
+            version = get_version(SEARCH_INDEX)
+            synced_at = time.time()
+            # Изменения, записанные во время построения, применятся
+            # ещё раз: повторное применение ничего не меняет.
+            last_change, gaps = self.log_position()
+            self.clear()
+            # Список слов сортируется один раз в конце, а не при каждой
+            # вставке.
+            self._building = True
+            try:
+                for kind, model in GROUP_MODELS.items():
+                    for group_id, name in model.objects.values_list(
+                        'id', 'name'
+                    ).iterator():
+                        self._set_group((kind, group_id), name)
+                for row in Product.objects.values_list(
+                    'id', 'name', 'category_id', 'subcategory_id'
+                ).iterator(chunk_size=10000):
+                    self._add_product(*row)
+            finally:
+                self._building = False
+            self.terms = sorted(self.term_counts)
+            self._version = version
+            self._last_change = last_change
+            self._gaps = {}
+            self._track_gaps(gaps, time.monotonic())
+            self._synced_at = synced_at
+
+    @staticmethod
+    def log_position():
+        """Последний id журнала и ещё не зафиксированные id перед ним.
+
+        Пропуски ищутся после последней записи старше
+        CHANGES_GAP_TIMEOUT: более ранние транзакции уже не ждут.
+        """
+        changes = SearchIndexChange.objects.all()
+        floor = changes.filter(created_at__lt=timezone.now() - timedelta(
+            seconds=CHANGES_GAP_TIMEOUT
+        )).aggregate(last=Max('id'))['last']
+        recent = changes.order_by('id').values_list('id', flat=True)
+        if floor is not None:
+            recent = recent.filter(id__gt=floor)
+        recent = list(recent)
+        if not recent:
+            return floor or 0, []
+        if floor is None:
+            floor = recent[0] - 1
+        present = set(recent)
+        return recent[-1], [
+            change_id for change_id in range(floor + 1, recent[-1])
+            if change_id not in present
+        ]
+
+    def _track_gaps(self, change_ids, now):
+        self._gaps.update(dict.fromkeys(change_ids, now))
+        if len(self._gaps) > MAX_CHANGE_GAPS:
+            self._gaps = dict(heapq.nlargest(
+                MAX_CHANGE_GAPS, self._gaps.items()
+            ))
+
+    def rebuild(self):
+        """Перестраивает индекс здесь и во всех процессах.
+
+        Журнал до построения больше не нужен: процессы со старой
+        версией перестроят индекс целиком.
+        """
+        with self._lock:
+            self.build()
+            self._version = set_version(SEARCH_INDEX)
+            SearchIndexChange.objects.filter(
+                id__lte=self._last_change
+            ).delete()
+
+    def ensure_built(self):
+        """Перестраивает индекс по новой версии или применяет журнал."""
+        with self._lock:
+            # Журнал старше CHANGES_RETENTION мог быть удалён.
+            if (
+                self._version != get_version(SEARCH_INDEX)
+                or time.time() - self._synced_at
+                > CHANGES_RETENTION - CHANGES_GAP_TIMEOUT
+            ):
+                self.build()
+            else:
+                self.apply_changes()
+
+    def apply_changes(self):
+        """Применяет новые записи журнала и записи пропущенных id."""
+        synced_at, now = time.time(), time.monotonic()
+        self._gaps = {
+            change_id: seen for change_id, seen in self._gaps.items()
+            if now - seen < CHANGES_GAP_TIMEOUT
+        }
+        changes = SearchIndexChange.objects.filter(id__gt=self._last_change)
+        if self._gaps:
+            changes |= SearchIndexChange.objects.filter(
+                id__in=list(self._gaps)
+            )
+        changes = list(
+            changes.order_by('id').values_list('id', 'kind', 'object_id')
+        )
+        self._synced_at = synced_at
+        if not changes:
+            return
+        product_ids, groups = set(), set()
+        for change_id, kind, object_id in changes:
+            if kind == PRODUCT:
+                product_ids.add(object_id)
+            else:
+                groups.add((kind, object_id))
+            if change_id > self._last_change:
+                self._track_gaps(range(
+                    max(self._last_change + 1, change_id - MAX_CHANGE_GAPS),
+                    change_id
+                ), now)
+                self._last_change = change_id
+            else:
+                self._gaps.pop(change_id, None)
+        for kind, group_id in groups:
+            self._update_group(kind, group_id)
+        self._update_products(list(product_ids))
+
+    def _update_products(self, product_ids):
+        for start in range(0, len(product_ids), CHANGES_CHUNK_SIZE):
+            chunk = product_ids[start:start + CHANGES_CHUNK_SIZE]
+            for product_id in chunk:
+                self._remove_product(product_id)
+            for row in Product.objects.filter(pk__in=chunk).values_list(
+                'id', 'name', 'category_id', 'subcategory_id'
+            ):
+                self._add_product(*row)
+
+    def _update_group(self, kind, group_id):
+        name = GROUP_MODELS[kind].objects.filter(pk=group_id).values_list(
+            'name', flat=True
+        ).first()
+        if name is None:
+            self._remove_group((kind, group_id))
+        else:
+            self._set_group((kind, group_id), name)
+
+    def record(self, kind, object_ids):
+        """Записывает изменения в журнал для индексов всех процессов.
+
+        kind — PRODUCT или вид группы из GROUP_MODELS; удалённый объект
+        записывается так же, как изменённый. Не чаще раза
+        в CHANGES_PRUNE_INTERVAL секунд заодно удаляются устаревшие
+        записи.
+        """
+        SearchIndexChange.objects.bulk_create(
+            SearchIndexChange(kind=kind, object_id=object_id)
+            for object_id in object_ids
+        )
+        if time.monotonic() - self._pruned_at >= CHANGES_PRUNE_INTERVAL:
+            self._pruned_at = time.monotonic()
+            self.prune_changes()
+
+    @staticmethod
+    def prune_changes():
+        """Удаляет записи журнала старше CHANGES_RETENTION."""
+        return SearchIndexChange.objects.filter(
+            created_at__lt=timezone.now() - timedelta(
+                seconds=CHANGES_RETENTION
+            )
+        ).delete()[0]
+
+    def update_product(self, product_id):
+        self.record(PRODUCT, [product_id])
+
+    def remove_product(self, product_id):
+        self.record(PRODUCT, [product_id])
+
+    def update_group(self, kind, group_id):
+        self.record(kind, [group_id])
+
+    def match_terms(self, token):
+        """Слова индекса, подходящие под слово запроса, с оценками.
+
+        Похожие по триграммам слова ищутся, только если нет слов
+        с таким началом: иначе запрос тонет в случайных совпадениях.
+        """
+        matches = {}
+        start = bisect_left(self.terms, token)
+        for term in self.terms[start:]:
+            if not term.startswith(token):
+                break
+            matches[term] = (
+                EXACT_SCORE if term == token
+                else PREFIX_SCORE * len(token) / len(term)
+            )
+        if matches:
+            return matches
+        token_trigrams = trigrams(token)
+        shared = Counter()
+        for trigram in token_trigrams:
+            shared.update(self.trigram_postings.get(trigram, ()))
+        for term, common in shared.items():
+            similarity = common / len(token_trigrams | trigrams(term))
+            if similarity >= MIN_SIMILARITY:
+                matches[term] = TRIGRAM_SCORE * similarity
+        return matches
+
+    def score_token(self, token):
+        """Лучшая оценка каждого продукта по одному слову запроса."""
+        postings = []
+        for term, score in self.match_terms(token).items():
+            if term in self.name_postings:
+                postings.append(
+                    (score * NAME_WEIGHT, self.name_postings[term])
+                )
+            for key in self.group_postings.get(term, ()):
+                postings.append(
+                    (score * GROUP_WEIGHT, self.group_products[key])
+                )
+        # Большие оценки записываются последними и перекрывают меньшие.
+        postings.sort(key=lambda posting: posting[0])
+        scores = {}
+        for score, product_ids in postings:
+            scores.update(dict.fromkeys(product_ids, score))
+        return scores
+
+    def search(self, query, limit=MAX_RESULTS):
+        """id продуктов со всеми словами запроса по убыванию оценки."""
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        self.ensure_built()
+        with self._lock:
+            token_scores = sorted(
+                (self.score_token(token) for token in tokens), key=len
+            )
+        totals = dict(token_scores[0])
+        for scores in token_scores[1:]:
+            totals = {
+                product_id: total + scores[product_id]
+                for product_id, total in totals.items()
+                if product_id in scores
+            }
+        best = heapq.nsmallest(
+            limit, ((-score, product_id)
+                    for product_id, score in totals.items())
+        )
+        return [product_id for _, product_id in best]
+
+
+search_index = SearchIndex()
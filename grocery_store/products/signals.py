@@ -0,0 +1,72 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .images import schedule_derivatives
+from .models import CartItem, Category, Product, ProductImage, Subcategory
+from .search import search_index
+from .versions import CATALOG, CATEGORY_TREE, bump_version
+
+
+@receiver((post_save, post_delete), sender=Category)
+@receiver((post_save, post_delete), sender=Subcategory)
+def category_tree_changed(**kwargs):
+    bump_version(CATEGORY_TREE)
+
+
+@receiver((post_save, post_delete), sender=Category)
+@receiver((post_save, post_delete), sender=Subcategory)
+@receiver((post_save, post_delete), sender=Product)
+@receiver((post_save, post_delete), sender=ProductImage)
+def catalog_changed(**kwargs):
+    bump_version(CATALOG)
+
+
+@receiver(pre_delete, sender=Product)
+def delete_product_cart_items(instance, **kwargs):
+    # Каскадное удаление обходит CartItemQuerySet.delete(), поэтому
+    # позиции удаляются заранее вместе с вычитанием из итогов корзин.
+    CartItem.objects.filter(product=instance).delete()
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Subcategory)
+@receiver(post_save, sender=ProductImage)
+def image_saved(instance, **kwargs):
+    if instance.image:
+        name = instance.image.name
+        transaction.on_commit(lambda: schedule_derivatives(name))
+
+
+@receiver(post_save, sender=Product)
+def product_saved(instance, **kwargs):
+    product_id = instance.pk
+    transaction.on_commit(lambda: search_index.update_product(product_id))
+
+
+@receiver(post_save, sender=Product)
+def product_price_changed(instance, created, raw, update_fields, **kwargs):
+    if created or raw:
+        return
+    if update_fields is not None and 'price' not in update_fields:
+        return
+    if instance.price == getattr(instance, '_loaded_price', None):
+        return
+    CartItem.objects.filter(product_id=instance.pk).reprice()
+    instance._loaded_price = instance.price
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(instance, **kwargs):
+    product_id = instance.pk
+    transaction.on_commit(lambda: search_index.remove_product(product_id))
+
+
+@receiver((post_save, post_delete), sender=Category)
+@receiver((post_save, post_delete), sender=Subcategory)
+def group_changed(sender, instance, **kwargs):
+    kind = sender._meta.model_name
+    group_id = instance.pk
+    transaction.on_commit(
+        lambda: search_index.update_group(kind, group_id)
+    )
@@ -0,0 +1,71 @@
+import time
+from uuid import uuid4
+
+from django.core.cache import caches
+from django.db import transaction
+
+CACHE_ALIAS = 'versions'
+CATALOG = 'catalog'
+CATEGORY_TREE = 'category_tree'
+SEARCH_INDEX = 'search_index'
+
+
+def version_key(name):
+    return f'products:version:{name}'
+
+
+def new_version():
+    # Время выдачи в начале версии служит датой Last-Modified.
+    return f'{time.time_ns()}-{uuid4().hex}'
+
+
+def version_timestamp(version):
+    """Время выдачи версии в секундах или None для старых версий."""
+    issued, _, _ = version.partition('-')
+    if not issued.isdigit():
+        return None
+    return int(issued) // 10 ** 9
+
+
+def get_version(name):
+    """Текущая версия набора данных.
+
+    Версия хранится в кэше 'versions', по умолчанию общем для
+    процессов, поэтому изменения из команд и других процессов видны
+    всем. Если ключа нет (кэш очищен или вытеснен), выдаётся новая
+    версия, чтобы старые снимки не ожили.
+    """
+    cache = caches[CACHE_ALIAS]
+    key = version_key(name)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, new_version(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+async def aget_version(name):
+    cache = caches[CACHE_ALIAS]
+    key = version_key(name)
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, new_version(), timeout=None)
+        version = await cache.aget(key)
+    return version
+
+
+def set_version(name):
+    """Сразу выдаёт новую версию и возвращает её."""
+    version = new_version()
+    caches[CACHE_ALIAS].set(version_key(name), version, timeout=None)
+    return version
+
+
+def bump_version(name):
+    """Сбрасывает версию сейчас и ещё раз после фиксации транзакции.
+
+    Повторный сброс нужен, чтобы снимок, собранный конкурентным
+    запросом до коммита, не считался актуальным.
+    """
+    set_version(name)
+    transaction.on_commit(lambda: set_version(name))
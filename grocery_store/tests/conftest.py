@@ -1,8 +1,34 @@
 import pytest
+from django.conf import settings
+from django.core.cache import caches
 from rest_framework.test import APIClient
 from rest_framework.authtoken.models import Token
 
-from products.models import Category, Product, Subcategory
+from products.models import (
+    CartItem, Category, Product, ProductImage, ShoppingCart, Subcategory
+)
+
+
+@pytest.fixture(scope='session')
+def django_db_modify_db_settings(
+    django_db_modify_db_settings_parallel_suffix, tmp_path_factory
+):
+    # SQLite в памяти с общим кэшем не ждёт блокировок, поэтому
+    # многопоточные тесты работают с файловой тестовой БД.
+    db_settings = settings.DATABASES['default']
+    if db_settings['ENGINE'].endswith('sqlite3'):
+        db_settings.setdefault('TEST', {})['NAME'] = str(
+            tmp_path_factory.mktemp('db') / 'test.sqlite3'
+        )
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    for alias in settings.CACHES:
+        caches[alias].clear()
+    yield
+    for alias in settings.CACHES:
+        caches[alias].clear()
 
 
 @pytest.fixture
@@ -49,3 +75,46 @@ def user_client(token_user):
     client = APIClient()
     client.credentials(HTTP_AUTHORIZATION=f'Token {token_user["auth_token"]}')
     return client
+
+
+@pytest.fixture
+def catalog(category_1, subcategory_1):
+    """Каталог из сотен продуктов с несколькими изображениями у каждого."""
+    products = Product.objects.bulk_create(
+        Product(
+            name=f'Продукт {number}',
+            slug=f'catalog_product_{number}',
+            price=number + 1,
+            category=category_1,
+            subcategory=subcategory_1
+        )
+        for number in range(300)
+    )
+    ProductImage.objects.bulk_create(
+        ProductImage(product=product, image=f'products/image_{number}.jpg')
+        for product in products
+        for number in range(3)
+    )
+    return products
+
+
+@pytest.fixture
+def store(user, catalog, category_1, subcategory_1):
+    """Каталог, продукт без изображений и корзина пользователя."""
+    category_1.image = 'categories/dairy.png'
+    category_1.save()
+    Product.objects.create(
+        name='Продукт без изображений',
+        slug='no_images',
+        price=12.5,
+        category=category_1,
+        subcategory=subcategory_1
+    )
+    shopping_cart = ShoppingCart.objects.create(user=user)
+    for number, product in enumerate(catalog[:10], start=1):
+        CartItem.objects.create(
+            shopping_cart=shopping_cart,
+            product=product,
+            product_quantity=number
+        )
+    return shopping_cart
@@ -0,0 +1,112 @@
+from http import HTTPStatus
+
+import pytest
+from django.contrib import admin
+
+from products import admin as products_admin
+from products.models import CartItem, Product, ProductImage
+
+CHANGELIST_URL = '/admin/products/{model}/'
+CHANGE_URL = '/admin/products/{model}/{id}/change/'
+AUTOCOMPLETE_URL = '/admin/autocomplete/'
+
+
+@pytest.mark.django_db
+class TestAdminQueries:
+    """Число запросов админки не зависит от количества строк."""
+
+    @pytest.mark.parametrize('model', [
+        'product', 'productimage', 'cartitem', 'shoppingcart',
+        'subcategory',
+    ])
+    def test_changelist_queries(
+        self, admin_client, store, model, django_assert_max_num_queries
+    ):
+        # Сессия, пользователь, оценка и подсчёт строк, строки с JOIN,
+        # варианты фильтров и SAVEPOINT/RELEASE.
+        with django_assert_max_num_queries(10):
+            response = admin_client.get(CHANGELIST_URL.format(model=model))
+        assert response.status_code == HTTPStatus.OK
+
+    def test_changelist_rows_are_joined(
+        self, admin_client, store, django_assert_num_queries
+    ):
+        url = CHANGELIST_URL.format(model='cartitem')
+        admin_client.get(url)
+        CartItem.objects.bulk_create(
+            CartItem(shopping_cart=store, product=product)
+            for product in Product.objects.all()[10:100]
+        )
+        # Сессия, пользователь, MAX(id), COUNT, строки.
+        with django_assert_num_queries(5):
+            response = admin_client.get(url)
+        assert response.status_code == HTTPStatus.OK
+
+    def test_estimated_count(
+        self, admin_client, catalog, monkeypatch, django_assert_num_queries
+    ):
+        monkeypatch.setattr(products_admin, 'EXACT_COUNT_LIMIT', 100)
+        # Сессия, пользователь, MAX(id) вместо COUNT(*), строки.
+        with django_assert_num_queries(4):
+            response = admin_client.get(
+                CHANGELIST_URL.format(model='productimage')
+            )
+        assert response.status_code == HTTPStatus.OK
+        assert response.context['cl'].result_count == (
+            ProductImage.objects.order_by('-id').first().id
+        )
+
+    def test_search(self, admin_client, catalog):
+        url = CHANGELIST_URL.format(model='product')
+        response = admin_client.get(url, {'q': 'catalog_product_29'})
+        assert {
+            product.slug for product in response.context['cl'].result_list
+        } == {'catalog_product_29'} | {
+            f'catalog_product_{number}' for number in range(290, 300)
+        }
+        response = admin_client.get(url, {'q': 'Продукт 7'})
+        assert {
+            product.pk for product in response.context['cl'].result_list
+        } == {
+            product.pk for product in catalog
+            if product.name.startswith('Продукт 7')
+        }, 'Продукт ищется по началу названия.'
+
+    def test_search_uses_indexes(self, catalog):
+        model_admin = products_admin.ProductAdmin(Product, admin.site)
+        queryset, _ = model_admin.get_search_results(
+            None, Product.objects.all(), 'Продукт 7'
+        )
+        plan = queryset.explain()
+        assert 'SCAN products_product' not in plan, (
+            'Поиск по slug и названию не должен читать всю таблицу.'
+        )
+        assert 'product_name_prefix_idx' in plan
+
+    def test_change_form_has_no_dropdowns(
+        self, admin_client, store, django_assert_max_num_queries
+    ):
+        cart_item = store.cart_items.first()
+        # Сессия, пользователь, позиция с JOIN, тип содержимого,
+        # выбранные корзина и продукт и SAVEPOINT/RELEASE.
+        with django_assert_max_num_queries(8):
+            response = admin_client.get(
+                CHANGE_URL.format(model='cartitem', id=cart_item.id)
+            )
+        assert response.status_code == HTTPStatus.OK
+        assert response.content.decode().count('<option') <= 2, (
+            'Внешние ключи выбираются автодополнением.'
+        )
+
+    def test_autocomplete_queries(
+        self, admin_client, store, django_assert_max_num_queries
+    ):
+        with django_assert_max_num_queries(5):
+            response = admin_client.get(AUTOCOMPLETE_URL, {
+                'app_label': 'products', 'model_name': 'cartitem',
+                'field_name': 'shopping_cart', 'term': 'Test',
+            })
+        assert response.status_code == HTTPStatus.OK
+        assert [
+            result['text'] for result in response.json()['results']
+        ] == [str(store)]
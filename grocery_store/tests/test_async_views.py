@@ -0,0 +1,146 @@
+from http import HTTPStatus
+from urllib.parse import quote
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.core.cache import caches
+from django.test import AsyncClient
+from django.test.client import AsyncClientHandler
+
+from grocery_store.asgi import AsyncViewsHandlerMixin
+from products.models import CartItem, ShoppingCart
+
+
+class AsyncViewsClientHandler(AsyncViewsHandlerMixin, AsyncClientHandler):
+    pass
+
+
+def async_request(method, url, token=None, headers=None):
+    client = AsyncClient()
+    client.handler = AsyncViewsClientHandler()
+    headers = dict(headers or {})
+    if token:
+        headers['Authorization'] = f'Token {token}'
+
+    async def send():
+        return await getattr(client, method)(url, headers=headers)
+
+    return async_to_sync(send)()
+
+
+def is_native(response):
+    # Вьюхи DRF добавляют заголовок Allow, асинхронные — нет.
+    return 'Allow' not in response
+
+
+@pytest.fixture
+def clear_catalog_cache():
+    def clear():
+        caches['catalog'].clear()
+    return clear
+
+
+@pytest.mark.django_db
+class TestAsyncViews:
+
+    @pytest.mark.parametrize('url, native', (
+        ('/api/products/', True),
+        ('/api/products/?page=3', True),
+        ('/api/products/?page=61', True),
+        ('/api/products/?subcategory=subcategory_1&ordering=-price'
+         '&min_price=10&page=2', True),
+        ('/api/products/?min_price=abc', True),
+        ('/api/products/{product}/', True),
+        ('/api/products/999999/', True),
+        ('/api/categories/', True),
+        ('/api/categories/{category}/', True),
+        ('/api/categories/999/', True),
+        ('/api/shopping_cart/', True),
+        ('/api/products/?page=100', False),
+        ('/api/products/?fields=name', False),
+        ('/api/products/?pagination=keyset', False),
+        (f'/api/products/search/?q={quote("продукт")}', False),
+        ('/api/shopping_cart/?fields=total_price', False),
+    ))
+    def test_same_responses(self, user_client, token_user, store, catalog,
+                            category_1, clear_catalog_cache, url, native):
+        url = url.format(product=catalog[5].pk, category=category_1.pk)
+        clear_catalog_cache()
+        expected = user_client.get(url)
+        clear_catalog_cache()
+        response = async_request('get', url, token_user['auth_token'])
+        assert response.status_code == expected.status_code
+        assert response.content == expected.content, (
+            f'Ответы `{url}` асинхронной вьюхи и вьюхи DRF '
+            'должны совпадать байт в байт.'
+        )
+        assert is_native(response) == native
+
+    def test_shared_response_cache(self, user_client, store):
+        expected = user_client.get('/api/products/')
+        response = async_request('get', '/api/products/')
+        assert response['X-Cache'] == 'HIT', (
+            'Асинхронная вьюха должна использовать кэш ответов DRF.'
+        )
+        for header in ('Vary', 'Allow'):
+            assert response[header] == expected[header], (
+                f'Заголовок {header} хранится в кэше вместе с ответом.'
+            )
+
+    def test_shopping_cart_wrong_token(self, store):
+        response = async_request('get', '/api/shopping_cart/', 'wrong')
+        assert response.status_code == HTTPStatus.UNAUTHORIZED
+        assert response['WWW-Authenticate'] == 'Token'
+
+    def test_guest_shopping_cart(self, store):
+        response = async_request('get', '/api/shopping_cart/')
+        assert response.status_code == HTTPStatus.OK, (
+            'Корзину гостя выводит вьюха DRF.'
+        )
+        assert response.json()['total_quantity'] == 0
+
+    def test_invalid_token_on_catalog(self, store):
+        response = async_request('get', '/api/products/', 'wrong')
+        assert response.status_code == HTTPStatus.UNAUTHORIZED, (
+            'Неверный токен отклоняется и на открытых эндпоинтах, как в DRF.'
+        )
+
+    def test_add_product(self, user_client, token_user, user, catalog):
+        url = f'/api/products/{catalog[0].pk}/shopping_cart/'
+        async_request('post', url, token_user['auth_token'])
+        response = async_request('post', url, token_user['auth_token'])
+        assert response.status_code == HTTPStatus.CREATED
+        assert is_native(response)
+        expected = user_client.patch(
+            url, {'product_quantity': 2}, format='json'
+        )
+        assert response.content == expected.content
+        shopping_cart = ShoppingCart.objects.get(user=user)
+        assert shopping_cart.total_quantity == 2
+        assert shopping_cart.total_price == catalog[0].price * 2
+
+    def test_remove_product(self, token_user, user, store, catalog):
+        url = f'/api/products/{catalog[0].pk}/shopping_cart/'
+        response = async_request('delete', url, token_user['auth_token'])
+        assert response.status_code == HTTPStatus.NO_CONTENT
+        assert not CartItem.objects.filter(
+            shopping_cart=store, product=catalog[0]
+        ).exists()
+        store.refresh_from_db()
+        assert store.total_quantity == sum(range(2, 11))
+        response = async_request('delete', url, token_user['auth_token'])
+        assert response.status_code == HTTPStatus.NOT_FOUND
+
+    def test_clear_shopping_cart(self, token_user, store):
+        response = async_request(
+            'delete', '/api/shopping_cart/', token_user['auth_token']
+        )
+        assert response.status_code == HTTPStatus.NO_CONTENT
+        store.refresh_from_db()
+        assert not store.cart_items.exists()
+        assert (store.total_quantity, store.total_price) == (0, 0)
+
+    def test_async_views_disabled(self, settings, store):
+        settings.ASYNC_VIEWS = False
+        response = async_request('get', '/api/products/')
+        assert not is_native(response)
@@ -0,0 +1,100 @@
+from http import HTTPStatus
+
+import pytest
+from django.core.cache.backends.filebased import FileBasedCache
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.authentication import (
+    JWTStatelessUserAuthentication
+)
+
+from api.authentication import token_cache_key
+from api.views import ProductViewSet, ShoppingCartAPIView
+from products.models import CartItem
+
+
+@pytest.mark.django_db
+class TestCachedTokenAuthentication:
+
+    cart_url = '/api/shopping_cart/'
+    logout_url = '/api/auth/token/logout/'
+
+    def test_token_cached(self, user_client, django_assert_num_queries):
+        user_client.get(self.cart_url)
+        # Корзина, позиции; токен берётся из кэша.
+        with django_assert_num_queries(2):
+            response = user_client.get(self.cart_url)
+        assert response.status_code == HTTPStatus.OK
+
+    def test_logout_invalidates_token(self, user_client):
+        assert user_client.get(self.cart_url).status_code == HTTPStatus.OK
+        response = user_client.post(self.logout_url)
+        assert response.status_code == HTTPStatus.NO_CONTENT
+        response = user_client.get(self.cart_url)
+        assert response.status_code == HTTPStatus.UNAUTHORIZED, (
+            'После выхода токен не должен приниматься из кэша.'
+        )
+
+    def test_logout_seen_by_other_workers(
+        self, settings, tmp_path, token_user, user_client
+    ):
+        settings.CACHES = {**settings.CACHES, 'auth': {
+            **settings.AUTH_CACHES['file'], 'LOCATION': tmp_path,
+        }}
+        other_worker = FileBasedCache(tmp_path, {})
+        key = token_cache_key(token_user['auth_token'])
+        assert user_client.get(self.cart_url).status_code == HTTPStatus.OK
+        assert other_worker.get(key) is not None
+        user_client.post(self.logout_url)
+        assert other_worker.get(key) is None, (
+            'Выход сбрасывает токен в кэше всех процессов.'
+        )
+
+    def test_inactive_user_invalidates_token(self, user, user_client):
+        assert user_client.get(self.cart_url).status_code == HTTPStatus.OK
+        user.is_active = False
+        user.save()
+        response = user_client.get(self.cart_url)
+        assert response.status_code == HTTPStatus.UNAUTHORIZED, (
+            'Токен деактивированного пользователя не должен '
+            'приниматься из кэша.'
+        )
+
+
+@pytest.mark.django_db
+class TestJWTAuthentication:
+
+    jwt_create_url = '/api/auth/jwt/create/'
+    shopping_cart_url = '/api/products/{id}/shopping_cart/'
+    cart_url = '/api/shopping_cart/'
+
+    @pytest.fixture
+    def jwt_client(self, client, user, monkeypatch):
+        for view in (ProductViewSet, ShoppingCartAPIView):
+            monkeypatch.setattr(
+                view,
+                'authentication_classes',
+                (JWTStatelessUserAuthentication, )
+            )
+        response = client.post(
+            self.jwt_create_url,
+            {'username': 'TestUser', 'password': '1234567'}
+        )
+        assert response.status_code == HTTPStatus.OK
+        jwt_client = APIClient()
+        jwt_client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {response.json()["access"]}'
+        )
+        return jwt_client
+
+    def test_stateless_cart(
+        self, user, jwt_client, product_1, django_assert_num_queries
+    ):
+        response = jwt_client.post(
+            self.shopping_cart_url.format(id=product_1.id)
+        )
+        assert response.status_code == HTTPStatus.CREATED
+        assert CartItem.objects.filter(shopping_cart__user=user).exists()
+        # Корзина, позиции с продуктами, изображения; без запроса токена.
+        with django_assert_num_queries(3):
+            response = jwt_client.get(self.cart_url)
+        assert response.json()['total_quantity'] == 1
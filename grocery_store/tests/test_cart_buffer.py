@@ -0,0 +1,175 @@
+from http import HTTPStatus
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api.cart_buffer import CartBuffer, CartBufferFileCache, CartBufferLocked
+from api.serializers import MAX_PRODUCT_QUANTITY
+from products.models import CartItem, ShoppingCart
+
+CART_URL = '/api/shopping_cart/'
+PRODUCT_CART_URL = '/api/products/{id}/shopping_cart/'
+
+
+def writes(queries):
+    return [
+        query['sql'] for query in queries
+        if query['sql'].split()[0] in ('INSERT', 'UPDATE', 'DELETE')
+    ]
+
+
+@pytest.fixture
+def buffer_dir(settings, tmp_path):
+    location = tmp_path / 'cart_buffer'
+    settings.CART_WRITE_BEHIND = True
+    settings.CART_WRITE_BEHIND_INTERVAL = 0
+    settings.CACHES = {**settings.CACHES, 'cart_buffer': {
+        'BACKEND': 'api.cart_buffer.CartBufferFileCache',
+        'LOCATION': location,
+        'TIMEOUT': None,
+    }}
+    return location
+
+
+def saved(user):
+    return dict(CartItem.objects.filter(
+        shopping_cart__user=user
+    ).values_list('product_id', 'product_quantity'))
+
+
+@pytest.mark.django_db
+class TestCartBuffer:
+
+    def test_edits_are_buffered(self, buffer_dir, user, user_client,
+                                catalog):
+        url = PRODUCT_CART_URL.format(id=catalog[0].id)
+        with CaptureQueriesContext(connection) as context:
+            for _ in range(3):
+                response = user_client.post(url)
+            assert response.status_code == HTTPStatus.CREATED
+            assert response.json()['product_quantity'] == 3
+            response = user_client.patch(
+                url, {'product_quantity': 5}, format='json'
+            )
+        assert response.status_code == HTTPStatus.OK
+        assert response.json()['product_price'] == 5 * catalog[0].price
+        assert not writes(context.captured_queries), (
+            'Изменения продукта в корзине не пишутся в БД сразу.'
+        )
+        assert not saved(user)
+        data = user_client.get(CART_URL).json()
+        assert data['total_quantity'] == 5, (
+            'Перед выводом корзины буфер сбрасывается.'
+        )
+        assert saved(user) == {catalog[0].id: 5}
+
+    def test_flush_is_one_batch(self, buffer_dir, user, user_client,
+                                catalog):
+        CartItem.objects.add_product(user, catalog[2], quantity=4)
+        for product in catalog[:2]:
+            for _ in range(5):
+                user_client.post(PRODUCT_CART_URL.format(id=product.id))
+        user_client.delete(PRODUCT_CART_URL.format(id=catalog[2].id))
+        with CaptureQueriesContext(connection) as context:
+            assert CartBuffer().flush_due() == (1, 3)
+        cart_item_writes = [
+            sql for sql in writes(context.captured_queries)
+            if sql.split()[2] == '"products_cartitem"'
+        ]
+        assert len(cart_item_writes) == 2, (
+            'Все изменения пользователя сбрасываются одной вставкой '
+            'и одним удалением.'
+        )
+        assert saved(user) == {catalog[0].id: 5, catalog[1].id: 5}
+        shopping_cart = ShoppingCart.objects.get(user=user)
+        assert shopping_cart.total_quantity == 10
+        assert shopping_cart.total_price == 5 * 1 + 5 * 2
+        assert CartBuffer().flush_due() == (0, 0)
+
+    def test_delete(self, buffer_dir, user, user_client, catalog):
+        url = PRODUCT_CART_URL.format(id=catalog[0].id)
+        assert user_client.delete(url).status_code == HTTPStatus.NOT_FOUND
+        CartItem.objects.add_product(user, catalog[0])
+        assert user_client.delete(url).status_code == HTTPStatus.NO_CONTENT
+        assert user_client.delete(url).status_code == HTTPStatus.NOT_FOUND, (
+            'Удаление учитывает отложенные изменения.'
+        )
+        assert user_client.patch(
+            url, {'product_quantity': 2}, format='json'
+        ).status_code == HTTPStatus.NOT_FOUND
+        assert saved(user) == {catalog[0].id: 1}
+        CartBuffer().flush(user.pk)
+        assert not saved(user)
+        assert ShoppingCart.objects.get(user=user).total_quantity == 0
+
+    def test_size_threshold(self, buffer_dir, settings, user, user_client,
+                            catalog):
+        settings.CART_WRITE_BEHIND_MAX_PRODUCTS = 2
+        user_client.post(PRODUCT_CART_URL.format(id=catalog[0].id))
+        assert not saved(user)
+        user_client.post(PRODUCT_CART_URL.format(id=catalog[1].id))
+        assert saved(user) == {catalog[0].id: 1, catalog[1].id: 1}, (
+            'Накопленные изменения сбрасываются по достижении порога.'
+        )
+
+    def test_batch_after_buffered_edits(self, buffer_dir, user, user_client,
+                                        catalog):
+        url = PRODUCT_CART_URL.format(id=catalog[0].id)
+        user_client.post(url)
+        user_client.post(url)
+        response = user_client.patch(CART_URL, {'operations': [
+            {'product': catalog[0].id, 'quantity': 1,
+             'operation': 'increment'},
+        ]}, format='json')
+        assert response.json()['total_quantity'] == 3
+        assert saved(user) == {catalog[0].id: 3}
+
+    def test_survives_restart(self, buffer_dir, user, user_client, catalog):
+        user_client.post(PRODUCT_CART_URL.format(id=catalog[0].id))
+        restarted = CartBufferFileCache(buffer_dir, {})
+        assert restarted.get(user.pk)['quantities'] == {catalog[0].id: 1}
+        out = StringIO()
+        call_command('flush_cart_buffer', stdout=out)
+        assert 'Сброшено корзин: 1, продуктов: 1' in out.getvalue()
+        assert saved(user) == {catalog[0].id: 1}
+
+    def test_lock_is_atomic(self, tmp_path):
+        cache = CartBufferFileCache(tmp_path, {})
+        assert cache.add('lock', 1)
+        assert not cache.add('lock', 2)
+        assert cache.get('lock') == 1
+        cache.set('expired', 1, timeout=0)
+        assert cache.add('expired', 2), 'Истёкший ключ можно занять.'
+
+    def test_lock_wait_is_bounded(self, buffer_dir, monkeypatch):
+        monkeypatch.setattr('api.cart_buffer.LOCK_WAIT', 0.05)
+        cart_buffer = CartBuffer()
+        with cart_buffer.lock('user'):
+            with pytest.raises(CartBufferLocked):
+                with cart_buffer.lock('user'):
+                    pass
+
+    def test_expired_lock_kept_for_new_owner(self, buffer_dir):
+        cart_buffer = CartBuffer()
+        with cart_buffer.lock('user'):
+            # Срок блокировки истёк, и её занял другой процесс.
+            cart_buffer.cache.set('lock:user', 'other', timeout=30)
+        assert cart_buffer.cache.get('lock:user') == 'other', (
+            'Блокировку снимает только её владелец.'
+        )
+
+    def test_max_quantity(self, buffer_dir, user, user_client, catalog):
+        url = PRODUCT_CART_URL.format(id=catalog[0].id)
+        CartBuffer().set(user.pk, catalog[0].id, MAX_PRODUCT_QUANTITY)
+        response = user_client.post(url)
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+        assert CartBuffer().get_quantity(
+            user.pk, catalog[0].id
+        ) == MAX_PRODUCT_QUANTITY
+
+    def test_disabled(self, user, user_client, catalog):
+        user_client.post(PRODUCT_CART_URL.format(id=catalog[0].id))
+        assert saved(user) == {catalog[0].id: 1}
@@ -2,7 +2,7 @@ from http import HTTPStatus
 
 import pytest
 
-from products.models import Category
+from products.models import Category, Subcategory
 
 
 @pytest.mark.django_db
@@ -94,3 +94,38 @@ class TestCategoryAPI:
         )
 
         self.check_category_fields(test_data, self.category_detail_url)
+
+    def test_category_tree_cached(
+        self, client, subcategory_1, django_assert_num_queries
+    ):
+        client.get(self.category_url)
+        with django_assert_num_queries(0):
+            response = client.get(self.category_url)
+        assert response.status_code == HTTPStatus.OK
+        with django_assert_num_queries(0):
+            response = client.get(
+                self.category_detail_url.format(id=subcategory_1.category_id)
+            )
+        assert response.json()['subcategories'][0]['slug'] == (
+            subcategory_1.slug
+        ), 'Повторный запрос должен отдавать дерево категорий из снимка.'
+
+    def test_category_tree_invalidation(self, client, category_1):
+        url = self.category_detail_url.format(id=category_1.id)
+        assert client.get(url).json()['subcategories'] == []
+
+        subcategory = Subcategory.objects.create(
+            name='Подкатегория 2', slug='subcategory_2', category=category_1
+        )
+        subcategories = client.get(url).json()['subcategories']
+        assert [item['slug'] for item in subcategories] == [
+            'subcategory_2'
+        ], 'После создания подкатегории снимок дерева должен обновиться.'
+
+        subcategory.delete()
+        assert client.get(url).json()['subcategories'] == [], (
+            'После удаления подкатегории снимок дерева должен обновиться.'
+        )
+
+        category_1.delete()
+        assert client.get(url).status_code == HTTPStatus.NOT_FOUND
@@ -0,0 +1,111 @@
+from http import HTTPStatus
+
+import pytest
+
+from products.models import ShoppingCart
+from .test_async_views import async_request
+
+
+@pytest.mark.django_db
+class TestConditionalGet:
+    cart_url = '/api/shopping_cart/'
+
+    @pytest.mark.parametrize('url', (
+        '/api/products/',
+        '/api/products/{product}/',
+        '/api/categories/',
+        '/api/categories/{category}/',
+    ))
+    def test_catalog_not_modified(self, client, store, catalog, category_1,
+                                  django_assert_num_queries, url):
+        url = url.format(product=catalog[0].pk, category=category_1.pk)
+        response = client.get(url)
+        assert response.status_code == HTTPStatus.OK
+        assert response['ETag'] and response['Last-Modified']
+        with django_assert_num_queries(0):
+            not_modified = client.get(
+                url, HTTP_IF_NONE_MATCH=response['ETag']
+            )
+        assert not_modified.status_code == HTTPStatus.NOT_MODIFIED, (
+            f'`{url}` с актуальным If-None-Match должен отвечать 304'
+        )
+        assert not_modified.content == b''
+        assert not_modified['ETag'] == response['ETag']
+        not_modified = client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+        )
+        assert not_modified.status_code == HTTPStatus.NOT_MODIFIED
+
+    def test_catalog_changed(self, client, store, catalog):
+        url = f'/api/products/{catalog[0].pk}/'
+        etag = client.get(url)['ETag']
+        catalog[1].price = 1000
+        catalog[1].save()
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == HTTPStatus.OK, (
+            'После изменения каталога старый ETag не должен подходить'
+        )
+        assert response['ETag'] != etag
+
+    def test_etag_depends_on_query(self, client, store):
+        first = client.get('/api/products/')['ETag']
+        second = client.get('/api/products/?page=2')['ETag']
+        assert first != second
+
+    def test_cart_not_modified(self, user_client, store,
+                               django_assert_num_queries):
+        response = user_client.get(self.cart_url)
+        assert response.status_code == HTTPStatus.OK
+        etag = response['ETag']
+        # Токен уже в кэше: только строка корзины.
+        with django_assert_num_queries(1):
+            response = user_client.get(
+                self.cart_url, HTTP_IF_NONE_MATCH=etag
+            )
+        assert response.status_code == HTTPStatus.NOT_MODIFIED
+
+    def test_cart_changed(self, user, user_client, store, catalog):
+        etag = user_client.get(self.cart_url)['ETag']
+        store.refresh_from_db()
+        updated_at = store.updated_at
+        user_client.post(f'/api/products/{catalog[20].pk}/shopping_cart/')
+        assert ShoppingCart.objects.get(user=user).updated_at > updated_at
+        response = user_client.get(self.cart_url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == HTTPStatus.OK, (
+            'После изменения корзины старый ETag не должен подходить'
+        )
+        etag = response['ETag']
+        catalog[0].name = 'Новое название'
+        catalog[0].save()
+        response = user_client.get(self.cart_url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == HTTPStatus.OK, (
+            'Состав корзины зависит от каталога'
+        )
+
+    def test_cart_fields(self, user_client, store):
+        store.refresh_from_db()
+        response = user_client.get(self.cart_url, {'fields': 'total_price'})
+        assert response.json() == {'total_price': store.total_price}
+        response = user_client.get(
+            self.cart_url, {'fields': 'total_price'},
+            HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        assert response.status_code == HTTPStatus.NOT_MODIFIED
+
+    @pytest.mark.parametrize('url, authenticated', (
+        ('/api/products/', False),
+        ('/api/categories/', False),
+        ('/api/shopping_cart/', True),
+    ))
+    def test_async_views(self, user_client, token_user, store, url,
+                         authenticated):
+        token = token_user['auth_token'] if authenticated else None
+        etag = user_client.get(url)['ETag']
+        response = async_request('get', url, token)
+        assert response['ETag'] == etag, (
+            'ETag асинхронной вьюхи и вьюхи DRF должны совпадать'
+        )
+        response = async_request(
+            'get', url, token, headers={'If-None-Match': etag}
+        )
+        assert response.status_code == HTTPStatus.NOT_MODIFIED
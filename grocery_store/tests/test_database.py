@@ -0,0 +1,65 @@
+import time
+from threading import Event, Thread
+
+import pytest
+from django.db import connection, transaction
+
+from products.models import Product
+
+
+@pytest.mark.skipif(
+    connection.vendor != 'sqlite', reason='Прагмы относятся только к SQLite.'
+)
+@pytest.mark.django_db(transaction=True)
+class TestSQLiteProfile:
+
+    def test_pragmas_applied(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            assert cursor.fetchone()[0] == 'wal', (
+                'SQLite должна работать в режиме WAL.'
+            )
+            cursor.execute('PRAGMA synchronous')
+            assert cursor.fetchone()[0] == 1, (
+                'Для WAL достаточно synchronous = NORMAL.'
+            )
+
+    def change_price(self, product_id, started, errors, wait=None):
+        try:
+            if wait is not None:
+                wait.wait()
+            with transaction.atomic():
+                product = Product.objects.get(pk=product_id)
+                if wait is None:
+                    started.set()
+                    time.sleep(0.2)
+                product.price += 1
+                product.save(update_fields=('price',))
+        except Exception as error:
+            errors.append(error)
+        finally:
+            connection.close()
+
+    def test_read_then_write_waits_for_lock(self, product_1):
+        started = Event()
+        errors = []
+        workers = [
+            Thread(
+                target=self.change_price,
+                args=(product_1.id, started, errors)
+            ),
+            Thread(
+                target=self.change_price,
+                args=(product_1.id, started, errors, started)
+            ),
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        assert errors == [], (
+            'Транзакция с чтением перед записью должна дожидаться '
+            'блокировки, а не падать с «database is locked».'
+        )
+        product_1.refresh_from_db()
+        assert product_1.price == 102
@@ -0,0 +1,134 @@
+import csv
+import gzip
+import io
+import json
+from http import HTTPStatus
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.core.management import call_command
+
+from api.export import accepts_gzip, stream_export
+from products.export import CSV_FIELDS, CatalogExport
+from products.models import Product
+
+
+def content(response):
+    return b''.join(response.streaming_content)
+
+
+@pytest.mark.django_db
+class TestCatalogExport:
+    url = '/api/products/export/'
+
+    def test_not_auth(self, client, catalog):
+        response = client.get(self.url)
+        assert response.status_code == HTTPStatus.UNAUTHORIZED
+
+    def test_ndjson(self, user_client, store, catalog):
+        response = user_client.get(self.url)
+        assert response.status_code == HTTPStatus.OK
+        assert response['Content-Type'].startswith('application/x-ndjson')
+        products = [
+            json.loads(line) for line in content(response).splitlines()
+        ]
+        assert len(products) == Product.objects.count()
+        assert [product['id'] for product in products] == sorted(
+            Product.objects.values_list('id', flat=True)
+        )
+        first = products[0]
+        assert first['slug'] == catalog[0].slug
+        assert first['category'] == {
+            'slug': 'category_1', 'name': 'Категория 1'
+        }
+        assert first['subcategory']['slug'] == 'subcategory_1'
+        assert len(first['images']) == 3
+        assert first['images'][0].startswith('http://testserver/media/'), (
+            'Адреса изображений в выгрузке должны быть полными'
+        )
+
+    def test_csv(self, user_client, catalog):
+        response = user_client.get(self.url, {'export_format': 'csv'})
+        rows = list(csv.reader(io.StringIO(content(response).decode())))
+        assert tuple(rows[0]) == CSV_FIELDS
+        assert len(rows) == len(catalog) + 1
+        row = dict(zip(CSV_FIELDS, rows[1]))
+        assert row['name'] == catalog[0].name
+        assert len(row['images'].split()) == 3
+
+    def test_gzip(self, user_client, catalog):
+        plain = content(user_client.get(self.url))
+        response = user_client.get(self.url, HTTP_ACCEPT_ENCODING='gzip')
+        assert response['Content-Encoding'] == 'gzip'
+        assert gzip.decompress(content(response)) == plain
+        response = user_client.get(
+            self.url, HTTP_ACCEPT_ENCODING='gzip;q=0, identity'
+        )
+        assert 'Content-Encoding' not in response, (
+            'Клиент, отказавшийся от gzip, должен получать выгрузку без сжатия'
+        )
+        assert content(response) == plain
+
+    @pytest.mark.parametrize('accept_encoding, expected', [
+        ('gzip', True),
+        ('br, gzip;q=0.5', True),
+        ('GZIP; Q=1.0', True),
+        ('*', True),
+        ('gzip;q=0', False),
+        ('gzip;q=0.0, *;q=1', False),
+        ('*;q=0', False),
+        ('br, deflate', False),
+        ('gzip;q=abc', False),
+        ('', False),
+    ])
+    def test_accepts_gzip(self, accept_encoding, expected):
+        assert accepts_gzip(accept_encoding) is expected
+
+    def test_filters(self, user_client, store, catalog):
+        response = user_client.get(self.url, {'max_price': 10})
+        lines = content(response).splitlines()
+        assert len(lines) == 10
+
+    def test_ordering_rejected(self, user_client, catalog):
+        response = user_client.get(self.url, {'ordering': '-price'})
+        assert response.status_code == HTTPStatus.BAD_REQUEST, (
+            'Выгрузка не сортируется и должна отклонять `ordering`'
+        )
+        assert 'ordering' in response.json()
+
+    def test_invalid_format(self, user_client):
+        response = user_client.get(self.url, {'export_format': 'xml'})
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+
+    def test_chunks(self, catalog, django_assert_num_queries):
+        export = CatalogExport(chunk_size=100)
+        # По два запроса на порцию и один пустой в конце.
+        with django_assert_num_queries(7):
+            chunks = list(export)
+        assert len(chunks) == 3
+        assert export.rows == len(catalog)
+
+    def test_async_stream(self, catalog):
+        async def collect(iterator):
+            return [chunk async for chunk in iterator]
+
+        expected = list(CatalogExport(chunk_size=100))
+        chunks = async_to_sync(collect)(
+            stream_export(CatalogExport(chunk_size=100), is_async=True)
+        )
+        assert chunks == expected
+
+    def test_command(self, tmp_path, catalog):
+        out = io.StringIO()
+        path = tmp_path / 'catalog.csv.gz'
+        call_command(
+            'export_catalog', str(path), chunk_size=50,
+            base_url='https://store.example.com/', stdout=out
+        )
+        rows = list(csv.reader(io.StringIO(
+            gzip.decompress(path.read_bytes()).decode()
+        )))
+        assert len(rows) == len(catalog) + 1
+        assert rows[1][-1].startswith('https://store.example.com/media/')
+        assert f'Выгружено продуктов: {len(catalog)}' in out.getvalue()
+        assert 'строк/с' in out.getvalue()
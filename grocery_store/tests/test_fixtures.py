@@ -0,0 +1,161 @@
+import io
+import json
+
+import pytest
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import IntegrityError
+from django.db.models import QuerySet, Sum
+
+from products.fixtures import iter_json_array, load_records
+from products.models import (
+    CartItem, Category, Product, ProductImage, ShoppingCart, Subcategory
+)
+
+FIXTURE_MODELS = (Category, Subcategory, Product, ProductImage)
+
+
+def snapshot():
+    return {
+        model: list(model.objects.order_by('pk').values())
+        for model in FIXTURE_MODELS
+    }
+
+
+class TestJsonArrayParser:
+
+    def test_chunk_boundaries(self):
+        values = [
+            {'name': 'Сыр "Гауда" {[,]}', 'price': 12345.678},
+            {'name': '\\", ]', 'nested': [1, {'a': [2, 3]}]},
+            [],
+            1234567,
+        ]
+        text = json.dumps(values, ensure_ascii=False, indent=2)
+        for chunk_size in (1, 2, 3, 7, 64):
+            assert list(
+                iter_json_array(io.StringIO(text), chunk_size)
+            ) == values, f'Неверный разбор при chunk_size={chunk_size}'
+
+    def test_empty_array(self):
+        assert list(iter_json_array(io.StringIO(' [ ] '), 1)) == []
+
+    @pytest.mark.parametrize('text', ['{}', '[{"a": 1},', '[{"a": 1'])
+    def test_invalid(self, text):
+        with pytest.raises(ValueError):
+            list(iter_json_array(io.StringIO(text), 2))
+
+
+@pytest.mark.django_db
+class TestLoaddataStream:
+
+    def test_matches_loaddata(self):
+        call_command('loaddata', 'db.json', verbosity=0)
+        expected = snapshot()
+        for model in reversed(FIXTURE_MODELS):
+            model.objects.all().delete()
+        out = io.StringIO()
+        call_command(
+            'loaddata_stream', 'db.json', batch_size=2, chunk_size=16,
+            stdout=out
+        )
+        assert snapshot() == expected
+        assert 'Загружено строк: 17' in out.getvalue()
+        assert 'строк/с' in out.getvalue()
+
+    def test_ndjson_upsert(self, tmp_path):
+        with open('db.json', encoding='utf-8') as file:
+            records = json.load(file)
+        path = tmp_path / 'catalog.ndjson'
+        path.write_text('\n'.join(
+            json.dumps(record, ensure_ascii=False) for record in records
+        ))
+        call_command('loaddata_stream', str(path), stdout=io.StringIO())
+        records[0]['fields']['name'] = 'Новое название'
+        path.write_text('\n'.join(
+            json.dumps(record, ensure_ascii=False) for record in records
+        ))
+        call_command('loaddata_stream', str(path), stdout=io.StringIO())
+        assert Category.objects.count() == 2, 'Строки не должны дублироваться'
+        assert Category.objects.get(pk=1).name == 'Новое название'
+        assert ProductImage.objects.count() == 9
+
+    def test_invalid_fixture(self, tmp_path):
+        path = tmp_path / 'broken.json'
+        path.write_text('[{"model": "products.category", "pk": 1')
+        with pytest.raises(CommandError):
+            call_command('loaddata_stream', str(path), stdout=io.StringIO())
+
+
+    def test_forward_references_and_cart_totals(
+        self, user, product_1, monkeypatch
+    ):
+        product_2 = Product.objects.create(
+            name='Продукт 2', slug='product_2', price=100,
+            category=product_1.category, subcategory=product_1.subcategory
+        )
+        bulk_create = QuerySet.bulk_create
+
+        def check_fields(queryset, *args, **kwargs):
+            assert ShoppingCart._meta.get_field('updated_at').auto_now, (
+                'Загрузка не должна менять общие определения полей.'
+            )
+            return bulk_create(queryset, *args, **kwargs)
+
+        monkeypatch.setattr(QuerySet, 'bulk_create', check_fields)
+        load_records([
+            {'model': 'products.cartitem', 'pk': 1, 'fields': {
+                'shopping_cart': 7, 'product': product_1.pk,
+                'product_quantity': 3, 'product_price': 300,
+            }},
+            {'model': 'products.shoppingcart', 'pk': 7, 'fields': {
+                'user': user.pk, 'total_quantity': 0, 'total_price': 0,
+                'updated_at': '2024-01-01T00:00:00Z',
+            }},
+            {'model': 'products.cartitem', 'pk': 2, 'fields': {
+                'shopping_cart': 7, 'product': product_2.pk,
+                'product_quantity': 2, 'product_price': 200,
+            }},
+        ], batch_size=1)
+        shopping_cart = ShoppingCart.objects.get(pk=7)
+        assert shopping_cart.total_quantity == 5, (
+            'Итоги корзины должны пересчитываться по загруженным позициям.'
+        )
+        assert shopping_cart.total_price == 500
+
+    def test_broken_reference_rolls_back(self, category_1):
+        with pytest.raises(IntegrityError):
+            load_records([
+                {'model': 'products.category', 'pk': 100, 'fields': {
+                    'name': 'Новая', 'slug': 'new', 'image': '',
+                }},
+                {'model': 'products.subcategory', 'pk': 100, 'fields': {
+                    'name': 'Новая', 'slug': 'new', 'image': '',
+                    'category': 999,
+                }},
+            ], batch_size=1)
+        assert not Category.objects.filter(pk=100).exists(), (
+            'При ошибке во внешнем ключе не должно сохраняться ничего.'
+        )
+
+
+@pytest.mark.django_db
+class TestGenerateCatalog:
+
+    def test_counts_and_totals(self):
+        out = io.StringIO()
+        call_command(
+            'generate_catalog', categories=2, subcategories=3, products=50,
+            images=2, users=4, cart_items=3, batch_size=7, stdout=out
+        )
+        assert Subcategory.objects.count() == 6
+        assert Product.objects.count() == 50
+        assert ProductImage.objects.count() == 100
+        assert CartItem.objects.count() == 12
+        for shopping_cart in ShoppingCart.objects.all():
+            items = shopping_cart.cart_items.aggregate(
+                quantity=Sum('product_quantity'), price=Sum('product_price')
+            )
+            assert shopping_cart.total_quantity == items['quantity']
+            assert shopping_cart.total_price == pytest.approx(items['price'])
+        assert 'Создано строк: 178' in out.getvalue()
@@ -0,0 +1,195 @@
+from http import HTTPStatus
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from api.guest_cart import COOKIE_NAME
+from products.models import CartItem, ShoppingCart
+
+CART_URL = '/api/shopping_cart/'
+PRODUCT_CART_URL = '/api/products/{id}/shopping_cart/'
+LOGIN_URL = '/api/auth/token/login/'
+JWT_URL = '/api/auth/jwt/create/'
+
+
+def writes(queries):
+    return [
+        query['sql'] for query in queries
+        if query['sql'].split()[0] in ('INSERT', 'UPDATE', 'DELETE')
+    ]
+
+
+@pytest.fixture
+def guest(catalog):
+    """Гость с тремя продуктами в корзине."""
+    client = APIClient()
+    client.post(PRODUCT_CART_URL.format(id=catalog[0].id))
+    client.post(PRODUCT_CART_URL.format(id=catalog[0].id))
+    client.patch(CART_URL, {'operations': [
+        {'product': catalog[1].id, 'quantity': 3},
+        {'product': catalog[2].id, 'quantity': 1},
+    ]}, format='json')
+    return client
+
+
+@pytest.mark.django_db
+class TestGuestCart:
+
+    def test_no_db_writes(self, catalog):
+        client = APIClient()
+        with CaptureQueriesContext(connection) as context:
+            response = client.post(PRODUCT_CART_URL.format(id=catalog[0].id))
+            client.patch(
+                PRODUCT_CART_URL.format(id=catalog[0].id),
+                {'product_quantity': 4}, format='json'
+            )
+            client.get(CART_URL)
+            client.delete(CART_URL)
+        assert response.status_code == HTTPStatus.CREATED
+        assert response.json()['product_quantity'] == 1
+        assert response.json()['product']['slug'] == catalog[0].slug
+        assert not writes(context.captured_queries), (
+            'Корзина гостя не пишет в БД.'
+        )
+        assert not ShoppingCart.objects.exists()
+
+    def test_cart(self, guest, catalog):
+        response = guest.get(CART_URL)
+        assert response.status_code == HTTPStatus.OK
+        data = response.json()
+        assert [
+            (item['product']['slug'], item['product_quantity'])
+            for item in data['products']
+        ] == [
+            (catalog[0].slug, 2), (catalog[1].slug, 3), (catalog[2].slug, 1)
+        ]
+        assert data['total_quantity'] == 6
+        assert data['total_price'] == 2 * 1 + 3 * 2 + 1 * 3
+
+    def test_same_shape_as_user_cart(self, guest, user, user_client,
+                                     catalog, settings):
+        user_client.patch(CART_URL, {'operations': [
+            {'product': catalog[0].id, 'quantity': 2},
+            {'product': catalog[1].id, 'quantity': 3},
+            {'product': catalog[2].id, 'quantity': 1},
+        ]}, format='json')
+        for serializer in ('values', 'drf'):
+            settings.READ_SERIALIZER = serializer
+            assert guest.get(CART_URL).json() == user_client.get(
+                CART_URL
+            ).json(), f'Ответы расходятся с READ_SERIALIZER={serializer}'
+        query = '?fields=products.product.name,total_price'
+        assert guest.get(CART_URL + query).json() == user_client.get(
+            CART_URL + query
+        ).json()
+
+    def test_change_and_remove(self, guest, catalog):
+        url = PRODUCT_CART_URL.format(id=catalog[1].id)
+        response = guest.patch(url, {'product_quantity': 5}, format='json')
+        assert response.status_code == HTTPStatus.OK
+        assert response.json()['product_price'] == 5 * 2
+        assert guest.delete(url).status_code == HTTPStatus.NO_CONTENT
+        assert guest.delete(url).status_code == HTTPStatus.NOT_FOUND
+        assert guest.patch(
+            url, {'product_quantity': 5}, format='json'
+        ).status_code == HTTPStatus.NOT_FOUND
+        assert guest.get(CART_URL).json()['total_quantity'] == 2 + 1
+        guest.delete(CART_URL)
+        assert COOKIE_NAME not in guest.cookies or not guest.cookies[
+            COOKIE_NAME
+        ].value, 'Пустая корзина удаляет cookie'
+
+    def test_tampered_cookie(self, guest, catalog):
+        value = guest.cookies[COOKIE_NAME].value
+        guest.cookies[COOKIE_NAME] = value.replace(
+            f'{catalog[0].id}:2', f'{catalog[0].id}:90', 1
+        )
+        assert guest.get(CART_URL).json()['total_quantity'] == 0, (
+            'Cookie с неверной подписью не принимается.'
+        )
+
+    def test_max_items(self, catalog, settings):
+        settings.GUEST_CART_MAX_ITEMS = 2
+        client = APIClient()
+        response = client.patch(CART_URL, {'operations': [
+            {'product': product.id, 'quantity': 1}
+            for product in catalog[:3]
+        ]}, format='json')
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+
+    def test_merge_on_login(self, guest, user, catalog):
+        CartItem.objects.add_product(user, catalog[0], quantity=3)
+        response = guest.post(
+            LOGIN_URL, {'username': 'TestUser', 'password': '1234567'},
+            format='json'
+        )
+        assert response.status_code == HTTPStatus.OK
+        assert not guest.cookies[COOKIE_NAME].value, (
+            'После входа cookie корзины гостя удаляется.'
+        )
+        shopping_cart = ShoppingCart.objects.get(user=user)
+        assert dict(shopping_cart.cart_items.values_list(
+            'product_id', 'product_quantity'
+        )) == {catalog[0].id: 5, catalog[1].id: 3, catalog[2].id: 1}
+        assert shopping_cart.total_quantity == 9
+        assert shopping_cart.total_price == 5 * 1 + 3 * 2 + 1 * 3
+        guest.credentials(
+            HTTP_AUTHORIZATION=f'Token {response.json()["auth_token"]}'
+        )
+        assert guest.get(CART_URL).json()['total_quantity'] == 9
+
+    def test_merge_is_one_batch(self, guest, user):
+        ShoppingCart.objects.create(user=user)
+        with CaptureQueriesContext(connection) as context:
+            guest.post(
+                LOGIN_URL, {'username': 'TestUser', 'password': '1234567'},
+                format='json'
+            )
+        cart_item_writes = [
+            sql for sql in writes(context.captured_queries)
+            if 'products_cartitem' in sql
+        ]
+        assert len(cart_item_writes) == 1, (
+            'Позиции корзины гостя добавляются одним запросом.'
+        )
+
+    def test_merge_on_first_request(self, guest, user, catalog):
+        response = guest.post(
+            JWT_URL, {'username': 'TestUser', 'password': '1234567'},
+            format='json'
+        )
+        assert response.status_code == HTTPStatus.OK
+        assert not ShoppingCart.objects.filter(user=user).exists(), (
+            'Вход по JWT не отправляет user_logged_in.'
+        )
+        guest.force_authenticate(user)
+        data = guest.get(CART_URL).json()
+        assert data['total_quantity'] == 6
+        assert not guest.cookies[COOKIE_NAME].value
+        assert guest.get(CART_URL).json()['total_quantity'] == 6, (
+            'Корзина гостя переносится один раз.'
+        )
+
+    def test_replayed_cookie_merged_once(self, guest, user, catalog):
+        cookie = guest.cookies[COOKIE_NAME].value
+        guest.force_authenticate(user)
+        assert guest.get(CART_URL).json()['total_quantity'] == 6
+        guest.cookies[COOKIE_NAME] = cookie
+        assert guest.get(CART_URL).json()['total_quantity'] == 6, (
+            'Cookie, пришедшая повторно до удаления, не переносится снова.'
+        )
+        assert not guest.cookies[COOKIE_NAME].value
+
+    def test_replayed_cookie_after_login(self, guest, user):
+        cookie = guest.cookies[COOKIE_NAME].value
+        response = guest.post(
+            LOGIN_URL, {'username': 'TestUser', 'password': '1234567'},
+            format='json'
+        )
+        guest.cookies[COOKIE_NAME] = cookie
+        guest.credentials(
+            HTTP_AUTHORIZATION=f'Token {response.json()["auth_token"]}'
+        )
+        assert guest.get(CART_URL).json()['total_quantity'] == 6
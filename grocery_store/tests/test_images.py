@@ -0,0 +1,158 @@
+import os
+from io import StringIO
+from threading import Event
+
+import pytest
+from django.core.management import call_command
+from PIL import Image
+
+from products.images import (
+    ASPECT_RATIOS, FORMATS, WIDTHS, derivative_name, generate_derivatives,
+    schedule_derivatives
+)
+from products.models import ProductImage
+
+
+@pytest.fixture
+def media_root(settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path
+    settings.IMAGE_DERIVATIVES_WORKERS = 0
+    return tmp_path
+
+
+@pytest.fixture
+def original(media_root):
+    name = 'products/maasdam.jpg'
+    (media_root / 'products').mkdir()
+    Image.new('RGB', (1600, 900), 'orange').save(media_root / name)
+    return name
+
+
+class TestImageDerivatives:
+
+    def test_generate_derivatives(self, media_root, original):
+        created = generate_derivatives(str(media_root), original)
+        assert created == len(ASPECT_RATIOS) * len(WIDTHS) * len(FORMATS), (
+            'Для изображения должны строиться все пропорции, ширины '
+            'и форматы.'
+        )
+        for ratio, (ratio_width, ratio_height) in ASPECT_RATIOS.items():
+            for width in WIDTHS:
+                path = media_root / derivative_name(
+                    original, ratio, width, 'webp'
+                )
+                with Image.open(path) as image:
+                    assert image.format == 'WEBP'
+                    expected_width = min(width, 900 * ratio_width
+                                         // ratio_height, 1600)
+                    assert image.width == expected_width, (
+                        'Производная не должна быть шире запрошенной '
+                        'ширины и шире обрезанного оригинала.'
+                    )
+                    assert abs(
+                        image.width * ratio_height
+                        - image.height * ratio_width
+                    ) <= ratio_height, (
+                        f'Производная должна иметь пропорцию {ratio}.'
+                    )
+
+    def test_up_to_date_derivatives_skipped(self, media_root, original):
+        generate_derivatives(str(media_root), original)
+        assert generate_derivatives(str(media_root), original) == 0, (
+            'Актуальные производные не должны перестраиваться.'
+        )
+
+    def test_missing_original(self, media_root):
+        assert generate_derivatives(str(media_root), 'products/none.jpg') == 0
+
+    def test_command(self, media_root, original, db, product_1):
+        ProductImage.objects.create(product=product_1, image=original)
+        out = StringIO()
+        call_command('generate_image_derivatives', workers=1, stdout=out)
+        assert 'построено производных: 18' in out.getvalue()
+        assert os.path.exists(
+            media_root / derivative_name(original, '16x9', 640, 'jpeg')
+        )
+
+
+@pytest.mark.django_db
+class TestImageDerivativesAPI:
+
+    def test_upload_triggers_derivatives(
+        self, media_root, original, product_1,
+        django_capture_on_commit_callbacks
+    ):
+        with django_capture_on_commit_callbacks(execute=True):
+            ProductImage.objects.create(product=product_1, image=original)
+        assert os.path.exists(
+            media_root / derivative_name(original, '1x1', 320, 'webp')
+        ), 'Сохранение изображения должно запускать построение производных.'
+
+    def test_srcset_in_response(self, client, media_root, original,
+                                product_1):
+        ProductImage.objects.create(product=product_1, image=original)
+        response = client.get(f'/api/products/{product_1.id}/')
+        assert response.json()['images'][0]['srcset'] is None, (
+            'Пока производные не построены, srcset должен быть пустым.'
+        )
+        schedule_derivatives(original)
+        response = client.get(f'/api/products/{product_1.id}/')
+        srcset = response.json()['images'][0]['srcset']
+        assert set(srcset) == set(ASPECT_RATIOS), (
+            'srcset должен содержать все пропорции изображения.'
+        )
+        # Обрезка 4x3 оригинала 1600x900 шириной 1200 не увеличивается.
+        assert srcset['4x3']['webp'] == ', '.join(
+            f'/media/{derivative_name(original, "4x3", width, "webp")} '
+            f'{actual}w'
+            for width, actual in ((320, 320), (640, 640), (1280, 1200))
+        ), (
+            'Ссылки srcset должны строиться так же, как ссылка на '
+            'оригинал, с действительной шириной производной.'
+        )
+
+    def test_srcset_small_original(self, client, media_root, product_1):
+        name = 'products/small.jpg'
+        (media_root / 'products').mkdir()
+        Image.new('RGB', (500, 500), 'white').save(media_root / name)
+        generate_derivatives(str(media_root), name)
+        ProductImage.objects.create(product=product_1, image=name)
+        response = client.get(f'/api/products/{product_1.id}/')
+        srcset = response.json()['images'][0]['srcset']
+        assert srcset['1x1']['jpeg'] == ', '.join((
+            f'/media/{derivative_name(name, "1x1", 320, "jpeg")} 320w',
+            f'/media/{derivative_name(name, "1x1", 640, "jpeg")} 500w',
+        )), (
+            'Производные уже оригинала выводятся один раз '
+            'с действительной шириной.'
+        )
+
+    def test_srcset_in_categories(self, client, media_root, subcategory_1):
+        name = 'subcategories/milk.png'
+        (media_root / 'subcategories').mkdir()
+        Image.new('RGB', (800, 600), 'white').save(media_root / name)
+        generate_derivatives(str(media_root), name)
+        subcategory_1.image = name
+        subcategory_1.save()
+        response = client.get('/api/categories/')
+        category = response.json()['results'][0]
+        assert category['srcset'] is None, (
+            'У категории без изображения srcset должен быть пустым.'
+        )
+        assert set(category['subcategories'][0]['srcset']) == set(
+            ASPECT_RATIOS
+        )
+
+    def test_pool_errors_logged(self, settings, media_root, caplog):
+        settings.IMAGE_DERIVATIVES_WORKERS = 1
+        name = 'products/broken.jpg'
+        (media_root / 'products').mkdir()
+        (media_root / name).write_bytes(b'not an image')
+        future = schedule_derivatives(name)
+        # Колбэки вызываются по порядку: этот — после записи в лог.
+        done = Event()
+        future.add_done_callback(lambda future: done.set())
+        assert done.wait(timeout=30)
+        assert 'Не удалось построить производные products/broken.jpg' in (
+            caplog.text
+        ), 'Ошибка в пуле процессов должна попадать в лог.'
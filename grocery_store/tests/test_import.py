@@ -0,0 +1,262 @@
+import csv
+import json
+from http import HTTPStatus
+from io import StringIO
+
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework.test import APIClient
+
+from products.images import derivative_name
+from products.importer import CatalogImport, iter_records
+from products.models import Category, Product, ProductImage, Subcategory
+from products.versions import CATALOG
+
+FIELDS = (
+    'name', 'slug', 'price', 'category_slug', 'category',
+    'subcategory_slug', 'subcategory', 'images',
+)
+
+
+@pytest.fixture
+def media_root(settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path / 'media'
+    settings.IMAGE_DERIVATIVES_WORKERS = 0
+    return settings.MEDIA_ROOT
+
+
+@pytest.fixture
+def images_dir(settings, tmp_path):
+    directory = tmp_path / 'supplier'
+    directory.mkdir()
+    for name, color in (('red.png', 'red'), ('blue.jpg', 'blue')):
+        Image.new('RGB', (400, 300), color).save(directory / name)
+    (directory / 'broken.jpg').write_bytes(b'not an image')
+    settings.CATALOG_IMPORT_IMAGES_DIR = directory
+    return directory
+
+
+def make_rows(count=20, changes=None):
+    rows = [
+        {
+            'name': f'Товар {number}',
+            'slug': f'supplier_{number}',
+            'price': str(number + 10),
+            'category_slug': f'category_{number % 2}',
+            'category': f'Категория {number % 2}',
+            'subcategory_slug': f'subcategory_{number % 4}',
+            'subcategory': f'Подкатегория {number % 4}',
+            'images': 'red.png blue.jpg' if number % 2 else 'red.png',
+        }
+        for number in range(count)
+    ]
+    for number, values in (changes or {}).items():
+        rows[number].update(values)
+    return rows
+
+
+def to_csv(rows):
+    buffer = StringIO()
+    writer = csv.DictWriter(buffer, FIELDS)
+    writer.writeheader()
+    writer.writerows(rows)
+    return buffer.getvalue()
+
+
+def run_import(rows, images_dir, **kwargs):
+    kwargs.setdefault('workers', 0)
+    catalog_import = CatalogImport(images_dir=images_dir, **kwargs)
+    return catalog_import.run(iter_records(StringIO(to_csv(rows)), 'csv'))
+
+
+@pytest.mark.django_db
+class TestCatalogImport:
+
+    def test_create(self, media_root, images_dir):
+        report = run_import(make_rows(), images_dir, batch_size=7)
+        assert report.created[Category] == Category.objects.count() == 2
+        assert report.created[Subcategory] == 4
+        assert report.created[Product] == Product.objects.count() == 20
+        assert report.created[ProductImage] == 30
+        product = Product.objects.get(slug='supplier_3')
+        assert product.price == 13
+        assert product.category.slug == 'category_1'
+        assert product.subcategory.category_id == product.category_id
+        names = list(
+            product.product_images.order_by('id').values_list(
+                'image', flat=True
+            )
+        )
+        assert len(set(ProductImage.objects.values_list('image', flat=True))
+                   ) == 2, 'Одинаковые файлы должны храниться один раз'
+        assert (media_root / names[0]).is_file()
+        assert (
+            media_root / derivative_name(names[0], '1x1', 320, 'webp')
+        ).is_file(), 'Для изображений импорта строятся производные'
+
+    def test_unchanged_rows_not_rewritten(self, media_root, images_dir,
+                                          django_assert_num_queries):
+        run_import(make_rows(), images_dir)
+        updated_at = dict(Product.objects.values_list('slug', 'updated_at'))
+        image_ids = set(ProductImage.objects.values_list('id', flat=True))
+        # Порция: по SELECT на категории, подкатегории, продукты
+        # и изображения, транзакция без записей.
+        with django_assert_num_queries(6):
+            report = run_import(make_rows(), images_dir)
+        assert report.unchanged[Product] == 20
+        assert not report.created[Product] and not report.updated[Product]
+        assert dict(
+            Product.objects.values_list('slug', 'updated_at')
+        ) == updated_at
+        assert set(
+            ProductImage.objects.values_list('id', flat=True)
+        ) == image_ids
+
+    def test_update(self, media_root, images_dir):
+        run_import(make_rows(), images_dir)
+        before = Product.objects.get(slug='supplier_1')
+        rows = make_rows(changes={
+            1: {'price': '99.5', 'images': 'blue.jpg'},
+        })
+        for row in rows:
+            if row['category_slug'] == 'category_0':
+                row['category'] = 'Новая категория'
+        report = run_import(rows, images_dir)
+        assert report.updated[Product] == 1
+        assert report.unchanged[Product] == 19
+        assert report.updated[Category] == 1
+        assert Category.objects.get(slug='category_0').name == (
+            'Новая категория'
+        )
+        product = Product.objects.get(slug='supplier_1')
+        assert product.price == 99.5
+        assert product.updated_at > before.updated_at
+        assert product.product_images.count() == 1
+        assert report.deleted[ProductImage] == 2
+        assert report.created[ProductImage] == 1
+
+    def test_invalid_rows(self, media_root, images_dir):
+        report = run_import(make_rows(changes={
+            1: {'price': '0'},
+            2: {'slug': 'не slug'},
+            3: {'images': 'broken.jpg red.png'},
+            4: {'images': '../outside.png'},
+        }), images_dir)
+        assert Product.objects.count() == 18, (
+            'Записи с ошибками пропускаются, остальные сохраняются'
+        )
+        assert report.error_count == 4
+        assert any('Запись 2' in error for error in report.errors)
+        assert not Product.objects.get(
+            slug='supplier_3'
+        ).product_images.exists(), (
+            'С непрочитанным изображением изображения записи не меняются'
+        )
+        assert not Product.objects.get(
+            slug='supplier_4'
+        ).product_images.exists()
+
+    def test_failed_image_keeps_existing(self, media_root, images_dir):
+        run_import(make_rows(), images_dir)
+        product = Product.objects.get(slug='supplier_1')
+        names = list(product.product_images.values_list('image', flat=True))
+        report = run_import(make_rows(changes={
+            1: {'images': 'blue.jpg broken.jpg'},
+        }), images_dir)
+        assert report.error_count == 1
+        assert not report.deleted[ProductImage]
+        assert list(
+            product.product_images.values_list('image', flat=True)
+        ) == names, 'Изображения не удаляются, если новое не прочитано'
+
+    def test_images_deleted_at_once(self, monkeypatch, media_root,
+                                    images_dir):
+        run_import(make_rows(), images_dir)
+        bumps = []
+        monkeypatch.setattr(
+            'products.models.bump_version', bumps.append
+        )
+        with CaptureQueriesContext(connection) as context:
+            report = run_import(make_rows(changes={
+                number: {'images': 'blue.jpg'} for number in range(20)
+            }), images_dir)
+        assert report.deleted[ProductImage] == 30
+        assert len([
+            query for query in context.captured_queries
+            if query['sql'].startswith('DELETE')
+        ]) == 1
+        assert bumps == [CATALOG], (
+            'Старые изображения удаляются одним запросом с одним '
+            'сбросом версии'
+        )
+
+    def test_process_pool(self, media_root, images_dir):
+        report = run_import(make_rows(), images_dir, workers=2)
+        assert report.created[ProductImage] == 30
+        assert not report.errors
+
+    def test_ndjson(self, media_root, images_dir):
+        record = {
+            'slug': 'nested', 'name': 'Вложенный', 'price': 15,
+            'category': {'slug': 'c', 'name': 'Категория'},
+            'subcategory': {'slug': 's', 'name': 'Подкатегория'},
+            'images': ['red.png'],
+        }
+        report = CatalogImport(images_dir=images_dir, workers=0).run(
+            iter_records(StringIO(json.dumps(record) + '\n'), 'ndjson')
+        )
+        assert report.created[Product] == 1
+        assert Product.objects.get(slug='nested').subcategory.slug == 's'
+
+    def test_command(self, media_root, images_dir):
+        path = images_dir / 'catalog.csv'
+        path.write_text(to_csv(make_rows()), encoding='utf-8')
+        out = StringIO()
+        call_command('import_catalog', str(path), workers=0, stdout=out)
+        assert Product.objects.count() == 20
+        output = out.getvalue()
+        assert 'Продукты: создано 20' in output
+        for phase in ('чтение и проверка', 'продукты', 'изображения'):
+            assert phase in output, 'Команда выводит время этапов'
+        assert 'строк/с' in output
+
+
+@pytest.mark.django_db
+class TestCatalogImportAPI:
+    url = '/api/products/import/'
+
+    def upload(self):
+        return SimpleUploadedFile(
+            'catalog.csv', to_csv(make_rows()).encode(), 'text/csv'
+        )
+
+    def test_staff_only(self, user_client, media_root, images_dir):
+        response = user_client.post(
+            self.url, {'file': self.upload()}, format='multipart'
+        )
+        assert response.status_code == HTTPStatus.FORBIDDEN
+
+    def test_import(self, admin_user, media_root, images_dir):
+        client = APIClient()
+        client.force_authenticate(admin_user)
+        response = client.post(
+            self.url, {'file': self.upload()}, format='multipart'
+        )
+        assert response.status_code == HTTPStatus.OK
+        data = response.json()
+        assert data['product']['created'] == 20
+        assert data['productimage']['created'] == 30
+        assert set(data['timings']) >= {'products', 'images'}
+        assert Product.objects.count() == 20
+
+    def test_bad_file(self, admin_user, media_root):
+        client = APIClient()
+        client.force_authenticate(admin_user)
+        response = client.post(self.url, {'file': SimpleUploadedFile(
+            'catalog.csv', b'slug,name\nx,y\n', 'text/csv'
+        )}, format='multipart')
+        assert response.status_code == HTTPStatus.BAD_REQUEST
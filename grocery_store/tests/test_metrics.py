@@ -0,0 +1,118 @@
+import re
+from http import HTTPStatus
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from grocery_store.metrics import registry
+from .test_async_views import async_request
+
+SERVER_TIMING = re.compile(
+    r'db;dur=[\d.]+;desc="(\d+) queries", render;dur=([\d.]+), '
+    r'total;dur=([\d.]+)'
+)
+
+
+@pytest.fixture(autouse=True)
+def clear_registry():
+    registry.clear()
+    yield
+    registry.clear()
+
+
+@pytest.fixture(autouse=True)
+def metrics_allowed(settings):
+    settings.METRICS_ALLOWED_IPS = ['127.0.0.1']
+
+
+def metric(text, name, **labels):
+    selector = ','.join(f'{key}="{value}"' for key, value in labels.items())
+    match = re.search(
+        rf'^{name}{{{re.escape(selector)}}} (\S+)$', text, re.MULTILINE
+    )
+    assert match, f'Метрики {name}{{{selector}}} нет в /metrics'
+    return float(match.group(1))
+
+
+@pytest.mark.django_db
+class TestMetrics:
+
+    def test_server_timing(self, client, store):
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get('/api/products/')
+        match = SERVER_TIMING.fullmatch(response['Server-Timing'])
+        assert match, 'Неверный формат заголовка Server-Timing'
+        assert int(match.group(1)) == len(queries)
+        assert float(match.group(2)) > 0, (
+            'Время рендеринга JSON должно учитываться'
+        )
+        assert float(match.group(2)) <= float(match.group(3))
+
+    def test_histograms(self, client, store):
+        client.get('/api/products/')
+        client.get('/api/products/')
+        client.get('/api/products/999999/')
+        text = client.get('/metrics').content.decode()
+        labels = {'view': 'product-list', 'method': 'GET'}
+        assert metric(
+            text, 'http_request_duration_seconds_count', **labels
+        ) == 2
+        assert metric(
+            text, 'http_request_duration_seconds_bucket', **labels, le='+Inf'
+        ) == 2
+        assert metric(text, 'http_request_db_queries_count', **labels) == 2
+        assert metric(text, 'http_response_size_bytes_sum', **labels) > 0
+        assert metric(
+            text, 'http_responses_total',
+            view='product-detail', method='GET', status=404
+        ) == 1
+        assert 'cache_hits_total{cache="catalog"}' in text
+
+    def test_cumulative_buckets(self, client, store):
+        client.get('/api/categories/')
+        text = client.get('/metrics').content.decode()
+        buckets = [
+            float(value) for value in re.findall(
+                r'^http_request_db_queries_bucket'
+                r'{view="category-list",method="GET",le="[^"]+"} (\S+)$',
+                text, re.MULTILINE
+            )
+        ]
+        assert buckets == sorted(buckets)
+        assert buckets[-1] == 1
+
+    def test_async_views(self, store):
+        response = async_request('get', '/api/products/')
+        match = SERVER_TIMING.fullmatch(response['Server-Timing'])
+        assert match and int(match.group(1)) > 0, (
+            'SQL-запросы асинхронных вьюх тоже должны учитываться'
+        )
+        text = async_request('get', '/metrics').content.decode()
+        assert metric(
+            text, 'http_request_duration_seconds_count',
+            view='product-list', method='GET'
+        ) == 1
+
+    def test_disabled(self, client, settings):
+        settings.METRICS_ENABLED = False
+        assert 'Server-Timing' not in client.get('/api/categories/')
+
+    def test_access(self, client, settings):
+        settings.METRICS_ALLOWED_IPS = []
+        settings.METRICS_TOKEN = 'secret'
+        assert client.get('/metrics').status_code == HTTPStatus.NOT_FOUND, (
+            '/metrics не должен быть доступен анонимным запросам'
+        )
+        assert client.get(
+            '/metrics', headers={'Authorization': 'Bearer wrong'}
+        ).status_code == HTTPStatus.NOT_FOUND
+        assert client.get(
+            '/metrics', headers={'Authorization': 'Bearer secret'}
+        ).status_code == HTTPStatus.OK
+        settings.METRICS_TOKEN = ''
+        assert client.get(
+            '/metrics', headers={'Authorization': 'Bearer '}
+        ).status_code == HTTPStatus.NOT_FOUND
+        settings.METRICS_ALLOWED_IPS = ['127.0.0.1']
+        assert client.get('/metrics').status_code == HTTPStatus.OK
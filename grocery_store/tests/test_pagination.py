@@ -0,0 +1,80 @@
+from http import HTTPStatus
+
+import pytest
+
+from products.models import Category
+
+
+@pytest.mark.django_db
+class TestKeysetPagination:
+
+    product_url = '/api/products/'
+    category_url = '/api/categories/'
+
+    def collect(self, client, url, params):
+        response = client.get(url, params)
+        assert response.status_code == HTTPStatus.OK
+        pages = [response.json()]
+        while pages[-1]['next']:
+            response = client.get(pages[-1]['next'])
+            assert response.status_code == HTTPStatus.OK
+            pages.append(response.json())
+        return pages
+
+    def test_page_number_by_default(self, client, catalog):
+        test_data = client.get(self.product_url).json()
+        assert test_data['count'] == len(catalog), (
+            'Без параметра `pagination` должна использоваться '
+            'постраничная пагинация.'
+        )
+
+    def test_product_keyset_walk(self, client, catalog):
+        pages = self.collect(
+            client, self.product_url, {'pagination': 'keyset', 'page_size': 40}
+        )
+        assert 'count' not in pages[0], (
+            'Пагинация по курсору не должна считать общее число продуктов.'
+        )
+        slugs = [
+            product['slug'] for page in pages for product in page['results']
+        ]
+        assert slugs == [product.slug for product in catalog], (
+            'Обход по курсору должен вернуть все продукты ровно один раз.'
+        )
+        assert len(pages) == 8
+
+    def test_product_keyset_page_size_cap(self, client, catalog):
+        test_data = client.get(
+            self.product_url, {'pagination': 'keyset', 'page_size': 1000}
+        ).json()
+        assert len(test_data['results']) == 100
+
+    def test_product_keyset_queries(
+        self, client, catalog, django_assert_num_queries
+    ):
+        first_page = client.get(
+            self.product_url, {'pagination': 'keyset'}
+        ).json()
+        # Без COUNT(*): продукты с JOIN и изображения.
+        with django_assert_num_queries(2):
+            response = client.get(first_page['next'])
+        assert response.status_code == HTTPStatus.OK
+
+    def test_invalid_cursor(self, client, catalog):
+        response = client.get(self.product_url, {'cursor': '!!!'})
+        assert response.status_code == HTTPStatus.NOT_FOUND
+
+    def test_category_keyset_walk(self, client, category_1):
+        categories = [category_1] + [
+            Category.objects.create(
+                name=f'Категория {number}', slug=f'category_{number}'
+            )
+            for number in range(2, 8)
+        ]
+        pages = self.collect(
+            client, self.category_url, {'pagination': 'keyset', 'page_size': 3}
+        )
+        slugs = [
+            category['slug'] for page in pages for category in page['results']
+        ]
+        assert slugs == [category.slug for category in categories]
@@ -0,0 +1,115 @@
+from http import HTTPStatus
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from products.models import Category, Product, Subcategory
+
+
+@pytest.fixture
+def shelves(category_1, subcategory_1):
+    category_2 = Category.objects.create(name='Категория 2', slug='category_2')
+    subcategory_2 = Subcategory.objects.create(
+        name='Подкатегория 2', slug='subcategory_2', category=category_1
+    )
+    subcategory_3 = Subcategory.objects.create(
+        name='Подкатегория 3', slug='subcategory_3', category=category_2
+    )
+    subcategories = (subcategory_1, subcategory_2, subcategory_3)
+    Product.objects.bulk_create(
+        Product(
+            name=f'Продукт {number:03}',
+            slug=f'shelf_product_{number}',
+            price=(number * 37) % 100 + 1,
+            category=subcategories[number % 3].category,
+            subcategory=subcategories[number % 3]
+        )
+        for number in range(300)
+    )
+    return subcategories
+
+
+@pytest.mark.django_db
+class TestProductFilters:
+
+    product_url = '/api/products/'
+
+    def get_products(self, client, **params):
+        response = client.get(self.product_url, params)
+        assert response.status_code == HTTPStatus.OK, (
+            f'GET-запрос к `{self.product_url}` с фильтрами должен '
+            'возвращать ответ со статусом 200.'
+        )
+        return response.json()
+
+    def test_filter_by_subcategory_ordered_by_price(self, client, shelves):
+        data = self.get_products(
+            client, subcategory='subcategory_2', ordering='price'
+        )
+        expected = Product.objects.filter(subcategory=shelves[1])
+        assert data['count'] == expected.count(), (
+            'Фильтр по подкатегории должен оставлять только её продукты.'
+        )
+        prices = [product['price'] for product in data['results']]
+        assert prices == sorted(prices), (
+            'Продукты должны быть отсортированы по цене.'
+        )
+        assert {product['subcategory'] for product in data['results']} == {
+            shelves[1].name
+        }
+
+    def test_filter_by_category_and_price(self, client, shelves):
+        data = self.get_products(
+            client, category='category_1', min_price=20, max_price=40,
+            ordering='-name'
+        )
+        expected = Product.objects.filter(
+            category__slug='category_1', price__gte=20, price__lte=40
+        ).order_by('-name')
+        assert data['count'] == expected.count()
+        names = [product['name'] for product in data['results']]
+        assert names == list(
+            expected.values_list('name', flat=True)[:len(names)]
+        ), 'Фильтры по категории и цене должны применяться вместе.'
+
+    @pytest.mark.parametrize('params', (
+        {'ordering': 'slug'},
+        {'min_price': 'дёшево'},
+        {'min_price': 50, 'max_price': 10},
+        {'ordering': 'price', 'pagination': 'keyset'},
+    ))
+    def test_invalid_params(self, client, shelves, params):
+        response = client.get(self.product_url, params)
+        assert response.status_code == HTTPStatus.BAD_REQUEST, (
+            'Неверные параметры фильтрации должны возвращать ответ '
+            'со статусом 400.'
+        )
+
+    @pytest.mark.skipif(
+        connection.vendor != 'sqlite', reason='План запроса SQLite.'
+    )
+    @pytest.mark.parametrize('params, index', (
+        ({'subcategory': 'subcategory_1', 'ordering': 'price'},
+         'product_subcategory_price_idx'),
+        ({'category': 'category_1', 'ordering': '-price'},
+         'product_category_price_idx'),
+        ({'ordering': 'price'}, 'product_price_idx'),
+    ))
+    def test_filtered_query_uses_index(self, client, shelves, params, index):
+        with CaptureQueriesContext(connection) as context:
+            self.get_products(client, **params)
+        sql = next(
+            query['sql'] for query in context.captured_queries
+            if 'ORDER BY' in query['sql'] and 'LIMIT' in query['sql']
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            plan = ' '.join(row[-1] for row in cursor.fetchall())
+        assert f'USING INDEX {index}' in plan, (
+            f'Запрос с параметрами {params} должен использовать индекс '
+            f'{index}, план: {plan}'
+        )
+        assert 'USE TEMP B-TREE FOR ORDER BY' not in plan, (
+            'Сортировка должна браться из индекса.'
+        )
@@ -0,0 +1,93 @@
+from http import HTTPStatus
+
+import pytest
+
+from products.models import CartItem, ShoppingCart
+
+
+@pytest.mark.django_db
+class TestProductQueries:
+    """Число запросов к БД не зависит от количества продуктов."""
+
+    product_url = '/api/products/'
+    product_detail_url = '/api/products/{id}/'
+    shopping_cart_url = '/api/products/{id}/shopping_cart/'
+    cart_url = '/api/shopping_cart/'
+
+    def fill_shopping_cart(self, user, products):
+        shopping_cart, _ = ShoppingCart.objects.get_or_create(user=user)
+        for product in products:
+            CartItem.objects.create(
+                shopping_cart=shopping_cart,
+                product=product,
+                product_quantity=2
+            )
+
+    def test_product_list_queries(
+        self, client, catalog, django_assert_num_queries
+    ):
+        # COUNT для пагинации, продукты с JOIN, изображения.
+        with django_assert_num_queries(3):
+            response = client.get(self.product_url)
+        assert response.status_code == HTTPStatus.OK
+        for product in response.json()['results']:
+            assert len(product['images']) == 3, (
+                f'Каждый продукт в ответе `{self.product_url}` '
+                'должен содержать все свои изображения.'
+            )
+
+    def test_product_list_last_page_queries(
+        self, client, catalog, django_assert_num_queries
+    ):
+        with django_assert_num_queries(3):
+            response = client.get(self.product_url, {'page': 60})
+        assert response.status_code == HTTPStatus.OK
+
+    def test_product_detail_queries(
+        self, client, catalog, django_assert_num_queries
+    ):
+        with django_assert_num_queries(2):
+            response = client.get(
+                self.product_detail_url.format(id=catalog[0].id)
+            )
+        assert response.status_code == HTTPStatus.OK
+        assert response.json()['category'] == catalog[0].category.name
+
+    def test_shopping_cart_post_queries(
+        self, user_client, catalog, django_assert_num_queries
+    ):
+        url = self.shopping_cart_url.format(id=catalog[0].id)
+        user_client.post(url)
+        # Токен уже в кэше. Продукт, изображения, UPDATE итогов корзины,
+        # UPDATE позиции с F(), чтение позиции и SAVEPOINT/RELEASE
+        # транзакции внутри тестовой транзакции.
+        with django_assert_num_queries(7):
+            response = user_client.post(url)
+        assert response.status_code == HTTPStatus.CREATED
+        assert len(response.json()['product']['images']) == 3
+
+    def test_shopping_cart_patch_queries(
+        self, user_client, catalog, django_assert_max_num_queries
+    ):
+        url = self.shopping_cart_url.format(id=catalog[0].id)
+        user_client.post(url)
+        with django_assert_max_num_queries(10):
+            response = user_client.patch(
+                url, data={'product_quantity': 3}, format='json'
+            )
+        assert response.status_code == HTTPStatus.OK
+        assert len(response.json()['product']['images']) == 3
+
+    @pytest.mark.parametrize('cart_size', (5, 200))
+    def test_cart_queries(
+        self, user, user_client, catalog, cart_size,
+        django_assert_num_queries
+    ):
+        self.fill_shopping_cart(user, catalog[:cart_size])
+        # Токен, корзина с суммами, позиции с продуктами, изображения.
+        with django_assert_num_queries(4):
+            response = user_client.get(self.cart_url)
+        assert response.status_code == HTTPStatus.OK
+        test_data = response.json()
+        assert len(test_data['products']) == cart_size
+        assert test_data['total_quantity'] == cart_size * 2
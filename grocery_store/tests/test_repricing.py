@@ -0,0 +1,98 @@
+from math import isclose
+
+import pytest
+from django.db.models import Sum
+
+from products.models import CartItem, Product, ShoppingCart
+
+
+def assert_consistent(shopping_cart):
+    shopping_cart.refresh_from_db()
+    for cart_item in shopping_cart.cart_items.select_related('product'):
+        assert cart_item.product_price == (
+            cart_item.product_quantity * cart_item.product.price
+        ), 'Стоимость позиции должна считаться по текущей цене'
+    totals = shopping_cart.cart_items.aggregate(
+        quantity=Sum('product_quantity'), price=Sum('product_price')
+    )
+    assert shopping_cart.total_quantity == totals['quantity']
+    assert isclose(shopping_cart.total_price, totals['price']), (
+        'Итоги корзины должны совпадать с её позициями'
+    )
+
+
+@pytest.mark.django_db
+class TestRepricing:
+
+    def test_save(self, store, catalog):
+        product = Product.objects.get(pk=catalog[2].pk)
+        product.price = 1000
+        product.save()
+        cart_item = CartItem.objects.get(product=product)
+        assert cart_item.product_price == 3 * 1000
+        assert_consistent(store)
+
+    def test_save_without_price_change(self, store, catalog,
+                                       django_assert_num_queries):
+        product = Product.objects.get(pk=catalog[2].pk)
+        product.name = 'Новое название'
+        with django_assert_num_queries(1):
+            product.save()
+        with django_assert_num_queries(1):
+            product.save(update_fields=('name',))
+
+    def test_queryset_update(self, user, store, catalog,
+                             django_assert_num_queries):
+        # Выборка id, UPDATE продуктов, корзин и позиций.
+        with django_assert_num_queries(4):
+            Product.objects.filter(price__lte=5).update(price=500)
+        assert_consistent(store)
+        assert set(
+            CartItem.objects.filter(
+                product__price=500
+            ).values_list('product_price', flat=True)
+        ) == {500.0, 1000.0, 1500.0, 2000.0, 2500.0}
+
+    def test_bulk_update(self, store, catalog, django_assert_num_queries):
+        products = list(Product.objects.filter(pk__in=[
+            product.pk for product in catalog[5:15]
+        ]))
+        for product in products:
+            product.price = product.price * 2
+        # Выборка id, UPDATE продуктов, корзин и позиций: пересчёт
+        # идёт один раз, через update().
+        with django_assert_num_queries(4):
+            Product.objects.bulk_update(products, ['price'])
+        assert_consistent(store)
+
+    def test_batches(self, store, catalog):
+        Product.objects.filter(
+            pk__in=[product.pk for product in catalog[:10]]
+        ).update(price=7)
+        assert_consistent(store)
+        CartItem.objects.filter(product__in=catalog[:10]).update(
+            product_price=0
+        )
+        ShoppingCart.objects.update(total_price=0)
+        # Рассинхрон итогов не исправляется: сдвигается только разница.
+        assert CartItem.objects.reprice_products(
+            [product.pk for product in catalog[:10]], batch_size=3
+        ) == 10
+        assert set(CartItem.objects.values_list(
+            'product_price', flat=True
+        )) == {7.0 * quantity for quantity in range(1, 11)}
+
+    def test_several_carts(self, django_user_model, store, catalog):
+        other = ShoppingCart.objects.create(
+            user=django_user_model.objects.create_user(
+                username='Other', password='1234567'
+            )
+        )
+        CartItem.objects.create(
+            shopping_cart=other, product=catalog[0], product_quantity=4
+        )
+        product = Product.objects.get(pk=catalog[0].pk)
+        product.price = 0.5 + product.price
+        product.save()
+        assert_consistent(store)
+        assert_consistent(other)
@@ -0,0 +1,105 @@
+from http import HTTPStatus
+
+import pytest
+
+from api.response_cache import FileCache, LRUCache, cache_stats
+from products.models import ProductImage
+
+
+@pytest.mark.django_db
+class TestResponseCache:
+
+    product_url = '/api/products/'
+    product_detail_url = '/api/products/{id}/'
+    category_url = '/api/categories/'
+
+    def test_repeated_get_served_from_cache(
+        self, client, catalog, django_assert_num_queries
+    ):
+        first = client.get(self.product_url, {'page': 2})
+        assert first['X-Cache'] == 'MISS'
+        with django_assert_num_queries(0):
+            second = client.get(self.product_url, {'page': 2})
+        assert second.status_code == HTTPStatus.OK
+        assert second['X-Cache'] == 'HIT'
+        assert second.content == first.content, (
+            'Ответ из кэша должен совпадать с исходным ответом.'
+        )
+
+    def test_query_params_order(self, client, catalog):
+        client.get(self.product_url, {'pagination': 'keyset', 'page_size': 3})
+        response = client.get(
+            f'{self.product_url}?page_size=3&pagination=keyset'
+        )
+        assert response['X-Cache'] == 'HIT'
+
+    def test_invalidation_on_product_change(self, client, catalog):
+        url = self.product_detail_url.format(id=catalog[0].id)
+        client.get(url)
+        catalog[0].name = 'Новое название'
+        catalog[0].save()
+        response = client.get(url)
+        assert response['X-Cache'] == 'MISS'
+        assert response.json()['name'] == 'Новое название', (
+            'После изменения продукта кэш должен сбрасываться.'
+        )
+
+        ProductImage.objects.create(
+            product=catalog[0], image='products/new.jpg'
+        )
+        assert len(client.get(url).json()['images']) == 4
+
+    def test_invalidation_on_category_change(self, client, category_1):
+        client.get(self.category_url)
+        category_1.name = 'Новая категория'
+        category_1.save()
+        response = client.get(self.category_url)
+        assert response.json()['results'][0]['name'] == 'Новая категория'
+
+    def test_cached_headers(self, client, catalog):
+        first = client.get(self.product_url)
+        second = client.get(self.product_url)
+        assert second['X-Cache'] == 'HIT'
+        for header in ('Content-Type', 'Vary', 'Allow', 'ETag'):
+            assert second[header] == first[header], (
+                f'Ответ из кэша должен содержать заголовок {header}.'
+            )
+
+    def test_not_found_not_cached(self, client, catalog):
+        url = self.product_detail_url.format(id=catalog[-1].id + 1)
+        assert client.get(url).status_code == HTTPStatus.NOT_FOUND
+        assert client.get(url).status_code == HTTPStatus.NOT_FOUND
+
+
+class TestCacheBackends:
+
+    def check_backend(self, cache, location, evictions=True):
+        cache.clear()
+        before = cache_stats().get(location, {})
+        for number in range(3):
+            cache.set(f'key_{number}', number)
+        assert cache.get('key_0') == 0
+        cache.set('key_3', 3)
+        assert cache.get('missing') is None
+        after = cache_stats()[location]
+        assert after['hits'] - before.get('hits', 0) == 1
+        assert after['misses'] - before.get('misses', 0) == 1
+        if evictions:
+            assert after['evictions'] > before.get('evictions', 0)
+
+    def test_lru_cache(self):
+        cache = LRUCache('test_lru', {'OPTIONS': {'MAX_ENTRIES': 3}})
+        self.check_backend(cache, 'test_lru')
+        assert cache.get('key_1') is None, (
+            'Должна вытесняться наименее востребованная запись.'
+        )
+        assert cache.get('key_0') == 0
+        assert cache.get('key_2') == 2
+
+    def test_file_cache(self, tmp_path):
+        cache = FileCache(
+            tmp_path,
+            {'OPTIONS': {'MAX_ENTRIES': 3, 'CULL_FREQUENCY': 3}}
+        )
+        self.check_backend(cache, str(tmp_path), evictions=False)
+        assert len(list(tmp_path.iterdir())) <= 3
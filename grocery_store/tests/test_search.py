@@ -0,0 +1,234 @@
+import time
+from datetime import timedelta
+from http import HTTPStatus
+from io import StringIO
+
+import pytest
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.management import call_command
+from django.utils import timezone
+
+from products import search
+from products.models import Product, SearchIndexChange
+from products.search import PRODUCT, SearchIndex, search_index, stem
+from products.versions import SEARCH_INDEX, get_version, version_key
+
+
+@pytest.fixture
+def dairy(category_1, subcategory_1):
+    subcategory_1.name = 'Молочные продукты'
+    subcategory_1.save()
+    names = (
+        'Молоко 3,2%', 'Коктейль молочный', 'Кофе молотый',
+        'Сыр маасдам', 'Хлеб ржаной',
+    )
+    return {
+        name: Product.objects.create(
+            name=name,
+            slug=f'dairy_{number}',
+            price=100,
+            category=category_1,
+            subcategory=subcategory_1
+        )
+        for number, name in enumerate(names)
+    }
+
+
+@pytest.mark.django_db
+class TestProductSearch:
+
+    search_url = '/api/products/search/'
+
+    def search(self, client, query):
+        response = client.get(self.search_url, {'q': query})
+        assert response.status_code == HTTPStatus.OK, (
+            f'GET-запрос к `{self.search_url}` должен возвращать ответ '
+            'со статусом 200.'
+        )
+        return [product['name'] for product in response.json()['results']]
+
+    def test_word_forms(self):
+        assert stem('молоко') == stem('молочный') == stem('молочная'), (
+            'Формы слова должны приводиться к одной основе.'
+        )
+        assert stem('творог') == stem('творожный')
+
+    def test_search_ranked(self, client, dairy):
+        names = self.search(client, 'молоко')
+        assert names[:2] == ['Молоко 3,2%', 'Коктейль молочный'], (
+            'Продукты с формой слова в названии должны идти первыми.'
+        )
+        assert 'Сыр маасдам' in names, (
+            'Поиск должен учитывать название подкатегории.'
+        )
+
+    def test_prefix_and_typo(self, client, dairy):
+        assert self.search(client, 'ржан') == ['Хлеб ржаной'], (
+            'Поиск должен находить продукты по началу слова.'
+        )
+        assert self.search(client, 'маасдан') == ['Сыр маасдам'], (
+            'Поиск должен находить продукты с опечаткой в запросе.'
+        )
+
+    def test_all_words_required(self, client, dairy):
+        assert self.search(client, 'хлеб кофе') == [], (
+            'Продукт должен подходить под все слова запроса.'
+        )
+        assert self.search(client, 'сыр молочный') == ['Сыр маасдам']
+
+    def test_empty_query(self, client):
+        response = client.get(self.search_url)
+        assert response.status_code == HTTPStatus.BAD_REQUEST, (
+            'Запрос без параметра `q` должен возвращать ответ '
+            'со статусом 400.'
+        )
+
+    def test_incremental_update(
+        self, client, dairy, monkeypatch, django_capture_on_commit_callbacks
+    ):
+        assert self.search(client, 'кефир') == []
+        search_index.ensure_built()
+        monkeypatch.setattr(SearchIndex, 'build', lambda self: pytest.fail(
+            'Изменения должны применяться без перестроения индекса.'
+        ))
+        with django_capture_on_commit_callbacks(execute=True):
+            product = dairy['Хлеб ржаной']
+            product.name = 'Кефир'
+            product.save()
+            dairy['Сыр маасдам'].delete()
+        assert self.search(client, 'кефир') == ['Кефир'], (
+            'Изменение продукта должно попадать в индекс.'
+        )
+        assert self.search(client, 'маасдам') == [], (
+            'Удалённый продукт должен пропадать из индекса.'
+        )
+        assert len(search_index.products) == len(dairy) - 1
+
+    def test_category_rename(
+        self, client, dairy, subcategory_1, django_capture_on_commit_callbacks
+    ):
+        search_index.ensure_built()
+        with django_capture_on_commit_callbacks(execute=True):
+            subcategory_1.name = 'Бакалея'
+            subcategory_1.save()
+        assert len(self.search(client, 'бакалея')) == len(dairy)
+
+    def test_rebuild_command(self, dairy):
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        assert 'Проиндексировано продуктов: 5' in out.getvalue()
+
+    def test_changes_replayed_by_other_processes(
+        self, dairy, monkeypatch, django_capture_on_commit_callbacks
+    ):
+        workers = [SearchIndex(), SearchIndex()]
+        for worker in workers:
+            worker.ensure_built()
+        monkeypatch.setattr(SearchIndex, 'build', lambda self: pytest.fail(
+            'Изменение продукта не должно перестраивать индексы.'
+        ))
+        with django_capture_on_commit_callbacks(execute=True):
+            product = dairy['Хлеб ржаной']
+            product.name = 'Кефир'
+            product.save()
+        for worker in workers:
+            assert worker.search('кефир') == [product.pk], (
+                'Каждый процесс применяет изменения из журнала.'
+            )
+            assert worker.search('ржаной') == []
+
+    def test_rebuild_seen_by_other_processes(
+        self, settings, tmp_path, dairy, category_1, subcategory_1
+    ):
+        settings.CACHES = {**settings.CACHES, 'versions': {
+            **settings.VERSIONS_CACHES['file'], 'LOCATION': tmp_path,
+        }}
+        other_process = FileBasedCache(tmp_path, {})
+        worker = SearchIndex()
+        worker.ensure_built()
+        # bulk_create обходит сигналы и журнал.
+        Product.objects.bulk_create([Product(
+            name='Кефир', slug='kefir', price=100,
+            category=category_1, subcategory=subcategory_1
+        )])
+        call_command('rebuild_search_index', stdout=StringIO())
+        assert other_process.get(version_key(SEARCH_INDEX)) == (
+            get_version(SEARCH_INDEX)
+        ), 'Версия индекса общая для процессов.'
+        assert len(worker.search('кефир')) == 1, (
+            'После rebuild_search_index процессы перестраивают индекс.'
+        )
+        assert not SearchIndexChange.objects.exists()
+
+    def test_changes_committed_out_of_order(self, dairy):
+        worker = SearchIndex()
+        worker.ensure_built()
+        last_change = worker._last_change
+        bread, cheese = dairy['Хлеб ржаной'], dairy['Сыр маасдам']
+        # Запись с меньшим id ещё в транзакции импорта, с большим —
+        # уже зафиксирована.
+        Product.objects.filter(pk=cheese.pk).update(name='Творог')
+        SearchIndexChange.objects.create(
+            id=last_change + 2, kind=PRODUCT, object_id=cheese.pk
+        )
+        assert worker.search('творог') == [cheese.pk]
+        Product.objects.filter(pk=bread.pk).update(name='Кефир')
+        SearchIndexChange.objects.create(
+            id=last_change + 1, kind=PRODUCT, object_id=bread.pk
+        )
+        assert worker.search('кефир') == [bread.pk], (
+            'Запись, зафиксированная после записи с большим id, '
+            'должна применяться.'
+        )
+        assert not worker._gaps
+
+    def test_gap_after_restart(self, dairy):
+        first, last = (
+            SearchIndexChange.objects.create(kind=PRODUCT, object_id=0).pk
+            for _ in range(2)
+        )
+        SearchIndexChange.objects.filter(pk=first).delete()
+        SearchIndexChange.objects.create(
+            id=first - 1, kind=PRODUCT, object_id=0
+        )
+        worker = SearchIndex()
+        worker.ensure_built()
+        assert worker._last_change == last
+        assert list(worker._gaps) == [first], (
+            'Индекс должен ждать записи с пропущенными id.'
+        )
+
+    def test_old_changes_pruned(self, dairy):
+        old = SearchIndexChange.objects.create(kind=PRODUCT, object_id=0)
+        SearchIndexChange.objects.filter(pk=old.pk).update(
+            created_at=timezone.now() - timedelta(
+                seconds=search.CHANGES_RETENTION + 1
+            )
+        )
+        worker = SearchIndex()
+        worker.record(PRODUCT, [dairy['Кофе молотый'].pk])
+        assert not SearchIndexChange.objects.filter(pk=old.pk).exists(), (
+            'Запись в журнал должна удалять устаревшие записи.'
+        )
+        assert SearchIndexChange.objects.count() == 1
+        SearchIndexChange.objects.update(created_at=timezone.now() - timedelta(
+            seconds=search.CHANGES_RETENTION + 1
+        ))
+        worker.record(PRODUCT, [dairy['Кофе молотый'].pk])
+        assert SearchIndexChange.objects.count() == 2, (
+            'Устаревшие записи удаляются не чаще CHANGES_PRUNE_INTERVAL.'
+        )
+
+    def test_stale_process_rebuilds(self, dairy, monkeypatch):
+        worker = SearchIndex()
+        worker.ensure_built()
+        worker._synced_at = time.time() - search.CHANGES_RETENTION
+        built = []
+        monkeypatch.setattr(
+            SearchIndex, 'build', lambda self: built.append(self)
+        )
+        worker.ensure_built()
+        assert built == [worker], (
+            'Процесс, не читавший журнал дольше срока хранения, '
+            'должен перестраивать индекс.'
+        )
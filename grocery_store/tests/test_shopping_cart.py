@@ -1,6 +1,14 @@
 from http import HTTPStatus
+from io import StringIO
+from threading import Thread
 
 import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Sum
+from rest_framework.test import APIClient
+
+from products.models import CartItem, ShoppingCart
 
 
 @pytest.mark.django_db
@@ -20,9 +28,9 @@ class TestShoppingCartAPI:
         response = client.post(
             self.shopping_cart_url.format(id=product_1.id)
         )
-        assert response.status_code == HTTPStatus.UNAUTHORIZED, (
+        assert response.status_code == HTTPStatus.CREATED, (
             f'POST-запрос к `{self.shopping_cart_url}` неавторизованного '
-            'пользователя должен возвращать ответ со статусом 401.'
+            'пользователя должен добавлять продукт в корзину гостя.'
         )
 
     def test_shopping_cart_auth(self, user_client, product_1):
@@ -51,3 +59,254 @@ class TestShoppingCartAPI:
                 f'В ответе на POST-запрос к {self.shopping_cart_url} '
                 f'поле `product` должно содержать {field}.'
             )
+
+
+@pytest.mark.django_db(transaction=True)
+class TestShoppingCartConcurrency:
+
+    shopping_cart_url = '/api/products/{id}/shopping_cart/'
+    cart_url = '/api/shopping_cart/'
+    threads = 8
+    requests_per_thread = 10
+
+    def add_product(self, token, url, statuses):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+        try:
+            for _ in range(self.requests_per_thread):
+                statuses.append(client.post(url).status_code)
+        finally:
+            connection.close()
+
+    def test_concurrent_post_keeps_all_increments(
+        self, user, token_user, product_1
+    ):
+        url = self.shopping_cart_url.format(id=product_1.id)
+        statuses = []
+        workers = [
+            Thread(
+                target=self.add_product,
+                args=(token_user['auth_token'], url, statuses)
+            )
+            for _ in range(self.threads)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        total = self.threads * self.requests_per_thread
+        assert statuses == [HTTPStatus.CREATED] * total
+        cart_items = CartItem.objects.filter(shopping_cart__user=user)
+        assert cart_items.count() == 1, (
+            'Параллельные POST-запросы не должны создавать дубли позиции.'
+        )
+        cart_item = cart_items.get()
+        assert cart_item.product_quantity == total, (
+            'Параллельные POST-запросы не должны терять увеличения.'
+        )
+        assert cart_item.product_price == total * product_1.price
+        shopping_cart = ShoppingCart.objects.get(user=user)
+        assert shopping_cart.total_quantity == total, (
+            'Итоги корзины должны учитывать все параллельные увеличения.'
+        )
+
+    def send_batches(self, token, product, statuses):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+        try:
+            for _ in range(self.requests_per_thread):
+                statuses.append(client.patch(self.cart_url, data={
+                    'operations': [{
+                        'product': product.id, 'quantity': 1,
+                        'operation': 'increment',
+                    }],
+                }, format='json').status_code)
+        finally:
+            connection.close()
+
+    def test_concurrent_batches_keep_all_increments(
+        self, user, token_user, product_1
+    ):
+        ShoppingCart.objects.create(user=user)
+        statuses = []
+        workers = [
+            Thread(
+                target=self.send_batches,
+                args=(token_user['auth_token'], product_1, statuses)
+            )
+            for _ in range(self.threads)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        total = self.threads * self.requests_per_thread
+        assert statuses == [HTTPStatus.OK] * total, (
+            'Параллельные пакеты с новым продуктом не должны падать '
+            'на уникальности позиции.'
+        )
+        cart_item = CartItem.objects.get(shopping_cart__user=user)
+        assert cart_item.product_quantity == total
+        assert ShoppingCart.objects.get(user=user).total_quantity == total
+
+
+@pytest.mark.django_db
+class TestShoppingCartBatchAPI:
+
+    cart_url = '/api/shopping_cart/'
+
+    def send(self, client, operations):
+        return client.patch(
+            self.cart_url, data={'operations': operations}, format='json'
+        )
+
+    def test_batch_not_auth(self, product_1):
+        response = self.send(
+            APIClient(), [{'product': product_1.id, 'quantity': 1}]
+        )
+        assert response.status_code == HTTPStatus.OK, (
+            'Гость меняет корзину в cookie.'
+        )
+
+    def test_batch_operations(self, user, user_client, catalog):
+        first, second, third = catalog[:3]
+        response = self.send(user_client, [
+            {'product': first.id, 'quantity': 2},
+            {'product': second.id, 'quantity': 5},
+            {'product': third.id, 'quantity': 1},
+        ])
+        assert response.status_code == HTTPStatus.OK, (
+            f'PATCH-запрос к `{self.cart_url}` должен возвращать '
+            'ответ со статусом 200.'
+        )
+
+        response = self.send(user_client, [
+            {'product': first.id, 'quantity': 3, 'operation': 'increment'},
+            {'product': second.id, 'operation': 'remove'},
+            {'product': third.id, 'quantity': 4, 'operation': 'set'},
+        ])
+        assert response.status_code == HTTPStatus.OK
+        test_data = response.json()
+        quantities = {
+            item['product']['slug']: item['product_quantity']
+            for item in test_data['products']
+        }
+        assert quantities == {first.slug: 5, third.slug: 4}
+        assert test_data['total_quantity'] == 9
+        assert test_data['total_price'] == 5 * first.price + 4 * third.price
+        assert CartItem.objects.filter(shopping_cart__user=user).count() == 2
+
+    def test_batch_unknown_product(self, user, user_client, product_1):
+        response = self.send(user_client, [
+            {'product': product_1.id, 'quantity': 1},
+            {'product': product_1.id + 1000, 'quantity': 1},
+        ])
+        assert response.status_code == HTTPStatus.BAD_REQUEST, (
+            'Пакет с несуществующим продуктом должен отклоняться целиком.'
+        )
+        assert not CartItem.objects.filter(shopping_cart__user=user).exists()
+
+    def test_batch_quantity_required(self, user_client, product_1):
+        response = self.send(user_client, [
+            {'product': product_1.id, 'operation': 'increment'}
+        ])
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+
+    @pytest.mark.parametrize('cart_size', (5, 40))
+    def test_batch_queries(
+        self, user_client, catalog, cart_size, django_assert_num_queries
+    ):
+        self.send(user_client, [
+            {'product': product.id, 'quantity': 1}
+            for product in catalog[:cart_size]
+        ])
+        operations = [
+            {'product': product.id, 'quantity': 2, 'operation': 'increment'}
+            for product in catalog[:cart_size - 2]
+        ] + [
+            {'product': product.id, 'operation': 'remove'}
+            for product in catalog[cart_size - 2:cart_size]
+        ] + [
+            {'product': product.id, 'quantity': 1}
+            for product in catalog[cart_size:cart_size * 2]
+        ]
+        # Токен уже в кэше. Продукты, корзина, блокировка корзины,
+        # позиции, вставка, обновление позиций, обновление итогов,
+        # удаление с вычитанием из итогов, SAVEPOINT и RELEASE двух
+        # транзакций и три запроса на вывод корзины.
+        with django_assert_num_queries(16):
+            response = self.send(user_client, operations)
+        assert response.status_code == HTTPStatus.OK
+        assert len(response.json()['products']) == cart_size * 2 - 2
+
+
+@pytest.mark.django_db
+class TestShoppingCartTotals:
+
+    shopping_cart_url = '/api/products/{id}/shopping_cart/'
+    cart_url = '/api/shopping_cart/'
+
+    def assert_totals(self, user):
+        shopping_cart = ShoppingCart.objects.get(user=user)
+        actual = shopping_cart.cart_items.aggregate(
+            quantity=Sum('product_quantity'), price=Sum('product_price')
+        )
+        assert shopping_cart.total_quantity == (actual['quantity'] or 0), (
+            'Суммарное количество в корзине должно совпадать с позициями.'
+        )
+        assert shopping_cart.total_price == (actual['price'] or 0), (
+            'Суммарная цена в корзине должна совпадать с позициями.'
+        )
+        return shopping_cart
+
+    def test_totals_follow_cart_changes(self, user, user_client, catalog):
+        first, second = catalog[:2]
+        for product in (first, first, second):
+            user_client.post(self.shopping_cart_url.format(id=product.id))
+        shopping_cart = self.assert_totals(user)
+        assert shopping_cart.total_quantity == 3
+
+        user_client.patch(
+            self.shopping_cart_url.format(id=first.id),
+            data={'product_quantity': 7},
+            format='json'
+        )
+        assert self.assert_totals(user).total_quantity == 8
+
+        user_client.patch(self.cart_url, data={'operations': [
+            {'product': second.id, 'quantity': 2, 'operation': 'increment'},
+            {'product': catalog[2].id, 'quantity': 4},
+            {'product': first.id, 'operation': 'remove'},
+        ]}, format='json')
+        assert self.assert_totals(user).total_quantity == 7
+
+        user_client.delete(self.shopping_cart_url.format(id=second.id))
+        assert self.assert_totals(user).total_quantity == 4
+
+        response = user_client.get(self.cart_url)
+        assert response.json()['total_quantity'] == 4
+        assert response.json()['total_price'] == 4 * catalog[2].price
+
+        user_client.delete(self.cart_url)
+        shopping_cart = self.assert_totals(user)
+        assert (shopping_cart.total_quantity, shopping_cart.total_price) == (
+            0, 0
+        )
+
+    def test_totals_follow_product_delete(self, user, user_client, catalog):
+        for product in catalog[:3]:
+            user_client.post(self.shopping_cart_url.format(id=product.id))
+        catalog[0].delete()
+        assert self.assert_totals(user).total_quantity == 2
+
+    def test_recalculate_cart_totals(self, user, user_client, catalog):
+        for product in catalog[:3]:
+            user_client.post(self.shopping_cart_url.format(id=product.id))
+        ShoppingCart.objects.update(total_quantity=100, total_price=1)
+
+        output = StringIO()
+        call_command('recalculate_cart_totals', chunk_size=1, stdout=output)
+        assert 'исправлено расхождений: 1' in output.getvalue()
+        assert self.assert_totals(user).total_quantity == 3
@@ -0,0 +1,123 @@
+from http import HTTPStatus
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from drf_spectacular.generators import SchemaGenerator
+
+from products.models import CartItem, ShoppingCart
+
+
+@pytest.mark.django_db
+class TestSparseFields:
+
+    product_url = '/api/products/'
+    product_detail_url = '/api/products/{id}/'
+    category_url = '/api/categories/'
+    cart_url = '/api/shopping_cart/'
+
+    def test_product_fields_skip_joins(self, client, catalog):
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(
+                self.product_url, {'fields': 'name,slug,price'}
+            )
+        assert response.status_code == HTTPStatus.OK
+        for product in response.json()['results']:
+            assert list(product) == ['name', 'slug', 'price'], (
+                'В ответе должны остаться только поля из `fields`.'
+            )
+        assert len(context) == 2, (
+            'Без изображений в ответе они не должны загружаться.'
+        )
+        assert not any(
+            'JOIN' in query['sql'] for query in context.captured_queries
+        ), 'Без категорий в ответе не должно быть JOIN.'
+
+    def test_nested_fields(self, client, catalog, django_assert_num_queries):
+        with django_assert_num_queries(3):
+            response = client.get(
+                self.product_url, {'fields': 'name,images.image'}
+            )
+        for product in response.json()['results']:
+            assert list(product) == ['name', 'images']
+            assert all(list(image) == ['image'] for image in product['images'])
+
+    def test_expand(self, client, product_1):
+        response = client.get(
+            self.product_detail_url.format(id=product_1.id),
+            {
+                'expand': 'category,subcategory',
+                'fields': 'category,subcategory',
+            }
+        )
+        assert response.status_code == HTTPStatus.OK
+        data = response.json()
+        assert data['category']['slug'] == product_1.category.slug, (
+            'С `expand` категория должна выводиться объектом.'
+        )
+        assert 'subcategories' not in data['category']
+        assert data['subcategory']['name'] == product_1.subcategory.name
+
+    @pytest.mark.parametrize('params', (
+        {'fields': 'name,weight'},
+        {'fields': 'name.first'},
+        {'expand': 'images'},
+        {'expand': 'weight.name'},
+    ))
+    def test_invalid_fields(self, client, product_1, params):
+        response = client.get(self.product_url, params)
+        assert response.status_code == HTTPStatus.BAD_REQUEST, (
+            'Неизвестные поля в `fields` и `expand` должны возвращать '
+            'ответ со статусом 400.'
+        )
+
+    def test_category_fields(self, client, subcategory_1):
+        response = client.get(
+            self.category_url, {'fields': 'name,subcategories.slug'}
+        )
+        assert response.status_code == HTTPStatus.OK
+        assert response.json()['results'] == [{
+            'name': subcategory_1.category.name,
+            'subcategories': [{'slug': subcategory_1.slug}],
+        }]
+        response = client.get(self.category_url, {'fields': 'title'})
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+
+    def test_cart_fields(
+        self, user, user_client, catalog, django_assert_num_queries
+    ):
+        shopping_cart = ShoppingCart.objects.create(user=user)
+        for product in catalog[:20]:
+            CartItem.objects.create(
+                shopping_cart=shopping_cart,
+                product=product,
+                product_quantity=1
+            )
+        # Токен и корзина без позиций и продуктов.
+        with django_assert_num_queries(2):
+            response = user_client.get(
+                self.cart_url, {'fields': 'total_quantity,total_price'}
+            )
+        assert response.json() == {
+            'total_quantity': 20,
+            'total_price': sum(product.price for product in catalog[:20]),
+        }
+        # Токен уже в кэше: корзина и позиции с продуктами через JOIN.
+        with django_assert_num_queries(2):
+            response = user_client.get(
+                self.cart_url,
+                {'fields': 'products.product.name,products.product_quantity'}
+            )
+        assert response.json()['products'][0] == {
+            'product': {'name': catalog[0].name}, 'product_quantity': 1
+        }
+
+    def test_cart_schema(self):
+        schema = SchemaGenerator().get_schema(request=None, public=True)
+        operation = schema['paths'][self.cart_url]['get']
+        assert operation['summary'] == 'Вывод состава корзины.'
+        assert operation['responses']['200']['content'][
+            'application/json'
+        ]['schema'] == {'$ref': '#/components/schemas/ShoppingCart'}, (
+            'APIView с выборочными полями описывается своим сериализатором.'
+        )
@@ -0,0 +1,70 @@
+import pytest
+from django.core.cache import caches
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+
+from api.category_tree import category_tree
+from api.serializers import (
+    CategorySerializer, ProductSerializer, ShoppingCartSerializer
+)
+from api.values_serializers import (
+    CategoryValuesSerializer, ProductValuesSerializer,
+    ShoppingCartValuesSerializer
+)
+from products.models import Product, ShoppingCart
+
+
+def render(data):
+    return JSONRenderer().render(data)
+
+
+@pytest.mark.django_db
+class TestValuesSerializersContract:
+    """Быстрые сериализаторы дают тот же JSON байт в байт."""
+
+    def test_products(self, store):
+        queryset = Product.objects.with_related().order_by('id')
+        assert render(
+            ProductValuesSerializer(
+                ProductValuesSerializer.get_values(queryset)
+            ).data
+        ) == render(ProductSerializer(queryset, many=True).data)
+
+    def test_categories(self, store):
+        request = APIRequestFactory().get('/api/categories/')
+        assert render(CategoryValuesSerializer(request).data) == render(
+            CategorySerializer(
+                category_tree.get_queryset(), many=True,
+                context={'request': request}
+            ).data
+        )
+
+    def test_shopping_cart(self, user, store):
+        shopping_cart = ShoppingCart.objects.prefetch_related(
+            'cart_items'
+        ).get(pk=store.pk)
+        assert render(ShoppingCartValuesSerializer(user.pk).data) == render(
+            ShoppingCartSerializer(shopping_cart).data
+        )
+
+    @pytest.mark.parametrize('url', (
+        '/api/products/',
+        '/api/products/?page=3',
+        '/api/products/?pagination=keyset&page_size=7',
+        '/api/products/?subcategory=subcategory_1&ordering=-price',
+        '/api/products/search/?q=продукт',
+        '/api/categories/',
+        '/api/shopping_cart/',
+    ))
+    def test_api_responses(self, settings, user_client, store, url):
+        contents = []
+        for engine in ('drf', 'values'):
+            settings.READ_SERIALIZER = engine
+            for alias in settings.CACHES:
+                caches[alias].clear()
+            response = user_client.get(url)
+            assert response.status_code == 200
+            contents.append(response.content)
+        assert contents[0] == contents[1], (
+            f'Ответы `{url}` должны совпадать байт в байт.'
+        )
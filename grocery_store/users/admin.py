@@ -8,6 +8,9 @@ from .models import CustomGroup, User
 @admin.register(User)
 class CustomUserAdmin(UserAdmin):
     list_display = ('username',)
+    # Префикс имени читается из уникального индекса, в том числе
+    # при автодополнении пользователя в корзине.
+    search_fields = ('username__startswith',)
 
 
 admin.site.unregister(Group)